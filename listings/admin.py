@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Room, Review, RoomImage
+from .models import Place, PlaceAlias, Room, Review, RoomImage
 
 admin.site.register(Review)
 
@@ -22,3 +22,16 @@ class RoomAdmin(admin.ModelAdmin):
     )
     list_filter = ("location", "room_type", "is_available")
     search_fields = ("title", "location")
+
+
+class PlaceAliasInline(admin.TabularInline):
+    model = PlaceAlias
+    extra = 1
+
+
+@admin.register(Place)
+class PlaceAdmin(admin.ModelAdmin):
+    # rooms already saved pick up changes with `manage.py rebuild_geo_index`
+    inlines = [PlaceAliasInline]
+    list_display = ("name", "latitude", "longitude")
+    search_fields = ("name", "aliases__alias")
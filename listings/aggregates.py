@@ -0,0 +1,153 @@
+"""
+Incremental maintenance of ``RoomAggregate`` counters.
+
+Writers call these helpers (via the handlers in ``listings.signals``) with
+deltas, so the hot path is a single ``UPDATE ... SET col = col + n``.
+``reconcile()`` recomputes everything from the source tables and repairs drift.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from . import rollups
+from .models import Review, Room, RoomAggregate, RoomStat, RoomStatRollup, StatRollup
+
+CONTACT_PREFIX = "contact"
+
+
+def _apply(room_id, create=True, **deltas):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if RoomAggregate.objects.filter(room_id=room_id).update(**updates):
+        return
+    if create and Room.objects.filter(pk=room_id).exists():
+        RoomAggregate.objects.get_or_create(room_id=room_id)
+        RoomAggregate.objects.filter(room_id=room_id).update(**updates)
+
+
+def room_created(room):
+    RoomAggregate.objects.get_or_create(room=room)
+
+
+def review_added(review):
+    _apply(review.room_id, review_count=1, rating_total=int(review.rating))
+
+
+def review_removed(review):
+    # the room may be mid-cascade-delete, so never recreate its row here
+    _apply(
+        review.room_id,
+        create=False,
+        review_count=-1,
+        rating_total=-int(review.rating),
+    )
+
+
+def review_changed(review):
+    refresh_rooms([review.room_id])
+
+
+def stats_added(stats):
+    contacts = Counter(
+        stat.room_id for stat in stats if stat.stat_type.startswith(CONTACT_PREFIX)
+    )
+    for room_id, count in contacts.items():
+        _apply(room_id, contact_count=count)
+
+
+def _raw_since():
+    """
+    Start of the first day whose raw ``RoomStat`` rows ``prune_raw`` has
+    left whole, or ``None`` when nothing is pruned (``ROOMSTAT_RETENTION_DAYS``).
+    """
+    days = settings.ROOMSTAT_RETENTION_DAYS
+    if days is None:
+        return None
+    cutoff = timezone.now() - timedelta(days=days)
+    return rollups.bucket_start(cutoff, StatRollup.DAY) + timedelta(days=1)
+
+
+def _expected(room_ids):
+    """
+    ``{room_id: counters}`` recomputed from the source tables. Contacts are
+    counted from raw events for the retained window and from the daily
+    rollups for the days before it, whose raw rows may be gone.
+    """
+    expected = {
+        pk: {"review_count": 0, "rating_total": 0, "contact_count": 0}
+        for pk in room_ids
+    }
+    reviews = (
+        Review.objects.filter(room_id__in=room_ids)
+        .values("room_id")
+        .annotate(n=Count("id"), total=Sum("rating"))
+        .order_by()
+    )
+    for row in reviews:
+        expected[row["room_id"]]["review_count"] = row["n"]
+        expected[row["room_id"]]["rating_total"] = row["total"]
+
+    since = _raw_since()
+    raw = RoomStat.objects.filter(
+        room_id__in=room_ids, stat_type__startswith=CONTACT_PREFIX
+    )
+    pruned = RoomStatRollup.objects.none()
+    if since is not None:
+        raw = raw.filter(created_at__gte=since)
+        pruned = RoomStatRollup.objects.filter(
+            room_id__in=room_ids,
+            granularity=StatRollup.DAY,
+            stat_type__startswith=CONTACT_PREFIX,
+            bucket__lt=since,
+        )
+    for qs, total in ((raw, Count("id")), (pruned, Sum("count"))):
+        for row in qs.values("room_id").annotate(n=total).order_by():
+            expected[row["room_id"]]["contact_count"] += row["n"]
+    return expected
+
+
+def refresh_rooms(room_ids):
+    return reconcile(Room.objects.filter(pk__in=room_ids))
+
+
+def reconcile(rooms=None, dry_run=False, batch_size=1000):
+    """
+    Compare the counters of ``rooms`` (default: every room) with the source
+    tables and fix any drift, ``batch_size`` rooms at a time.
+
+    Returns the number of rooms whose counters were missing or wrong.
+    """
+    rooms = (Room.objects.all() if rooms is None else rooms).order_by("pk")
+    fields = ["review_count", "rating_total", "contact_count"]
+    repaired = 0
+    last = None
+    while True:
+        chunk = rooms if last is None else rooms.filter(pk__gt=last)
+        room_ids = list(chunk.values_list("pk", flat=True)[:batch_size])
+        if not room_ids:
+            return repaired
+        last = room_ids[-1]
+
+        current = RoomAggregate.objects.in_bulk(room_ids)
+        changed = []
+        missing = []
+        for room_id, counters in _expected(room_ids).items():
+            agg = current.get(room_id)
+            if agg is None:
+                missing.append(RoomAggregate(room_id=room_id, **counters))
+            elif any(getattr(agg, k) != v for k, v in counters.items()):
+                for k, v in counters.items():
+                    setattr(agg, k, v)
+                changed.append(agg)
+        repaired += len(changed) + len(missing)
+        if not dry_run:
+            with transaction.atomic():
+                RoomAggregate.objects.bulk_update(changed, fields)
+                RoomAggregate.objects.bulk_create(missing, ignore_conflicts=True)
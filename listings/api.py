@@ -0,0 +1,213 @@
+"""
+Read-only JSON API over room listings.
+
+``GET /api/rooms/`` takes the same search, spatial and facet parameters as
+``room_list`` and pages with the same cursors; ``GET /api/rooms/<pk>/``
+returns one room. Both accept ``fields=title,price,...`` to return (and
+load) only those fields.
+
+Responses carry a strong ``ETag`` built from the ``(id, version)`` of the
+rooms they contain (``Room.version`` is bumped whenever the room, its images,
+reviews or contact count change) plus the request parameters. A client
+sending it back in ``If-None-Match`` gets a 304 after one narrow indexed
+query, without the full rows being loaded or serialised.
+"""
+
+import hashlib
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+from urllib.parse import urlencode
+
+from . import browse, images
+from .models import Room, RoomAggregate
+from .pagination import InvalidCursor, page_size_from
+
+
+def _aggregate(room, name):
+    try:
+        aggregate = room.aggregate
+    except RoomAggregate.DoesNotExist:
+        return None
+    return getattr(aggregate, name)
+
+
+def _rating(room):
+    avg = _aggregate(room, "avg_rating")
+    return round(avg, 2) if avg is not None else None
+
+
+def _images(room):
+    out = []
+    for image in room.images.all():
+        entry = {"url": image.image.url, "width": image.width, "height": image.height}
+        for name in images.VARIANTS:
+            jpeg, webp, width, height = image.variant(name)
+            entry[name] = {"jpeg": jpeg, "webp": webp, "width": width, "height": height}
+        out.append(entry)
+    return out
+
+
+# name -> (serialiser, fields for only(), select_related, prefetch_related)
+FIELDS = {
+    "id": (lambda r: r.pk, ["id"], None, None),
+    "url": (lambda r: reverse("api_room_detail", args=[r.pk]), ["id"], None, None),
+    "title": (lambda r: r.title, ["title"], None, None),
+    "description": (lambda r: r.description, ["description"], None, None),
+    "price": (lambda r: str(r.price), ["price"], None, None),
+    "room_type": (lambda r: r.room_type, ["room_type"], None, None),
+    "location": (lambda r: r.location, ["location"], None, None),
+    "place": (lambda r: r.place or None, ["place"], None, None),
+    "latitude": (lambda r: r.latitude, ["latitude"], None, None),
+    "longitude": (lambda r: r.longitude, ["longitude"], None, None),
+    "is_available": (lambda r: r.is_available, ["is_available"], None, None),
+    "created_at": (lambda r: r.created_at.isoformat(), ["created_at"], None, None),
+    "version": (lambda r: r.version, ["version"], None, None),
+    "verified_owner": (
+        lambda r: bool(r.owner and r.owner.profile.is_verified),
+        ["owner", "owner__profile"],
+        "owner__profile",
+        None,
+    ),
+    "rating": (_rating, ["aggregate"], "aggregate", None),
+    "review_count": (
+        lambda r: _aggregate(r, "review_count") or 0,
+        ["aggregate"],
+        "aggregate",
+        None,
+    ),
+    "contact_count": (
+        lambda r: _aggregate(r, "contact_count") or 0,
+        ["aggregate"],
+        "aggregate",
+        None,
+    ),
+    "images": (_images, [], None, "images"),
+}
+
+LIST_FIELDS = [name for name in FIELDS if name != "description"]
+DETAIL_FIELDS = list(FIELDS)
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def _fields(request, default):
+    raw = request.GET.get("fields")
+    if not raw:
+        return default
+    names = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown:
+        raise InvalidFields(unknown)
+    return names
+
+
+def _load(qs, fields):
+    """Fetch only the columns and relations ``fields`` need."""
+    columns = {"id", "version"}
+    related = set()
+    prefetch = set()
+    for name in fields:
+        _, cols, select, pre = FIELDS[name]
+        columns.update(cols)
+        if select:
+            related.add(select)
+        if pre:
+            prefetch.add(pre)
+    return qs.only(*columns).select_related(*related).prefetch_related(*prefetch)
+
+
+def _serialise(room, fields):
+    return {name: FIELDS[name][0](room) for name in fields}
+
+
+def _etag(parts):
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    return quote_etag(digest)
+
+
+def _conditional(request, etag):
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+    return response
+
+
+def _json(data, etag, **kwargs):
+    response = JsonResponse(data, **kwargs)
+    response["ETag"] = etag
+    # may be stored, but must be revalidated with If-None-Match every time
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def _error(message):
+    return JsonResponse({"error": message}, status=400)
+
+
+@require_GET
+def room_list(request):
+    try:
+        fields = _fields(request, LIST_FIELDS)
+    except InvalidFields as exc:
+        return _error(f"Unknown fields: {', '.join(exc.args[0])}.")
+
+    values = browse.filters_from(request)
+    size = page_size_from(request.GET.get("size"))
+    try:
+        rooms, next_cursor = browse.room_page(values, request.GET.get("cursor"), size)
+    except InvalidCursor:
+        return _error("Invalid cursor.")
+
+    etag = _etag(
+        (
+            sorted(request.GET.items()),
+            [(room.pk, room.version) for room in rooms],
+            next_cursor,
+        )
+    )
+    not_modified = _conditional(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    loaded = _load(Room.objects.filter(pk__in=[room.pk for room in rooms]), fields)
+    by_pk = {room.pk: room for room in loaded}
+    results = [_serialise(by_pk[room.pk], fields) for room in rooms if room.pk in by_pk]
+
+    next_url = None
+    if next_cursor:
+        params = {k: v for k, v in request.GET.items() if k != "cursor"}
+        params["cursor"] = next_cursor
+        next_url = f"{reverse('api_room_list')}?{urlencode(params)}"
+
+    return _json(
+        {"results": results, "next_cursor": next_cursor, "next": next_url}, etag
+    )
+
+
+@require_GET
+def room_detail(request, pk):
+    try:
+        fields = _fields(request, DETAIL_FIELDS)
+    except InvalidFields as exc:
+        return _error(f"Unknown fields: {', '.join(exc.args[0])}.")
+
+    # the same rooms the list and the room page show
+    available = Room.objects.filter(is_available=True)
+    stamp = get_object_or_404(available.only("id", "version"), pk=pk)
+    etag = _etag((pk, stamp.version, fields))
+    not_modified = _conditional(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    room = _load(available.filter(pk=pk), fields).first()
+    if room is None:
+        raise Http404
+    return _json(_serialise(room, fields), etag)
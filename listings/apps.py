@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class ListingsConfig(AppConfig):
     name = "listings"
+
+    def ready(self):
+        from . import areas, signals  # noqa: F401
+
+        # fail at startup, not on the first view, if the half-life is invalid
+        areas.half_life()
+
+        # hooks every new database connection for per-request query metrics
+        from . import metrics  # noqa: F401
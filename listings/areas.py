@@ -0,0 +1,163 @@
+"""
+Time-decayed view demand per place.
+
+Rooms are grouped by ``Room.place``, the canonical gazetteer place that
+``listings.geo`` resolves their location to on save ("Tshwane", "PTA" and
+"Pretoria CBD" are all "Pretoria"). Rooms without a place have no demand.
+
+``AreaDemand.score`` counts views with exponential decay and an
+``AREA_DEMAND_HALF_LIFE_HOURS`` half-life. The score is stored as of the
+row's ``last_view_at`` and decayed lazily. A ``stats_recorded`` batch loads
+the rows it touches, decays them to the newest view and adds the new views,
+each decayed from its own time. Every exponent is at most zero, so scores
+only ever shrink towards zero and can't overflow however long the site runs.
+``current()`` decays a stored score to now.
+
+Rows are only comparable once decayed to the same time, so the heatmap reads
+every row (one per place that ever had a view, a few dozen) and ranks them
+in Python. It is cached as the ``area_heatmap`` counter (``listings.counters``)
+and refreshed at most once per ``COUNTER_CACHE_TTL``.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import rollups
+from .models import AreaDemand, RoomStatRollup, StatRollup
+
+HEATMAP_SIZE = 30
+
+
+def half_life():
+    """The demand half-life in hours; ``ImproperlyConfigured`` if it isn't one."""
+    hours = getattr(settings, "AREA_DEMAND_HALF_LIFE_HOURS", 72)
+    if isinstance(hours, bool) or not isinstance(hours, (int, float)) or hours <= 0:
+        raise ImproperlyConfigured(
+            "AREA_DEMAND_HALF_LIFE_HOURS must be a positive number of hours, "
+            f"not {hours!r}."
+        )
+    return hours
+
+
+def decay(score, since, until):
+    """``score`` as of ``since``, decayed to ``until`` (never grown)."""
+    hours = max(0.0, (until - since).total_seconds() / 3600)
+    return score * 2 ** (-hours / half_life())
+
+
+def current(score, last_view_at, now=None):
+    """A stored score as decayed views at ``now``."""
+    if last_view_at is None:
+        return 0.0
+    return decay(score, last_view_at, now or timezone.now())
+
+
+def _combine(a, b):
+    """Two ``(score, views, last_view_at)`` totals as one."""
+    last = max(a[2], b[2])
+    return (decay(a[0], a[2], last) + decay(b[0], b[2], last), a[1] + b[1], last)
+
+
+def accumulate(totals, place, when, views=1):
+    """Add ``views`` views of ``place`` at ``when`` to ``totals``."""
+    entry = (float(views), views, when)
+    totals[place] = _combine(totals[place], entry) if place in totals else entry
+
+
+def add_demand(totals):
+    """
+    Merge ``{place: (score, views, last_view_at)}`` from ``accumulate()``
+    into ``AreaDemand``: one locking read and one update, plus an insert and
+    a second read the first time a place is seen.
+    """
+    if not totals:
+        return
+    # all or nothing, but no savepoint inside the stats_recorded transaction
+    with transaction.atomic(savepoint=False):
+        locked = AreaDemand.objects.select_for_update()
+        rows = locked.in_bulk(list(totals), field_name="place")
+        missing = [place for place in totals if place not in rows]
+        if missing:
+            # another worker may add the same place between the read and the
+            # insert: create empty rows, skip any that now exist and merge
+            # into whichever row won, locked like the rest
+            AreaDemand.objects.bulk_create(
+                [AreaDemand(place=place) for place in missing], ignore_conflicts=True
+            )
+            rows.update(locked.in_bulk(missing, field_name="place"))
+        for place, entry in totals.items():
+            row = rows[place]
+            if row.last_view_at is not None:
+                entry = _combine((row.score, row.views, row.last_view_at), entry)
+            row.score, row.views, row.last_view_at = entry
+        AreaDemand.objects.bulk_update(
+            rows.values(), ["score", "views", "last_view_at"]
+        )
+
+
+def views_added(stats):
+    """Fold the views in a ``stats_recorded`` batch into area demand."""
+    views = [stat for stat in stats if stat.stat_type == "view"]
+    if not views:
+        return
+    rooms = rollups.rooms_for(views)
+    totals = {}
+    for stat in views:
+        room = rooms.get(stat.room_id)
+        place = room.place if room is not None else ""
+        if place:
+            accumulate(totals, place, stat.created_at)
+    add_demand(totals)
+
+
+def heatmap(limit=HEATMAP_SIZE):
+    """Busiest places first, as ``{"city", "count", "score", "demand"}``."""
+    now = timezone.now()
+    rows = sorted(
+        (
+            (current(row.score, row.last_view_at, now), row)
+            for row in AreaDemand.objects.filter(views__gt=0)
+        ),
+        key=lambda item: (-item[0], item[1].place),
+    )[:limit]
+    if not rows or rows[0][0] <= 0:
+        return []
+    top = rows[0][0]
+    return [
+        {
+            "city": row.place,
+            "count": row.views,
+            # opacity for the template: the busiest place is fully opaque
+            "score": round(0.25 + 0.75 * demand / top, 2),
+            "demand": round(demand, 1),
+        }
+        for demand, row in rows
+    ]
+
+
+def rebuild(batch_size=1000):
+    """
+    Recompute demand from the daily view rollups, each day's views weighted
+    at midday. Returns the number of places with demand.
+    """
+    daily = (
+        RoomStatRollup.objects.filter(granularity=StatRollup.DAY, stat_type="view")
+        .exclude(room__place="")
+        .values("room__place", "bucket")
+        .annotate(n=Sum("count"))
+        .order_by()
+    )
+    totals = {}
+    for row in daily.iterator(chunk_size=batch_size):
+        accumulate(
+            totals, row["room__place"], row["bucket"] + timedelta(hours=12), row["n"]
+        )
+    with transaction.atomic():
+        AreaDemand.objects.all().delete()
+        add_demand(totals)
+    return len(totals)
@@ -0,0 +1,60 @@
+"""
+The room search behind ``room_list``, its infinite-scroll fragment and the
+JSON API: request parameters in, one page of available rooms out.
+"""
+
+from . import facets, geo, search
+from .models import Room
+from .pagination import keyset_page, ordered_page
+
+SEARCH_PARAMS = ("q", "location", "near", "lat", "lng", "radius", "bbox")
+FACET_PARAMS = ("type", "price", "place", "rating")
+
+
+def filters_from(request):
+    """The search (incl. spatial, see listings.geo) and facet values asked for."""
+    return {
+        key: (request.GET.get(key) or "").strip()
+        for key in SEARCH_PARAMS + FACET_PARAMS
+    }
+
+
+def searched_rooms(values):
+    """Available rooms matching the search itself, before any facet is picked."""
+    rooms_qs = Room.objects.filter(is_available=True)
+
+    # Search logic (full-text index, see listings.search)
+    if values["q"]:
+        rooms_qs = search.filter_rooms(rooms_qs, values["q"])
+
+    if values["location"]:
+        rooms_qs = rooms_qs.filter(location__icontains=values["location"])
+
+    area = geo.area_from(values)
+    if area is not None:
+        rooms_qs = geo.filter_area(rooms_qs, area)
+
+    return rooms_qs
+
+
+def filtered_rooms(values):
+    """``searched_rooms`` narrowed by the picked facets."""
+    rooms_qs = facets.apply(searched_rooms(values), values)
+    # only what paging and the card cache key need; listings.fragments loads
+    # the full rows for cards it has to render
+    return rooms_qs.only("id", "version", "created_at", "latitude", "longitude")
+
+
+def room_page(values, cursor, size):
+    """
+    One page of matching rooms: nearest first for a spatial search, most
+    relevant first for a text search, else newest.
+    """
+    rooms = filtered_rooms(values)
+    area = geo.area_from(values)
+    if area is not None:
+        return geo.nearest_page(rooms, area, cursor, size)
+    ranked = search.annotate_rank(rooms, values["q"])
+    if ranked is not None:
+        return ordered_page(ranked, ("search_rank", "id"), cursor, size)
+    return keyset_page(rooms, cursor, size)
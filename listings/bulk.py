@@ -0,0 +1,263 @@
+"""
+Bulk import and export of room listings as CSV or JSON Lines.
+
+Imports stream the file and work through it ``CHUNK_SIZE`` rows at a time.
+Each row gets ``RoomForm``'s field validation. Its duplicate rule (a room
+of the owner's with the same fingerprint, see ``listings.duplicates``) is
+checked for the whole chunk with one query. The same rule applies to rows
+repeated within the file. Valid rows are inserted with ``bulk_create``. That skips the
+``Room`` signals, so ``rooms_created`` does their work once per chunk. If the
+chunk's insert fails on a constraint (a duplicate saved by someone else since
+the check), its rows are inserted one at a time, each in a savepoint.
+Invalid rows are skipped and reported by line number.
+
+Exports are generators of encoded lines that read rooms with ``iterator()``,
+so a ``StreamingHttpResponse`` or a file can take any number of rooms in
+constant memory.
+"""
+
+import csv
+import io
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+
+from . import counters, duplicates, facets, geo, images, search
+from .forms import RoomForm
+from .models import Room, RoomAggregate, RoomImage
+
+FORMATS = ("csv", "jsonl")
+CHUNK_SIZE = 1000
+FIELDS = RoomForm.Meta.fields
+FORM_FIELDS = RoomForm.base_fields
+EXPORT_FIELDS = ["id", *FIELDS, "place", "created_at", "images"]
+# errors kept for the report; the rest are only counted
+MAX_ERRORS = 100
+TRUE_VALUES = {"1", "true", "t", "yes", "y", "on"}
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+
+def format_of(name, default="csv"):
+    """The format a file name's extension implies."""
+    extension = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension == "csv":
+        return "csv"
+    return default
+
+
+def read_rows(stream, fmt):
+    """``(line, row, error)`` for each record in a binary ``stream``."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line, raw in enumerate(text, 1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as exc:
+            yield line, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(row, dict):
+            yield line, None, "Expected a JSON object."
+            continue
+        yield line, row, None
+
+
+def _form_data(row):
+    data = {
+        field: row[field]
+        for field in FIELDS
+        if row.get(field) is not None and row[field] != ""
+    }
+    # a missing column means available, like the form's default
+    available = data.get("is_available", True)
+    if isinstance(available, str):
+        available = available.strip().lower() in TRUE_VALUES
+    data["is_available"] = available
+    return data
+
+
+def _clean(row):
+    """
+    ``(cleaned, errors)`` for one row, from ``RoomForm``'s fields. Binding a
+    whole form per row costs more than the insert, and its ``clean()`` only
+    adds the duplicate check done per chunk here.
+    """
+    data = _form_data(row)
+    cleaned = {}
+    errors = []
+    for name, field in FORM_FIELDS.items():
+        try:
+            cleaned[name] = field.clean(data.get(name))
+        except ValidationError as exc:
+            errors.append(f"{name}: {' '.join(exc.messages)}")
+    return cleaned, errors
+
+
+def _image_names(row):
+    names = row.get("images") or []
+    if isinstance(names, str):
+        names = names.split()
+    return [str(name) for name in names]
+
+
+def _existing(owner, fingerprints):
+    """Which of ``fingerprints`` ``owner`` already has a room for, in one query."""
+    if not fingerprints:
+        return set()
+    return set(
+        Room.objects.filter(owner=owner, fingerprint__in=fingerprints).values_list(
+            "fingerprint", flat=True
+        )
+    )
+
+
+def rooms_created(rooms):
+    """What the ``Room`` signal handlers do on create, for bulk-created rooms."""
+    search.index_rooms(rooms)
+    geo.index_rooms(rooms)
+    RoomAggregate.objects.bulk_create([RoomAggregate(room=room) for room in rooms])
+
+
+def _import_chunk(owner, chunk, seen, result, with_images, dry_run):
+    valid = []
+    for line, row, error in chunk:
+        if error:
+            result.error(line, error)
+            continue
+        cleaned, errors = _clean(row)
+        if errors:
+            result.error(line, "; ".join(errors))
+            continue
+        names = _image_names(row) if with_images else []
+        missing = [name for name in names if not default_storage.exists(name)]
+        if missing:
+            result.error(line, f"images: not found: {', '.join(missing)}")
+            continue
+        key = duplicates.fingerprint(
+            *(cleaned[field] for field in duplicates.KEY_FIELDS)
+        )
+        valid.append((line, key, cleaned, names))
+
+    existing = _existing(owner, {key for _, key, _, _ in valid})
+    rooms = []
+    for line, key, cleaned, names in valid:
+        if key in existing or key in seen:
+            result.duplicates += 1
+            continue
+        seen.add(key)
+        room = Room(owner=owner, fingerprint=key, **cleaned)
+        # pre_save doesn't run for bulk_create
+        geo.locate(room)
+        rooms.append((line, room, names))
+
+    if not rooms or dry_run:
+        result.created += len(rooms)
+        return
+    try:
+        created = _insert(rooms)
+        result.created += len(rooms)
+    except IntegrityError:
+        created = []
+        for line, room, names in rooms:
+            room.pk = None
+            try:
+                created += _insert([(line, room, names)])
+            except IntegrityError as exc:
+                if _existing(owner, {room.fingerprint}):
+                    result.duplicates += 1
+                else:
+                    result.error(line, f"Not saved: {exc}")
+                continue
+            result.created += 1
+    images.schedule(image.pk for image in created)
+
+
+def _insert(rooms):
+    """Insert ``(line, room, image names)`` rooms; returns their ``RoomImage``s."""
+    with transaction.atomic():
+        Room.objects.bulk_create([room for _, room, _ in rooms])
+        rooms_created([room for _, room, _ in rooms])
+        return RoomImage.objects.bulk_create(
+            [
+                RoomImage(room=room, image=name)
+                for _, room, names in rooms
+                for name in names
+            ]
+        )
+
+
+def import_rooms(owner, rows, chunk_size=CHUNK_SIZE, with_images=False, dry_run=False):
+    """
+    Create rooms for ``owner`` from ``read_rows`` output. ``with_images``
+    attaches the files named in an ``images`` column, which must already be
+    in storage (as in an export from this site). Returns an ``ImportResult``.
+    """
+    result = ImportResult()
+    seen = set()
+    chunk = []
+    for record in rows:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            _import_chunk(owner, chunk, seen, result, with_images, dry_run)
+            chunk = []
+    if chunk:
+        _import_chunk(owner, chunk, seen, result, with_images, dry_run)
+
+    if result.created and not dry_run:
+        facets.invalidate()
+        counters.invalidate("room_count", "rooms_available")
+    return result
+
+
+class _Echo:
+    """A file-like object whose ``write`` returns what it was given."""
+
+    def write(self, value):
+        return value
+
+
+def _export_row(room):
+    row = {field: getattr(room, field) for field in EXPORT_FIELDS[:-1]}
+    row["price"] = str(room.price)
+    row["created_at"] = room.created_at.isoformat()
+    row["images"] = [image.image.name for image in room.images.all()]
+    return row
+
+
+def export_rows(rooms, fmt, chunk_size=CHUNK_SIZE):
+    """Encoded lines of ``rooms`` as ``fmt``, one room at a time."""
+    rooms = rooms.order_by("pk").prefetch_related(
+        Prefetch("images", queryset=RoomImage.objects.only("room_id", "image"))
+    )
+    if fmt == "csv":
+        writer = csv.DictWriter(_Echo(), EXPORT_FIELDS)
+        yield writer.writeheader().encode()
+    for room in rooms.iterator(chunk_size=chunk_size):
+        row = _export_row(room)
+        if fmt == "csv":
+            row["images"] = " ".join(row["images"])
+            yield writer.writerow(row).encode()
+        else:
+            yield (json.dumps(row) + "\n").encode()
@@ -0,0 +1,117 @@
+"""
+Cached site-wide counters for the home and services pages.
+
+Values live in the ``"counters"`` cache alias together with a freshness
+deadline. Model signals mark a counter stale rather than deleting it, so the
+next reader recomputes it while everyone else keeps serving the old number.
+Only the request that wins a short ``cache.add`` lock runs the COUNT query,
+so an expiry under load triggers one recompute, not one per request.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import areas, rollups
+from .models import Contact, Profile, Review, Room
+
+LOCK_TIMEOUT = 10
+WAIT_STEP = 0.05
+WAIT_LIMIT = 1.0
+STALE_TIMEOUT = 60 * 60 * 24
+
+
+def _contacts_made():
+    return sum(
+        n
+        for stat_type, n in rollups.totals().items()
+        if stat_type.startswith("contact")
+    )
+
+
+COUNTERS = {
+    "room_count": lambda: Room.objects.count(),
+    "rooms_available": lambda: Room.objects.filter(is_available=True).count(),
+    "contact_count": lambda: Contact.objects.count(),
+    "review_count": lambda: Review.objects.count(),
+    "landlord_count": lambda: Profile.objects.filter(role="landlord").count(),
+    "contacts_made": _contacts_made,
+    "success_matches": lambda: rollups.totals().get("success", 0),
+    "area_heatmap": areas.heatmap,
+}
+
+
+def _cache():
+    return caches["counters"]
+
+
+def _key(name):
+    return f"counter:{name}"
+
+
+def _lock_key(name):
+    return f"counter-lock:{name}"
+
+
+def _ttl():
+    return getattr(settings, "COUNTER_CACHE_TTL", 60)
+
+
+def _recompute(cache, name):
+    value = COUNTERS[name]()
+    cache.set(
+        _key(name),
+        {"value": value, "fresh_until": time.time() + _ttl()},
+        STALE_TIMEOUT,
+    )
+    return value
+
+
+def _refresh(cache, name, entry):
+    if cache.add(_lock_key(name), 1, LOCK_TIMEOUT):
+        try:
+            return _recompute(cache, name)
+        finally:
+            cache.delete(_lock_key(name))
+
+    # somebody else is recomputing: serve the stale value if we have one
+    if entry is not None:
+        return entry["value"]
+
+    # cold cache: give the lock holder a moment before doing it ourselves
+    waited = 0.0
+    while waited < WAIT_LIMIT:
+        time.sleep(WAIT_STEP)
+        waited += WAIT_STEP
+        entry = cache.get(_key(name))
+        if entry is not None:
+            return entry["value"]
+    return COUNTERS[name]()
+
+
+def get_many(names):
+    """Return ``{name: value}`` with a single cache round trip when all are fresh."""
+    cache = _cache()
+    entries = cache.get_many([_key(name) for name in names])
+    now = time.time()
+    values = {}
+    for name in names:
+        entry = entries.get(_key(name))
+        if entry is not None and entry["fresh_until"] > now:
+            values[name] = entry["value"]
+        else:
+            values[name] = _refresh(cache, name, entry)
+    return values
+
+
+def get(name):
+    return get_many([name])[name]
+
+
+def invalidate(*names):
+    """Mark counters stale; the old value is kept until a reader replaces it."""
+    cache = _cache()
+    entries = cache.get_many([_key(name) for name in names])
+    for key, entry in entries.items():
+        cache.set(key, {**entry, "fresh_until": 0}, STALE_TIMEOUT)
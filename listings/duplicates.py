@@ -0,0 +1,142 @@
+"""
+Duplicate and near-duplicate listings.
+
+``Room.fingerprint`` hashes the room's normalized title and location (case,
+punctuation and spacing dropped) with its type and price. It is unique per
+owner, so ``Room.clean`` (run by ``RoomForm`` and the admin) and bulk
+imports check for a repost with one index lookup, and the database rejects
+any that slip past them.
+Duplicates that existed before the constraint keep their fingerprint with a
+``:<pk>`` suffix until their title, location, type or price is edited.
+
+``near_duplicates`` looks for the same description posted with small
+changes, across all owners. Each room gets a MinHash signature of its
+description's word shingles. Signatures are cut into bands (LSH), and only
+rooms that share a whole band are compared. Candidate pairs are kept when
+their signatures estimate a Jaccard similarity of at least ``threshold``.
+"""
+
+import hashlib
+import random
+import re
+import unicodedata
+from array import array
+from collections import defaultdict
+from decimal import Decimal
+
+WORDS = re.compile(r"[^\W_]+")
+KEY_FIELDS = ("title", "location", "room_type", "price")
+SHINGLE_SIZE = 3
+# 8 bands of 8 rows: pairs above ~0.77 similarity share a band with high
+# probability, pairs below ~0.5 rarely do
+BANDS = 8
+ROWS = 8
+PERMUTATIONS = BANDS * ROWS
+_rng = random.Random(0x5EED)
+_SALTS = [_rng.getrandbits(64) for _ in range(PERMUTATIONS)]
+
+
+def normalize(text):
+    """``text`` as lowercase words separated by single spaces."""
+    return " ".join(WORDS.findall(unicodedata.normalize("NFKC", text or "").casefold()))
+
+
+def fingerprint(title, location, room_type, price):
+    key = "|".join(
+        [
+            normalize(title),
+            normalize(location),
+            room_type or "",
+            f"{Decimal(str(price)):.2f}",
+        ]
+    )
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def base_of(stored):
+    """A stored fingerprint without the migration's ``:<pk>`` suffix."""
+    return stored.split(":", 1)[0]
+
+
+def assign(room):
+    value = fingerprint(room.title, room.location, room.room_type, room.price)
+    if base_of(room.fingerprint) != value:
+        room.fingerprint = value
+
+
+def _hash(shingle):
+    return int.from_bytes(
+        hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little"
+    )
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    words = normalize(text).split()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def signature(text):
+    """MinHash signature of ``text``'s shingles, or ``None`` if it has none."""
+    hashes = [_hash(shingle) for shingle in shingles(text)]
+    if not hashes:
+        return None
+    # one hash per shingle, XORed with a salt per permutation
+    return array("Q", [min(map(salt.__xor__, hashes)) for salt in _SALTS])
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / PERMUTATIONS
+
+
+def near_duplicates(rooms, threshold=0.8):
+    """
+    Groups of ``(room_id, owner_id)`` whose descriptions are near duplicates,
+    from ``(room_id, owner_id, description)`` rows. Each group is sorted by
+    room id.
+    """
+    # rooms with the same shingles share a signature; only the first of them
+    # goes through LSH, so a description reposted n times isn't n**2 pairs
+    copies = defaultdict(list)
+    signatures = {}
+    for room_id, owner_id, description in rooms:
+        sig = signature(description)
+        if sig is None:
+            continue
+        data = sig.tobytes()
+        if data not in copies:
+            signatures[room_id] = sig
+        copies[data].append((room_id, owner_id))
+
+    buckets = defaultdict(list)
+    step = ROWS * array("Q").itemsize
+    for room_id, sig in signatures.items():
+        data = sig.tobytes()
+        for band in range(BANDS):
+            buckets[(band, data[band * step : (band + 1) * step])].append(room_id)
+
+    parent = {room_id: room_id for room_id in signatures}
+
+    def find(room_id):
+        while parent[room_id] != room_id:
+            parent[room_id] = parent[parent[room_id]]
+            room_id = parent[room_id]
+        return room_id
+
+    checked = set()
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1 :]:
+                if (a, b) in checked:
+                    continue
+                checked.add((a, b))
+                if similarity(signatures[a], signatures[b]) >= threshold:
+                    root_a, root_b = find(a), find(b)
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups = defaultdict(list)
+    for room_id, sig in signatures.items():
+        groups[find(room_id)].extend(copies[sig.tobytes()])
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1)
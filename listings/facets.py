@@ -0,0 +1,177 @@
+"""
+Facet counts for the room list: room type, price band, place and rating.
+
+All type, price and rating counts come from a single aggregate query of
+conditional ``COUNT``s, and places from one ``GROUP BY`` capped at
+``PLACE_LIMIT`` rows, so a new facet value is a new column, not a new query.
+Counts are taken over the rooms matching the search itself (text, location,
+area), before any facet is picked, so every option shows how many rooms
+selecting it would give.
+
+Results are cached per search in the ``"counters"`` cache under a generation
+number that ``invalidate()`` bumps on any room or review change, so the plain
+browse page normally serves its facets without touching the database.
+"""
+
+import hashlib
+import json
+
+from django.core.cache import caches
+from django.db.models import Count, F, Q
+from django.urls import reverse
+from urllib.parse import urlencode
+
+from .models import Room
+
+# key -> (label, min price inclusive, max price exclusive)
+PRICE_BANDS = {
+    "0-1500": ("Under R1 500", None, 1500),
+    "1500-2500": ("R1 500 – R2 500", 1500, 2500),
+    "2500-3500": ("R2 500 – R3 500", 2500, 3500),
+    "3500-5000": ("R3 500 – R5 000", 3500, 5000),
+    "5000-": ("R5 000 and up", 5000, None),
+}
+
+# minimum average rating -> label
+RATINGS = {"4": "4★ & up", "3": "3★ & up", "2": "2★ & up"}
+
+PLACE_LIMIT = 12
+CACHE_TIMEOUT = 60 * 5
+GENERATION_KEY = "facets:generation"
+
+# query parameter -> facet name in the counts
+FACETS = {"type": "room_type", "price": "price", "place": "place", "rating": "rating"}
+
+
+def _cache():
+    return caches["counters"]
+
+
+def price_q(key):
+    _, low, high = PRICE_BANDS[key]
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def rating_q(key):
+    # avg >= n without dividing: rating_total >= n * review_count
+    return Q(
+        aggregate__review_count__gt=0,
+        aggregate__rating_total__gte=int(key) * F("aggregate__review_count"),
+    )
+
+
+def apply(qs, values):
+    """Narrow ``qs`` by whichever facets are selected in ``values``."""
+    if values.get("type"):
+        qs = qs.filter(room_type=values["type"])
+    if values.get("price") in PRICE_BANDS:
+        qs = qs.filter(price_q(values["price"]))
+    if values.get("place"):
+        qs = qs.filter(place=values["place"])
+    if values.get("rating") in RATINGS:
+        qs = qs.filter(rating_q(values["rating"]))
+    return qs
+
+
+def compute(qs):
+    """``{facet: {value: count}}`` for the rooms in ``qs``, in two queries."""
+    columns = {}
+    for value, _ in Room.ROOM_TYPES:
+        columns[f"room_type:{value}"] = Count("id", filter=Q(room_type=value))
+    for key in PRICE_BANDS:
+        columns[f"price:{key}"] = Count("id", filter=price_q(key))
+    for key in RATINGS:
+        columns[f"rating:{key}"] = Count("id", filter=rating_q(key))
+
+    counts = {"room_type": {}, "price": {}, "rating": {}, "place": {}}
+    for column, n in qs.order_by().aggregate(**columns).items():
+        facet, value = column.split(":", 1)
+        counts[facet][value] = n
+
+    places = (
+        qs.exclude(place="")
+        .order_by()
+        .values("place")
+        .annotate(n=Count("id"))
+        .order_by("-n", "place")[:PLACE_LIMIT]
+    )
+    counts["place"] = {row["place"]: row["n"] for row in places}
+    return counts
+
+
+def _key(values):
+    cache = _cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY, 1)
+    digest = hashlib.sha1(
+        json.dumps(values, sort_keys=True).encode(), usedforsecurity=False
+    ).hexdigest()
+    return f"facets:{generation}:{digest}"
+
+
+def counts_for(qs, search_values):
+    """Cached ``compute(qs)``; ``search_values`` identify the search behind ``qs``."""
+    cache = _cache()
+    key = _key(search_values)
+    counts = cache.get(key)
+    if counts is None:
+        counts = compute(qs)
+        cache.set(key, counts, CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate():
+    """Orphan every cached facet count."""
+    cache = _cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 1, None)
+
+
+def options(counts, values, view_name="room_list"):
+    """
+    Template-ready facets: ``[{"name", "param", "options": [{"label", "count",
+    "url", "active"}]}]``. Each option's URL toggles it on top of ``values``.
+    """
+    labels = {
+        "type": dict(Room.ROOM_TYPES),
+        "price": {key: band[0] for key, band in PRICE_BANDS.items()},
+        "rating": RATINGS,
+    }
+    names = {"type": "Type", "price": "Price", "place": "Area", "rating": "Rating"}
+    base = {k: v for k, v in values.items() if v and k != "cursor"}
+
+    facets = []
+    for param, facet in FACETS.items():
+        choices = []
+        for value, n in counts.get(facet, {}).items():
+            if not n and values.get(param) != value:
+                continue
+            active = values.get(param) == value
+            params = dict(base)
+            if active:
+                params.pop(param)
+            else:
+                params[param] = value
+            query = urlencode(params)
+            choices.append(
+                {
+                    "label": labels.get(param, {}).get(value, value),
+                    "count": n,
+                    "url": (
+                        f"{reverse(view_name)}?{query}" if query else reverse(view_name)
+                    ),
+                    "active": active,
+                }
+            )
+        if choices:
+            facets.append({"name": names[param], "param": param, "options": choices})
+    return facets
@@ -107,40 +107,13 @@ class RoomForm(forms.ModelForm):
     def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.user = user
-
-    def clean(self):
-        cleaned = super().clean()
-
-        # if we don't have an owner yet, skip
-        if not self.user or not getattr(self.user, "is_authenticated", False):
-            return cleaned
-
-        title = (cleaned.get("title") or "").strip()
-        location = (cleaned.get("location") or "").strip()
-        room_type = cleaned.get("room_type")
-        price = cleaned.get("price")
-
-        if not (title and location and room_type and price is not None):
-            return cleaned
-
-        qs = Room.objects.filter(
-            owner=self.user,
-            title__iexact=title,
-            location__iexact=location,
-            room_type=room_type,
-            price=price,
-        )
-
-        # if editing, exclude self
-        if self.instance and self.instance.pk:
-            qs = qs.exclude(pk=self.instance.pk)
-
-        if qs.exists():
-            raise ValidationError(
-                "You already posted a listing with the same title, location, type and price."
-            )
-
-        return cleaned
+        # Room.clean() checks for reposts by the owner
+        if (
+            user is not None
+            and user.is_authenticated
+            and self.instance.owner_id is None
+        ):
+            self.instance.owner = user
 
 
 class RoomImageForm(forms.ModelForm):
@@ -0,0 +1,74 @@
+"""
+Cached room-card fragments.
+
+Each card is rendered once per ``Room.version`` and stored in the
+``"fragments"`` cache. A page of N cards costs one ``get_many``, and only the
+misses are loaded with their images, owner and aggregates and rendered.
+``bump()`` is called (from ``listings.signals``) whenever something a card
+shows changes, which moves the room to a fresh key.
+"""
+
+from django.core.cache import caches
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Room
+
+CARD_TEMPLATE = "listings/room_card.html"
+CARD_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def _cache():
+    return caches["fragments"]
+
+
+def card_key(room):
+    return f"room-card:{room.pk}:{room.version}"
+
+
+def bump(room_ids=None, owner_id=None):
+    """Invalidate the cards of ``room_ids`` (or every room of ``owner_id``)."""
+    if owner_id is not None:
+        qs = Room.objects.filter(owner_id=owner_id)
+    else:
+        qs = Room.objects.filter(pk__in=list(room_ids))
+    qs.update(version=F("version") + 1)
+
+
+def render_cards(rooms):
+    """
+    Return the card HTML for ``rooms`` (which need only ``pk`` and ``version``),
+    in the same order.
+    """
+    rooms = list(rooms)
+    if not rooms:
+        return []
+
+    cache = _cache()
+    keys = {room.pk: card_key(room) for room in rooms}
+    cached = cache.get_many(list(keys.values()))
+
+    missing = [room.pk for room in rooms if keys[room.pk] not in cached]
+    if missing:
+        full = (
+            Room.objects.filter(pk__in=missing)
+            .select_related("owner__profile", "aggregate")
+            .prefetch_related("images")
+        )
+        asked = {room.pk: room.version for room in rooms}
+        rendered, fresh = {}, {}
+        for room in full:
+            html = render_to_string(CARD_TEMPLATE, {"room": room})
+            rendered[keys[room.pk]] = html
+            # key on the version we were asked for; if it moved on meanwhile
+            # the next request misses and renders again. Rows older than that
+            # (a replica further behind) are shown but never cached.
+            if room.version >= asked[room.pk]:
+                fresh[keys[room.pk]] = html
+        cache.set_many(fresh, CARD_TIMEOUT)
+        cached.update(rendered)
+
+    return [
+        mark_safe(cached[keys[room.pk]]) for room in rooms if keys[room.pk] in cached
+    ]
@@ -0,0 +1,385 @@
+"""
+Coordinates and spatial lookups for rooms.
+
+``Room.location`` is free text, so rooms are geocoded on save against the
+``Place`` table and its ``PlaceAlias`` mapping (an offline stand-in for a real
+geocoding service). Every name a place goes by resolves to one canonical
+``Room.place``, which facets, area demand and recommendations group rooms by.
+On SQLite the coordinates also go into an R-tree virtual table keyed by room
+id. Other backends use the indexed ``Room.geohash`` column instead: a bounding
+box is covered by a handful of geohash cells and each cell is one index range
+scan. Both narrow the search to the box before any distance is computed.
+``manage.py rebuild_geo_index`` re-geocodes everything, e.g. after editing
+places or aliases in the admin.
+
+``room_list`` takes ``near`` (a place name) or ``lat``/``lng`` with an optional
+``radius`` in km, or a ``bbox`` of ``min_lng,min_lat,max_lng,max_lat``, and
+returns the matches closest first, ordered and paged in the database.
+"""
+
+import math
+import re
+import time
+from typing import NamedTuple
+
+from django.db import connection
+from django.db.models import ExpressionWrapper, F, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Place
+from .pagination import PAGE_SIZE, ordered_page
+
+RTREE_TABLE = "listings_room_rtree"
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 100
+GEOHASH_PRECISION = 9
+GEOHASH_MAX_CELLS = 32
+# seconds before another worker's edits to the place tables are picked up
+PLACES_TTL = 300
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+class Area(NamedTuple):
+    lat: float
+    lng: float
+    radius_km: float  # None for a plain bounding box
+    min_lat: float
+    min_lng: float
+    max_lat: float
+    max_lng: float
+
+
+def normalize_text(text):
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def best_match(location, names):
+    """The most specific of ``names`` (normalized) that ``location`` mentions."""
+    text = f" {normalize_text(location)} "
+    best = None
+    for name in names:
+        pos = text.find(f" {name} ")
+        if pos == -1:
+            continue
+        # longer names are more specific ("mamelodi east" over "mamelodi");
+        # on a tie the place named first wins
+        rank = (-len(name), pos)
+        if best is None or rank < best[0]:
+            best = (rank, name)
+    return best[1] if best else None
+
+
+_places = None
+
+
+def places():
+    """
+    ``{name or alias: (place, (lat, lng))}``, normalized, from ``Place`` and
+    ``PlaceAlias`` ("tshwane" -> "Pretoria"). Loaded once per process, again
+    after ``PLACES_TTL`` seconds, or as soon as this process edits either table.
+    """
+    global _places
+    cached = _places
+    if cached is not None and time.monotonic() - cached[0] < PLACES_TTL:
+        return cached[1]
+    entries = [
+        (place, (place.name, (place.latitude, place.longitude)))
+        for place in Place.objects.prefetch_related("aliases")
+    ]
+    # names first, so an alias can't take over another place's own name
+    mapping = {normalize_text(place.name): entry for place, entry in entries}
+    for place, entry in entries:
+        for alias in place.aliases.all():
+            mapping.setdefault(normalize_text(alias.alias), entry)
+    _places = (time.monotonic(), mapping)
+    return mapping
+
+
+def forget_places():
+    """Reload ``places()`` on next use (``listings.signals``)."""
+    global _places
+    _places = None
+
+
+def place_names():
+    """Every canonical place name, sorted."""
+    return sorted({name for name, _ in places().values()})
+
+
+def resolve(location):
+    """
+    ``(place, (lat, lng))`` for the most specific gazetteer place named in
+    ``location``, or ``None``. ``place`` is the canonical display form, the
+    same for every name of one place ("Tshwane" and "PTA" are "Pretoria").
+    """
+    mapping = places()
+    name = best_match(location, mapping)
+    return mapping[name] if name else None
+
+
+def geocode(location):
+    """``(lat, lng)`` of the most specific gazetteer place named in ``location``."""
+    match = resolve(location)
+    return match[1] if match else None
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle (haversine) distance."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def around(lat, lng, radius_km):
+    """The ``Area`` within ``radius_km`` of a point, with its bounding box."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    coslat = math.cos(math.radians(lat))
+    dlng = 180.0 if coslat < 1e-6 else min(180.0, dlat / coslat)
+    return Area(
+        lat,
+        lng,
+        radius_km,
+        max(-90.0, lat - dlat),
+        max(-180.0, lng - dlng),
+        min(90.0, lat + dlat),
+        min(180.0, lng + dlng),
+    )
+
+
+def _float(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def area_from(values):
+    """
+    Build the ``Area`` described by the ``near``/``lat``/``lng``/``radius``/
+    ``bbox`` filter values, or ``None`` if they don't describe one.
+    """
+    if values.get("bbox"):
+        parts = [_float(p) for p in values["bbox"].split(",")]
+        if len(parts) == 4 and None not in parts:
+            min_lng, min_lat, max_lng, max_lat = parts
+            if -90 <= min_lat < max_lat <= 90 and -180 <= min_lng < max_lng <= 180:
+                return Area(
+                    (min_lat + max_lat) / 2,
+                    (min_lng + max_lng) / 2,
+                    None,
+                    min_lat,
+                    min_lng,
+                    max_lat,
+                    max_lng,
+                )
+        return None
+
+    point = None
+    if values.get("near"):
+        point = geocode(values["near"])
+    elif values.get("lat") and values.get("lng"):
+        lat, lng = _float(values["lat"]), _float(values["lng"])
+        if lat is not None and lng is not None and abs(lat) <= 90 and abs(lng) <= 180:
+            point = (lat, lng)
+    if point is None:
+        return None
+
+    radius = _float(values.get("radius")) or DEFAULT_RADIUS_KM
+    return around(*point, max(0.1, min(radius, MAX_RADIUS_KM)))
+
+
+def geohash(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def _cell_size(precision):
+    """``(height, width)`` in degrees of a geohash cell."""
+    bits = 5 * precision
+    lng_bits = (bits + 1) // 2
+    return 180.0 / (1 << (bits - lng_bits)), 360.0 / (1 << lng_bits)
+
+
+def _steps(low, high, step):
+    value = low
+    while value < high:
+        yield value
+        value += step
+    yield high
+
+
+def covering_cells(area):
+    """Geohash prefixes covering ``area``: the finest level needing at most
+    ``GEOHASH_MAX_CELLS`` of them."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size(precision)
+        rows = (area.max_lat - area.min_lat) / height + 2
+        cols = (area.max_lng - area.min_lng) / width + 2
+        if rows * cols > GEOHASH_MAX_CELLS:
+            continue
+        return {
+            geohash(lat, lng, precision)
+            for lat in _steps(area.min_lat, area.max_lat, height)
+            for lng in _steps(area.min_lng, area.max_lng, width)
+        }
+    return {""}
+
+
+_available = {}
+
+LOCATED_FIELDS = ["place", "latitude", "longitude", "geohash"]
+
+
+def backend():
+    """``"rtree"`` on SQLite with the R-tree table, otherwise ``"geohash"``."""
+    if connection.vendor != "sqlite":
+        return "geohash"
+    key = (connection.alias, str(connection.settings_dict["NAME"]))
+    if key not in _available:
+        _available[key] = RTREE_TABLE in connection.introspection.table_names()
+    return "rtree" if _available[key] else "geohash"
+
+
+def locate(room):
+    """Set ``room``'s place, coordinates and geohash from its location text."""
+    place, point = resolve(room.location) or ("", None)
+    room.place = place
+    room.latitude, room.longitude = point or (None, None)
+    room.geohash = geohash(*point) if point else ""
+
+
+def index_rooms(rooms):
+    if backend() != "rtree":
+        return
+    rows = [
+        (room.pk, room.latitude, room.latitude, room.longitude, room.longitude)
+        for room in rooms
+        if room.latitude is not None
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {RTREE_TABLE} WHERE id = %s", [(room.pk,) for room in rooms]
+        )
+        if rows:
+            cursor.executemany(
+                f"INSERT INTO {RTREE_TABLE} (id, min_lat, max_lat, min_lng, max_lng) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+
+
+def index_room(room):
+    index_rooms([room])
+
+
+def remove_room(room_id):
+    if backend() != "rtree":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {RTREE_TABLE} WHERE id = %s", [room_id])
+
+
+def rebuild(batch_size=1000):
+    """Re-geocode and re-index every room. Returns the number geocoded."""
+    from .models import Room
+
+    if backend() == "rtree":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {RTREE_TABLE}")
+
+    located = 0
+    batch = []
+    rooms = Room.objects.order_by("pk").only("id", "location")
+    for room in rooms.iterator(chunk_size=batch_size):
+        locate(room)
+        located += room.latitude is not None
+        batch.append(room)
+        if len(batch) >= batch_size:
+            Room.objects.bulk_update(batch, LOCATED_FIELDS)
+            index_rooms(batch)
+            batch = []
+    Room.objects.bulk_update(batch, LOCATED_FIELDS)
+    index_rooms(batch)
+    return located
+
+
+def filter_area(qs, area):
+    """Restrict a ``Room`` queryset to rows inside ``area``'s bounding box."""
+    if backend() == "rtree":
+        # R-tree coordinates are 32-bit floats; the range filter below is exact
+        qs = qs.filter(
+            id__in=RawSQL(
+                f"SELECT id FROM {RTREE_TABLE} WHERE max_lat >= %s AND min_lat <= %s "
+                "AND max_lng >= %s AND min_lng <= %s",
+                [area.min_lat, area.max_lat, area.min_lng, area.max_lng],
+            )
+        )
+    else:
+        cells = Q()
+        for cell in sorted(covering_cells(area)):
+            cells |= Q(geohash__startswith=cell)
+        qs = qs.filter(cells)
+    return qs.filter(
+        latitude__range=(area.min_lat, area.max_lat),
+        longitude__range=(area.min_lng, area.max_lng),
+    )
+
+
+def nearest_page(qs, area, cursor=None, size=PAGE_SIZE):
+    """
+    Return ``(items, next_cursor)`` for the rooms in ``qs`` inside ``area``,
+    closest to its centre first. Each room gets a ``distance_km`` attribute.
+
+    ``qs`` must already be narrowed with ``filter_area`` and load
+    ``latitude``/``longitude``. The database filters by radius, orders and
+    pages on ``(squared distance, id)`` and returns ``size + 1`` rows. The
+    distance is computed, not indexed, though. Every page reads each room
+    that the R-tree or geohash prefilter finds in the area's bounding box
+    (the geohash cells can reach a little past it). It also computes the
+    distance of each and keeps the closest. So the cost grows with the rooms
+    in the box, and with the radius, not with the page size. Distances in
+    SQL are on an equirectangular projection around the centre, which agrees
+    with the great-circle distance to within metres at ``MAX_RADIUS_KM``.
+    """
+    scale_lat = math.radians(EARTH_RADIUS_KM)
+    scale_lng = scale_lat * math.cos(math.radians(area.lat))
+    dy = (F("latitude") - area.lat) * scale_lat
+    dx = (F("longitude") - area.lng) * scale_lng
+    qs = qs.annotate(
+        distance_sq=ExpressionWrapper(dy * dy + dx * dx, output_field=FloatField())
+    )
+    if area.radius_km is not None:
+        qs = qs.filter(distance_sq__lte=area.radius_km**2)
+    rooms, next_cursor = ordered_page(qs, ("distance_sq", "id"), cursor, size)
+    for room in rooms:
+        room.distance_km = distance_km(
+            area.lat, area.lng, room.latitude, room.longitude
+        )
+    return rooms, next_cursor
@@ -0,0 +1,66 @@
+"""
+HyperLogLog cardinality sketches.
+
+A sketch estimates how many distinct values were added to it from
+``2 ** precision`` one-byte registers: 1 KB at the default precision of 10,
+with about 3% standard error. Below a few thousand values it falls back to
+linear counting, which is close to exact. Sketches of the same precision
+merge by taking the larger of each register, so daily sketches combine into
+one for any range of days. ``to_bytes`` zlib-compresses the registers. A
+sketch that holds only a few values is mostly zeros and stores in a few
+dozen bytes.
+"""
+
+import hashlib
+import math
+import zlib
+
+DEFAULT_PRECISION = 10
+
+
+class HyperLogLog:
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers or self.size)
+        if len(self.registers) != self.size:
+            raise ValueError("wrong number of registers for the precision")
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        x = int.from_bytes(digest, "big")
+        bits = 64 - self.precision
+        index = x >> bits
+        # position of the first 1 bit in the rest of the hash
+        rank = bits - (x & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("can't merge sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = self.size
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        if zeros and estimate <= 2.5 * m:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self):
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        return cls(data[0], zlib.decompress(data[1:]))
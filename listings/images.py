@@ -0,0 +1,203 @@
+"""
+Resized WebP/JPEG variants for uploaded room images.
+
+Uploads are stored without their metadata (``strip_upload()``, from a
+``pre_save`` receiver), so the original, served until the variants exist,
+doesn't give away where a photo was taken. Once the upload's transaction
+commits, ``schedule()`` hands the ids to a small thread pool. For each variant in
+``VARIANTS`` the worker writes a WebP and a JPEG, capped to that variant's
+longest edge, with orientation applied and EXIF metadata dropped. It then
+records the paths on ``RoomImage.variants``. Templates pick the variant they
+need through the ``room_picture`` tag and fall back to the original until it
+is ready. ``manage.py process_images`` (re)processes anything missing.
+
+Configured through ``settings.IMAGE_PIPELINE``::
+
+    IMAGE_PIPELINE = {"WORKERS": 2, "EAGER": False}
+"""
+
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, JpegImagePlugin
+
+from . import fragments
+from .models import RoomImage
+
+logger = logging.getLogger(__name__)
+
+# name -> longest edge in pixels
+VARIANTS = {
+    "card": 480,
+    "detail": 1280,
+    "full": 2048,
+}
+
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+# info keys that describe the shot rather than the picture (camera, GPS
+# position, editing history); the colour profile is kept
+METADATA = ("exif", "xmp", "XML:com.adobe.xmp", "comment")
+
+_executor = None
+
+
+def _config():
+    return {"WORKERS": 2, "EAGER": False, **getattr(settings, "IMAGE_PIPELINE", {})}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=_config()["WORKERS"], thread_name_prefix="room-images"
+        )
+    return _executor
+
+
+def variant_path(image, name, ext, data):
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return f"rooms/variants/{image.pk}/{name}.{digest}.{ext}"
+
+
+def render_variants(source):
+    """Yield ``(name, ext, width, height, bytes)`` for every variant of ``source``."""
+    with Image.open(source) as original:
+        img = ImageOps.exif_transpose(original)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+        for name, edge in VARIANTS.items():
+            resized = img.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+            for ext, (fmt, options) in FORMATS.items():
+                out = resized if fmt != "JPEG" else resized.convert("RGB")
+                buf = BytesIO()
+                # no exif= argument: metadata (GPS etc.) is not carried over
+                out.save(buf, fmt, **options)
+                yield name, ext, resized.width, resized.height, buf.getvalue()
+
+
+def strip_metadata(source):
+    """
+    The bytes of image file ``source`` re-saved in its own format without
+    metadata, orientation applied to the pixels. ``None`` if there is none to
+    drop or Pillow can't read the file (validation rejects that upload).
+    """
+    source.seek(0)
+    try:
+        with Image.open(source) as original:
+            if not original.getexif() and not set(METADATA) & set(original.info):
+                return None
+            fmt = original.format
+            options = {}
+            if "icc_profile" in original.info:
+                options["icc_profile"] = original.info["icc_profile"]
+            if fmt == "JPEG":
+                # the upload's own quantization: no further loss of quality
+                options["qtables"] = original.quantization
+                options["subsampling"] = JpegImagePlugin.get_sampling(original)
+            elif fmt == "WEBP":
+                options["lossless"] = original.info.get("lossless", False)
+            buf = BytesIO()
+            ImageOps.exif_transpose(original).save(buf, fmt, **options)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    finally:
+        source.seek(0)
+    return buf.getvalue()
+
+
+def strip_upload(image):
+    """Replace a ``RoomImage``'s new, unsaved upload with a copy without metadata."""
+    if not image.image or image.image._committed:
+        return
+    data = strip_metadata(image.image.file)
+    if data is not None:
+        image.image.file = File(BytesIO(data), name=image.image.name)
+
+
+def process_image(image_id):
+    image = RoomImage.objects.filter(pk=image_id).first()
+    if image is None or not image.image:
+        return None
+
+    storage = image.image.storage
+    variants = {}
+    try:
+        with image.image.open("rb") as source:
+            with Image.open(source) as probe:
+                width, height = ImageOps.exif_transpose(probe).size
+            source.seek(0)
+            rendered = list(render_variants(source))
+    except (OSError, Image.DecompressionBombError) as e:
+        # unreadable or truncated: the original keeps being served as-is
+        logger.warning("RoomImage %s can't be resized: %s", image_id, e)
+        return None
+    for name, ext, w, h, data in rendered:
+        path = variant_path(image, name, ext, data)
+        if not storage.exists(path):
+            storage.save(path, ContentFile(data))
+        variants.setdefault(name, {"width": w, "height": h})[ext] = path
+
+    RoomImage.objects.filter(pk=image_id).update(
+        variants=variants,
+        width=width,
+        height=height,
+        processed_at=timezone.now(),
+    )
+    fragments.bump([image.room_id])
+    # drop files from an earlier run that the new variants no longer use
+    delete_variants(image, keep=_paths(variants))
+    return variants
+
+
+def _run(image_id):
+    try:
+        process_image(image_id)
+    except Exception:
+        logger.exception("Processing RoomImage %s failed", image_id)
+    finally:
+        connections.close_all()
+
+
+def schedule(image_ids):
+    """Process ``image_ids`` off the request path once the current transaction commits."""
+    image_ids = list(image_ids)
+    if not image_ids:
+        return
+
+    if _config()["EAGER"]:
+        for image_id in image_ids:
+            process_image(image_id)
+        return
+
+    def submit():
+        executor = _get_executor()
+        for image_id in image_ids:
+            executor.submit(_run, image_id)
+
+    transaction.on_commit(submit)
+
+
+def _paths(variants):
+    return {
+        formats[ext]
+        for formats in (variants or {}).values()
+        for ext in FORMATS
+        if formats.get(ext)
+    }
+
+
+def delete_variants(image, keep=()):
+    storage = image.image.storage
+    for path in _paths(image.variants) - set(keep):
+        storage.delete(path)
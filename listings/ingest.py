@@ -0,0 +1,373 @@
+"""
+Buffered ``RoomStat`` ingestion.
+
+Views call ``record()``, which only appends an event to a backend queue. A
+background thread drains the queue with ``bulk_create`` whenever it holds
+``BATCH_SIZE`` events or ``FLUSH_INTERVAL`` seconds have passed, and once more
+at interpreter shutdown. Events leave the queue only once their batch is
+committed; a failed write is retried on the next flush. With the in-memory
+backend a hard crash loses at most what is still buffered; the file backend
+spools to disk so a separate process (``manage.py flush_stats``) can pick up
+anything left behind.
+
+Configured through ``settings.STAT_INGEST``::
+
+    STAT_INGEST = {
+        "BACKEND": "listings.ingest.MemoryBackend",
+        "OPTIONS": {"max_size": 10000},
+        "BATCH_SIZE": 200,
+        "FLUSH_INTERVAL": 2.0,
+        "EAGER": False,  # write inline on every record() (tests)
+    }
+"""
+
+import atexit
+import contextlib
+import json
+import logging
+import os
+import threading
+from collections import deque
+from itertools import islice
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.signals import setting_changed
+from django.db import IntegrityError, connections, router, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import rollups, uniques, writer
+from .models import Room, RoomStat
+from .signals import send_stats_recorded
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BACKEND": "listings.ingest.MemoryBackend",
+    "OPTIONS": {},
+    "BATCH_SIZE": 200,
+    "FLUSH_INTERVAL": 2.0,
+    "EAGER": False,
+}
+
+
+class MemoryBackend:
+    """Bounded in-process queue. When full, the oldest events are dropped."""
+
+    def __init__(self, max_size=10000):
+        self.queue = deque(maxlen=max_size)
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def put(self, event):
+        with self.lock:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(event)
+
+    @contextlib.contextmanager
+    def batch(self, limit):
+        """Up to ``limit`` of the oldest events; removed if the block succeeds."""
+        with self.lock:
+            events = list(islice(self.queue, limit))
+            dropped = self.dropped
+        yield events
+        with self.lock:
+            # a full queue may have pushed some of them out meanwhile
+            done = len(events) - min(len(events), self.dropped - dropped)
+            for _ in range(min(done, len(self.queue))):
+                self.queue.popleft()
+
+    def drain(self, limit):
+        with self.batch(limit) as events:
+            return events
+
+    def __len__(self):
+        return len(self.queue)
+
+
+class FileBackend:
+    """
+    Append-only JSON-lines spool shared by every process on the host.
+
+    ``batch`` moves the spool aside to ``<path>.draining`` and reads it in
+    batches from an offset kept in ``<path>.offset``, so a batch costs only
+    its own lines however long the backlog is. The offset only moves once the
+    batch is written, and the host-wide drain lock is held until then. Writers
+    start a new spool as soon as the old one is moved. Events survive a worker
+    restart until some process flushes them.
+    """
+
+    def __init__(self, path=None):
+        self.path = str(path or settings.BASE_DIR / "roomstat_spool.jsonl")
+        self.draining = self.path + ".draining"
+        self.offset_path = self.path + ".offset"
+        self.lock = threading.Lock()
+        self.drain_lock = threading.Lock()
+        self.pending = 0
+
+    def _locked(self, f):
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+
+    def _is_spool(self, f):
+        try:
+            return os.path.samestat(os.fstat(f.fileno()), os.stat(self.path))
+        except FileNotFoundError:
+            return False
+
+    def put(self, event):
+        line = json.dumps(event) + "\n"
+        with self.lock:
+            while True:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    self._locked(f)
+                    # a drain may have moved the file aside while we waited
+                    if self._is_spool(f):
+                        f.write(line)
+                        break
+            self.pending += 1
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path, encoding="utf-8") as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, offset):
+        with open(self.offset_path, "w", encoding="utf-8") as f:
+            f.write(str(offset))
+
+    def _read_batch(self, limit):
+        """
+        Up to ``limit`` lines from the moved-aside spool, the offset after
+        them and whether that is the end of it.
+        """
+        with open(self.draining, "rb") as f:
+            # wait for a writer that opened the spool before it was moved
+            self._locked(f)
+            f.seek(self._read_offset())
+            lines = []
+            while len(lines) < limit:
+                line = f.readline()
+                if not line:
+                    break
+                lines.append(line)
+            offset = f.tell()
+            done = not f.read(1)
+        return lines, offset, done
+
+    def _ack(self, offset, done):
+        if done:
+            os.remove(self.draining)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.offset_path)
+        else:
+            self._write_offset(offset)
+
+    @contextlib.contextmanager
+    def batch(self, limit):
+        """Up to ``limit`` spooled events; acknowledged if the block succeeds."""
+        with self.drain_lock, open(self.path + ".lock", "a") as lock:
+            # one drainer per host at a time
+            self._locked(lock)
+            lines = []
+            for _ in range(2):
+                if not os.path.exists(self.draining):
+                    try:
+                        os.replace(self.path, self.draining)
+                    except FileNotFoundError:
+                        break
+                lines, offset, done = self._read_batch(limit)
+                if lines or not done:
+                    break
+                # an exhausted old spool: move on to the current one
+                self._ack(offset, done)
+            yield [json.loads(line) for line in lines if line.strip()]
+            if lines:
+                self._ack(offset, done)
+            with self.lock:
+                self.pending = max(0, self.pending - len(lines)) if lines else 0
+
+    def drain(self, limit):
+        with self.batch(limit) as events:
+            return events
+
+    def __len__(self):
+        return self.pending
+
+
+class Pipeline:
+    def __init__(self, config):
+        self.config = {**DEFAULTS, **config}
+        backend_cls = import_string(self.config["BACKEND"])
+        self.backend = backend_cls(**self.config["OPTIONS"])
+        self.batch_size = self.config["BATCH_SIZE"]
+        self.interval = self.config["FLUSH_INTERVAL"]
+        self.eager = self.config["EAGER"]
+        self.wakeup = threading.Event()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+
+    def put(self, event):
+        self.backend.put(event)
+        if self.eager:
+            self.flush()
+            return
+        self._ensure_thread()
+        if len(self.backend) >= self.batch_size:
+            self.wakeup.set()
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self._run, name="roomstat-flusher", daemon=True
+            )
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("RoomStat flush failed")
+            finally:
+                connections.close_all()
+
+    def flush(self):
+        """Write everything queued so far. Returns the number of rows written."""
+        written = 0
+        with self.flush_lock:
+            while True:
+                # if the write raises, the batch stays queued for the next flush
+                with self.backend.batch(self.batch_size) as events:
+                    if not events:
+                        return written
+                    stats = _stats(events)
+                    try:
+                        writer.call(_write, stats)
+                    except IntegrityError:
+                        _forget_deleted_users(stats)
+                        writer.call(_write, stats)
+                written += len(stats)
+
+
+def _stats(events):
+    # rooms deleted since the event was queued would fail the batch; ask the
+    # primary, a replica may not have a just-created room. The rooms ride
+    # along on stat.room for the receivers.
+    live = (
+        Room.objects.db_manager(router.db_for_write(Room))
+        .only(*rollups.STAT_ROOM_FIELDS)
+        .in_bulk({e["room_id"] for e in events})
+    )
+    stats = []
+    for e in events:
+        if e["room_id"] not in live:
+            continue
+        stat = RoomStat(
+            room=live[e["room_id"]],
+            user_id=e["user_id"],
+            stat_type=e["stat_type"],
+            created_at=datetime.fromisoformat(e["created_at"]),
+        )
+        # not a column; read by the unique-viewer sketches
+        stat.viewer = e.get("viewer")
+        stats.append(stat)
+    return stats
+
+
+def _forget_deleted_users(stats):
+    """Drop the users deleted since their events were queued; they'd fail every retry."""
+    user_ids = {s.user_id for s in stats if s.user_id is not None}
+    users = set(
+        User.objects.db_manager(router.db_for_write(User))
+        .filter(pk__in=user_ids)
+        .values_list("pk", flat=True)
+    )
+    for stat in stats:
+        stat.pk = None
+        if stat.user_id not in users:
+            stat.user_id = None
+
+
+def _write(stats):
+    # the raw rows commit on their own; a failing receiver can't lose them
+    with transaction.atomic():
+        RoomStat.objects.bulk_create(stats)
+    send_stats_recorded(stats)
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = Pipeline(getattr(settings, "STAT_INGEST", {}))
+        return _pipeline
+
+
+def record(room, stat_type, user=None, viewer=None):
+    """
+    Queue one ``RoomStat`` event for ``room``; ``user`` may be anonymous.
+    A view with a ``viewer`` (``uniques.viewer_key``) that was already
+    counted within the dedupe window is dropped.
+    """
+    # one bad row would fail the whole batch insert, so reject it up front
+    if stat_type not in dict(RoomStat.STAT_CHOICES):
+        logger.warning("Ignoring unknown RoomStat type %r", stat_type)
+        return
+    room_id = getattr(room, "pk", room)
+    if stat_type == "view" and viewer and not uniques.first_view(viewer, room_id):
+        return
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    get_pipeline().put(
+        {
+            "room_id": room_id,
+            "user_id": user_id,
+            "stat_type": stat_type,
+            "created_at": timezone.now().isoformat(),
+            "viewer": viewer,
+        }
+    )
+
+
+async def arecord(room, stat_type, user=None, viewer=None):
+    """``record()`` for async views (the pipeline may write to the database)."""
+    await sync_to_async(record)(room, stat_type, user, viewer)
+
+
+def flush():
+    return get_pipeline().flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    if _pipeline is not None:
+        try:
+            _pipeline.flush()
+        except Exception:
+            logger.exception("RoomStat flush at exit failed")
+
+
+@receiver(setting_changed)
+def _reset_pipeline(setting, **kwargs):
+    global _pipeline
+    if setting == "STAT_INGEST":
+        with _pipeline_lock:
+            _pipeline = None
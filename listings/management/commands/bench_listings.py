@@ -0,0 +1,347 @@
+import http.client
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from listings.models import Room
+
+from .loadtest import percentile
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+CURSOR = re.compile(r"[?&;]cursor=([\w-]+)")
+
+
+def scenarios():
+    """``(name, path, login)`` for each view and room_list filter combination."""
+    rooms = Room.objects.filter(is_available=True)
+    room = rooms.order_by("-pk").only("id", "place").first()
+    if room is None:
+        raise CommandError("No available rooms; run seed_data first.")
+    place = (
+        rooms.exclude(place="")
+        .values("place")
+        .annotate(n=Count("id"))
+        .order_by("-n")
+        .values_list("place", flat=True)
+        .first()
+    ) or "Hatfield"
+    owner = (
+        Room.objects.filter(owner__profile__role="landlord")
+        .values_list("owner__username", flat=True)
+        .first()
+    )
+    tenant = (
+        User.objects.filter(profile__role="tenant")
+        .values_list("username", flat=True)
+        .first()
+    )
+
+    room_list = reverse("room_list")
+
+    def listing(name, **params):
+        return (f"room_list {name}", f"{room_list}?{urlencode(params)}", None)
+
+    return [
+        ("room_list", room_list, None),
+        listing("q", q="garden"),
+        listing("location", location=place),
+        listing("type", type="single"),
+        listing("price", price="1500-2500"),
+        listing("place", place=place),
+        listing("rating", rating="4"),
+        listing("near", near=place, radius=5),
+        listing("q+type+price", q="room", type="single", price="2500-3500"),
+        ("room_list page 2", room_list + "?cursor={cursor}", None),
+        ("room_detail", reverse("room_detail", args=[room.pk]), None),
+        ("services", reverse("services"), None),
+        ("dashboard", reverse("dashboard"), owner),
+        (
+            "track_contact",
+            reverse("track_contact", args=[room.pk, "whatsapp"]),
+            tenant,
+        ),
+    ]
+
+
+class ClientSession:
+    """Requests through Django's test client, in this process."""
+
+    def __init__(self, username):
+        self.client = Client(HTTP_HOST="localhost")
+        if username:
+            self.client.force_login(User.objects.get(username=username))
+
+    def get(self, path):
+        response = self.client.get(path)
+        body = b"" if response.streaming else response.content
+        return response.status_code, response.get("Server-Timing", ""), body
+
+    def close(self):
+        pass
+
+
+class HttpSession:
+    """Requests over HTTP to a running server."""
+
+    def __init__(self, target, cookie, timeout):
+        parts = urlsplit(target)
+        self.conn = http.client.HTTPConnection(
+            parts.hostname, parts.port or 80, timeout=timeout
+        )
+        self.headers = {"Cookie": cookie} if cookie else {}
+
+    def get(self, path):
+        self.conn.request("GET", path, headers=self.headers)
+        response = self.conn.getresponse()
+        body = response.read()
+        return response.status, response.getheader("Server-Timing", ""), body
+
+    def close(self):
+        self.conn.close()
+
+
+def run(session_factory, path, requests, concurrency, warmup):
+    """Issue ``requests`` GETs of ``path``; returns latency/query/status stats."""
+    latencies = []
+    queries = []
+    statuses = {}
+    lock = threading.Lock()
+    per_worker = [requests // concurrency] * concurrency
+    for i in range(requests % concurrency):
+        per_worker[i] += 1
+
+    def worker(count):
+        session = session_factory()
+        try:
+            for _ in range(warmup):
+                session.get(path)
+            for _ in range(count):
+                start = time.perf_counter()
+                status, timing, _ = session.get(path)
+                elapsed = time.perf_counter() - start
+                match = QUERIES.search(timing)
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if match:
+                        queries.append(int(match.group(1)))
+        finally:
+            session.close()
+
+    def threaded_worker(count):
+        try:
+            worker(count)
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(requests)
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(threaded_worker, per_worker))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "queries": sum(queries) / len(queries) if queries else None,
+        "statuses": statuses,
+    }
+
+
+def regressions(result, base, tolerance):
+    """Why ``result`` is worse than ``base``, if it is."""
+    found = []
+    if result["p95"] > base["p95"] * (1 + tolerance):
+        found.append(f"p95 {base['p95']:.1f} -> {result['p95']:.1f}ms")
+    if base.get("queries") is not None and (result["queries"] or 0) > base["queries"]:
+        found.append(f"queries {base['queries']:.1f} -> {result['queries']:.1f}")
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the listing views (every room_list filter combination, "
+        "room_detail, services, dashboard, track_contact) through the test "
+        "client or against a running server. Reports p50/p95/p99, queries per "
+        "request (from the Server-Timing header) and throughput, and compares "
+        "them with a saved baseline. Seed a database first with seed_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Per scenario.")
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument(
+            "--warmup", type=int, default=2, help="Untimed requests per worker."
+        )
+        parser.add_argument(
+            "--only", action="append", help="Run only scenarios starting with this."
+        )
+        parser.add_argument(
+            "--target",
+            help="Base URL of a running server; default is the in-process test client.",
+        )
+        parser.add_argument(
+            "--cookie",
+            default="",
+            help="With --target: Cookie header for the dashboard/track_contact "
+            "scenarios (a landlord's session); they're skipped without one. "
+            "Raise the server's RATE_LIMIT_TRACK_CONTACT for the run, or "
+            "track_contact measures the 429s.",
+        )
+        parser.add_argument("--timeout", type=float, default=30.0)
+        parser.add_argument("--save", metavar="PATH", help="Write results as JSON.")
+        parser.add_argument(
+            "--baseline", metavar="PATH", help="Compare with results saved by --save."
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed p95 slowdown against the baseline (0.2 = 20%%).",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error if any scenario regressed.",
+        )
+
+    def _session_factory(self, options, login):
+        if options["target"]:
+            return lambda: HttpSession(
+                options["target"], options["cookie"], options["timeout"]
+            )
+        return lambda: ClientSession(login)
+
+    def handle(self, *args, **options):
+        if options["target"] and urlsplit(options["target"]).scheme != "http":
+            raise CommandError("Only plain http:// targets are supported.")
+        if options["concurrency"] < 1 or options["requests"] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1.")
+
+        baseline = {}
+        if options["baseline"]:
+            try:
+                with open(options["baseline"]) as f:
+                    saved = json.load(f)
+                baseline = saved["results"]
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f"Can't read baseline: {exc}")
+            if saved.get("concurrency") != options["concurrency"]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"The baseline ran at concurrency {saved.get('concurrency')}; "
+                        "latencies aren't comparable."
+                    )
+                )
+
+        if options["target"]:
+            self._run(options, baseline)
+        else:
+            # every request comes from one user: the limits would answer most
+            # of them with 429 and the bench would time the throttle
+            limits = {**getattr(settings, "RATE_LIMITS", {}), "ENABLED": False}
+            with override_settings(RATE_LIMITS=limits):
+                self._run(options, baseline)
+
+    def _run(self, options, baseline):
+        selected = [
+            scenario
+            for scenario in scenarios()
+            if not options["only"]
+            or any(scenario[0].startswith(prefix) for prefix in options["only"])
+        ]
+
+        self.stdout.write(
+            f"{options['requests']} requests per scenario, "
+            f"concurrency {options['concurrency']}"
+        )
+        self.stdout.write(
+            f"{'scenario':<26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'queries':>8}  vs baseline"
+        )
+        results = {}
+        regressed = []
+        cursor = None
+        for name, path, login in selected:
+            if "{cursor}" in path:
+                if cursor is None:
+                    continue
+                path = path.format(cursor=cursor)
+            if login is not None and options["target"] and not options["cookie"]:
+                self.stdout.write(f"{name:<26} skipped (needs --cookie)")
+                continue
+            factory = self._session_factory(options, login)
+            if name == "room_list":
+                # the first page links to the second
+                session = factory()
+                match = CURSOR.search(session.get(path)[2].decode())
+                session.close()
+                cursor = match.group(1) if match else None
+
+            result = run(
+                factory,
+                path,
+                options["requests"],
+                options["concurrency"],
+                options["warmup"],
+            )
+            results[name] = result
+            errors = {code: n for code, n in result["statuses"].items() if code >= 400}
+
+            comparison = ""
+            if name in baseline:
+                base = baseline[name]
+                change = (
+                    (result["p95"] - base["p95"]) / base["p95"] if base["p95"] else 0
+                )
+                found = regressions(result, base, options["tolerance"])
+                comparison = f"p95 {change:+.0%}"
+                if found:
+                    regressed.append(f"{name}: {', '.join(found)}")
+                    comparison += "  REGRESSED"
+            if errors:
+                comparison += f"  errors: {errors}"
+            queries = "-" if result["queries"] is None else f"{result['queries']:.1f}"
+            self.stdout.write(
+                f"{name:<26} {result['rps']:>8.1f} {result['p50']:>8.1f} "
+                f"{result['p95']:>8.1f} {result['p99']:>8.1f} {queries:>8}  "
+                f"{comparison}"
+            )
+
+        if options["save"]:
+            with open(options["save"], "w") as f:
+                json.dump(
+                    {
+                        "target": options["target"] or "test client",
+                        "requests": options["requests"],
+                        "concurrency": options["concurrency"],
+                        "results": results,
+                    },
+                    f,
+                    indent=2,
+                    sort_keys=True,
+                )
+            self.stdout.write(f"Saved results to {options['save']}.")
+
+        if regressed:
+            message = "Slower than the baseline:\n  " + "\n  ".join(regressed)
+            if options["fail_on_regression"]:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
@@ -0,0 +1,219 @@
+import os
+import queue
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from .loadtest import percentile
+
+SCHEMA = [
+    "CREATE TABLE room (id INTEGER PRIMARY KEY, title TEXT, location TEXT, "
+    "price REAL, is_available INTEGER, created_at TEXT)",
+    "CREATE INDEX room_available_recent ON room (created_at DESC, id DESC) "
+    "WHERE is_available",
+    "CREATE TABLE stat (id INTEGER PRIMARY KEY, room_id INTEGER, "
+    "stat_type TEXT, created_at TEXT)",
+    "CREATE INDEX stat_room ON stat (room_id, stat_type)",
+]
+READ = (
+    "SELECT id, title, location, price FROM room WHERE is_available "
+    "ORDER BY created_at DESC, id DESC LIMIT 24 OFFSET ?"
+)
+WRITE = "INSERT INTO stat (room_id, stat_type, created_at) VALUES (?, 'view', ?)"
+
+
+def _connect(path, tuned, timeout):
+    conn = sqlite3.connect(
+        path, timeout=timeout, isolation_level=None, check_same_thread=False
+    )
+    if tuned:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+def _seed(path, rooms):
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    now = datetime.now(timezone.utc)
+    conn.executemany(
+        "INSERT INTO room (title, location, price, is_available, created_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (
+            (
+                f"Room {i}",
+                "Hatfield",
+                1500 + i % 3000,
+                i % 10 != 0,
+                (now - timedelta(minutes=i)).isoformat(),
+            )
+            for i in range(rooms)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.writes = []
+        self.errors = 0
+
+
+def _insert(conn):
+    conn.execute("BEGIN")
+    try:
+        conn.execute(WRITE, (random.randint(1, 1000), time.time()))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def run(path, tuned, readers, writers, duration, timeout):
+    stats = Stats()
+    deadline = time.perf_counter() + duration
+    write_queue = queue.Queue()
+
+    def reader():
+        conn = _connect(path, tuned, timeout)
+        while time.perf_counter() < deadline:
+            try:
+                conn.execute(READ, (random.randint(0, 40) * 24,)).fetchall()
+            except sqlite3.OperationalError:
+                with stats.lock:
+                    stats.errors += 1
+                continue
+            with stats.lock:
+                stats.reads += 1
+        conn.close()
+
+    def single_writer():
+        # the tuned profile's write queue: one thread commits every queued
+        # insert together
+        conn = _connect(path, tuned, timeout)
+        stop = False
+        while not stop:
+            batch = [write_queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [done for done in batch if done is not None]
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for _ in batch:
+                    conn.execute(WRITE, (random.randint(1, 1000), time.time()))
+                conn.execute("COMMIT")
+            except sqlite3.OperationalError as exc:
+                conn.execute("ROLLBACK")
+                for done in batch:
+                    done["error"] = exc
+            for done in batch:
+                done["event"].set()
+        conn.close()
+
+    def writer():
+        conn = None if tuned else _connect(path, tuned, timeout)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if tuned:
+                    done = {"event": threading.Event(), "error": None}
+                    write_queue.put(done)
+                    done["event"].wait()
+                    if done["error"]:
+                        raise done["error"]
+                else:
+                    _insert(conn)
+            except sqlite3.OperationalError:
+                with stats.lock:
+                    stats.errors += 1
+                continue
+            with stats.lock:
+                stats.writes.append(time.perf_counter() - start)
+        if conn is not None:
+            conn.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    queue_thread = threading.Thread(target=single_writer)
+    if tuned:
+        queue_thread.start()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if tuned:
+        write_queue.put(None)
+        queue_thread.join()
+
+    latencies = sorted(stats.writes)
+    return {
+        "reads": stats.reads / elapsed,
+        "writes": len(latencies) / elapsed,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "errors": stats.errors,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare SQLite read/write throughput with Django's defaults and with "
+        "the tuned profile (WAL, synchronous=NORMAL, mmap, IMMEDIATE writes "
+        "through one writer thread) on a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=5.0)
+        parser.add_argument("--rooms", type=int, default=5000)
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=5.0,
+            help="Busy timeout in seconds for both runs (Django's default is 5).",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['readers']} readers, {options['writers']} writers, "
+            f"{options['duration']:.0f}s each"
+        )
+        self.stdout.write(
+            f"{'profile':<10} {'reads/s':>9} {'writes/s':>9} "
+            f"{'write p95':>10} {'write p99':>10} {'errors':>7}"
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, tuned in (("default", False), ("tuned", True)):
+                path = os.path.join(tmp, f"{name}.sqlite3")
+                _seed(path, options["rooms"])
+                result = run(
+                    path,
+                    tuned,
+                    options["readers"],
+                    options["writers"],
+                    options["duration"],
+                    options["timeout"],
+                )
+                self.stdout.write(
+                    f"{name:<10} {result['reads']:>9.0f} {result['writes']:>9.0f} "
+                    f"{result['p95']:>8.1f}ms {result['p99']:>8.1f}ms "
+                    f"{result['errors']:>7}"
+                )
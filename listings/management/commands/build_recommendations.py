@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from listings import recommend
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute the similar rooms shown on each room's page. Run it "
+        "periodically: by default only areas with new rooms or new views since "
+        "the last run are rebuilt; --full rebuilds everything (and picks up "
+        "edited and removed rooms)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true")
+        parser.add_argument("--top-k", type=int, default=recommend.TOP_K)
+
+    def handle(self, *args, **options):
+        if options["top_k"] < 1:
+            raise CommandError("--top-k must be at least 1.")
+        started = time.perf_counter()
+        rebuilt = recommend.build(full=options["full"], k=options["top_k"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt recommendations for {rebuilt} rooms in "
+                f"{time.perf_counter() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from listings import bulk
+from listings.models import Room
+
+
+class Command(BaseCommand):
+    help = "Export rooms and their image names as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", help="Only this landlord's rooms.")
+        parser.add_argument("--format", choices=bulk.FORMATS)
+        parser.add_argument(
+            "--output", default="-", help="File to write, or - for stdout."
+        )
+
+    def handle(self, *args, **options):
+        rooms = Room.objects.all()
+        if options["owner"]:
+            rooms = rooms.filter(owner__username=options["owner"])
+        path = options["output"]
+        fmt = options["format"] or bulk.format_of(path)
+
+        try:
+            out = sys.stdout.buffer if path == "-" else open(path, "wb")
+        except OSError as exc:
+            raise CommandError(f"Can't write {path}: {exc}")
+        try:
+            for chunk in bulk.export_rows(rooms, fmt):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
@@ -0,0 +1,69 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from listings import duplicates
+from listings.models import Room
+
+
+class Command(BaseCommand):
+    help = (
+        "Find rooms whose descriptions are near duplicates of each other, "
+        "across all landlords (MinHash over word shingles, with LSH to avoid "
+        "comparing every pair)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.8,
+            help="Estimated Jaccard similarity to count as a duplicate.",
+        )
+        parser.add_argument(
+            "--available", action="store_true", help="Only available rooms."
+        )
+        parser.add_argument(
+            "--cross-owner",
+            action="store_true",
+            help="Only report groups that span more than one landlord.",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not 0 < options["threshold"] <= 1:
+            raise CommandError("--threshold must be in (0, 1].")
+        started = time.perf_counter()
+        rooms = Room.objects.order_by("pk")
+        if options["available"]:
+            rooms = rooms.filter(is_available=True)
+        groups = duplicates.near_duplicates(
+            rooms.values_list("pk", "owner_id", "description").iterator(
+                chunk_size=options["batch_size"]
+            ),
+            threshold=options["threshold"],
+        )
+        if options["cross_owner"]:
+            groups = [
+                group for group in groups if len({owner for _, owner in group}) > 1
+            ]
+
+        names = dict(
+            User.objects.filter(
+                pk__in={owner for group in groups for _, owner in group}
+            ).values_list("pk", "username")
+        )
+        for group in groups:
+            self.stdout.write(
+                ", ".join(
+                    f"{room_id} ({names.get(owner, 'no owner')})"
+                    for room_id, owner in group
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(groups)} groups, {sum(map(len, groups))} rooms "
+                f"({time.perf_counter() - started:.1f}s)."
+            )
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from listings import ingest
+
+
+class Command(BaseCommand):
+    help = "Write any queued RoomStat events (e.g. a file spool) to the database."
+
+    def handle(self, *args, **options):
+        written = ingest.flush()
+        self.stdout.write(self.style.SUCCESS(f"Flushed {written} stat events."))
@@ -0,0 +1,63 @@
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from listings import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        "Import rooms for one landlord from a CSV or JSON Lines file (as "
+        "written by export_rooms). Rows are validated like the add-room form, "
+        "duplicates of existing rooms are skipped, and the rest are inserted "
+        "in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to read, or - for stdin.")
+        parser.add_argument("--owner", required=True, help="Landlord's username.")
+        parser.add_argument("--format", choices=bulk.FORMATS)
+        parser.add_argument("--chunk-size", type=int, default=bulk.CHUNK_SIZE)
+        parser.add_argument(
+            "--with-images",
+            action="store_true",
+            help="Attach the stored files named in the images column.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Validate without saving."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options["owner"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['owner']!r}.")
+        path = options["path"]
+        fmt = options["format"] or bulk.format_of(path)
+
+        started = time.perf_counter()
+        try:
+            stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+        except OSError as exc:
+            raise CommandError(f"Can't read {path}: {exc}")
+        with stream:
+            result = bulk.import_rooms(
+                owner,
+                bulk.read_rows(stream, fmt),
+                chunk_size=options["chunk_size"],
+                with_images=options["with_images"],
+                dry_run=options["dry_run"],
+            )
+        elapsed = time.perf_counter() - started
+
+        for line, message in result.errors:
+            self.stderr.write(f"Line {line}: {message}")
+        verb = "Would import" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {result.created} rooms in {elapsed:.1f}s "
+                f"({result.duplicates} duplicates, {result.invalid} invalid)."
+            )
+        )
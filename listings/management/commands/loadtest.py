@@ -0,0 +1,133 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(
+        len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1)))
+    )
+    return sorted_values[index]
+
+
+async def fetch(host, port, request, timeout):
+    """Send one raw HTTP/1.1 request; return the status code."""
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, port), timeout
+    )
+    try:
+        writer.write(request)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        # drain the rest so the server isn't left writing to a closed socket
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def run(target, paths, concurrency, duration, cookie, timeout):
+    parts = urlsplit(target)
+    host, port = parts.hostname, parts.port or 80
+    headers = f"Host: {parts.netloc}\r\nConnection: close\r\n"
+    if cookie:
+        headers += f"Cookie: {cookie}\r\n"
+    requests = [
+        f"GET {path} HTTP/1.1\r\n{headers}\r\n".encode("latin-1") for path in paths
+    ]
+
+    latencies = []
+    statuses = {}
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset):
+        nonlocal errors
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await fetch(host, port, requests[i % len(requests)], timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+            i += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Hold N concurrent connections open against one or more running "
+        "servers and report throughput and latency for each (e.g. gunicorn "
+        "sync workers vs uvicorn, see rentaroom/asgi.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Paths to request, in turn.")
+        parser.add_argument(
+            "--target",
+            action="append",
+            help="Base URL of a running server; repeat to compare servers.",
+        )
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--duration", type=float, default=10.0)
+        parser.add_argument("--timeout", type=float, default=30.0)
+        parser.add_argument(
+            "--cookie",
+            default="",
+            help="Cookie header to send, e.g. 'sessionid=...' for login_required views.",
+        )
+
+    def handle(self, *args, **options):
+        targets = options["target"] or ["http://127.0.0.1:8000"]
+        for target in targets:
+            if urlsplit(target).scheme != "http":
+                raise CommandError(
+                    f"Only plain http:// targets are supported: {target}"
+                )
+
+        self.stdout.write(
+            f"{options['concurrency']} connections, {options['duration']:.0f}s per target"
+        )
+        self.stdout.write(
+            f"{'target':<32} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'errors':>7}  statuses"
+        )
+        for target in targets:
+            result = asyncio.run(
+                run(
+                    target,
+                    options["paths"],
+                    options["concurrency"],
+                    options["duration"],
+                    options["cookie"],
+                    options["timeout"],
+                )
+            )
+            statuses = ", ".join(
+                f"{code}: {n}" for code, n in sorted(result["statuses"].items())
+            )
+            self.stdout.write(
+                f"{target:<32} {result['rps']:>8.1f} {result['p50']:>8.1f} "
+                f"{result['p95']:>8.1f} {result['p99']:>8.1f} {result['errors']:>7}  "
+                f"{statuses}"
+            )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from listings import images
+from listings.models import RoomImage
+
+
+class Command(BaseCommand):
+    help = "Build resized WebP/JPEG variants for room images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Reprocess every image, not just those without variants.",
+        )
+
+    def handle(self, *args, **options):
+        qs = RoomImage.objects.order_by("pk")
+        if not options["all"]:
+            qs = qs.filter(processed_at__isnull=True)
+
+        done = failed = 0
+        for image_id in qs.values_list("pk", flat=True).iterator():
+            try:
+                variants = images.process_image(image_id)
+            except (OSError, ValueError) as exc:
+                failed += 1
+                self.stderr.write(f"Image {image_id}: {exc}")
+                continue
+            if variants is None:
+                # gone since the query, or unreadable (process_image logs why)
+                failed += 1
+                self.stderr.write(f"Image {image_id}: not processed")
+            else:
+                done += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {done} images ({failed} failed).")
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from listings import areas, counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute time-decayed demand per place from the daily view rollups. "
+        "Run rebuild_geo_index first if rooms' places need re-resolving."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        places = areas.rebuild(batch_size=options["batch_size"])
+        counters.invalidate("area_heatmap")
+        self.stdout.write(self.style.SUCCESS(f"{places} places have demand."))
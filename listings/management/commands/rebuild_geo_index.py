@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from listings import geo
+
+
+class Command(BaseCommand):
+    help = "Re-geocode room locations and rebuild the spatial index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        located = geo.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Geocoded {located} rooms ({geo.backend()} index).")
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from listings import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for room listings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if search.backend() is None:
+            raise CommandError(
+                "No full-text index on this database; run migrate first "
+                "(SQLite needs FTS5, otherwise Postgres is required)."
+            )
+        total = search.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} rooms."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from listings import aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute per-room review/rating/contact counters and repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many rooms have drifted.",
+        )
+
+    def handle(self, *args, **options):
+        repaired = aggregates.reconcile(dry_run=options["dry_run"])
+        verb = "need repair" if options["dry_run"] else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"{repaired} room aggregates {verb}."))
@@ -0,0 +1,64 @@
+from datetime import datetime, time, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from listings import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain RoomStat rollups: backfill them from raw events, compact old "
+        "hourly buckets and prune raw events past the retention window."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Rebuild rollups from raw RoomStat rows.",
+        )
+        parser.add_argument(
+            "--since",
+            help="With --backfill, only rebuild buckets from this date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--compact",
+            type=int,
+            metavar="DAYS",
+            help="Drop hourly rollups older than DAYS (daily rollups are kept).",
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Delete raw RoomStat rows older than ROOMSTAT_RETENTION_DAYS.",
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            help="Override ROOMSTAT_RETENTION_DAYS for --prune.",
+        )
+
+    def handle(self, *args, **options):
+        if not (options["backfill"] or options["compact"] or options["prune"]):
+            raise CommandError("Nothing to do: pass --backfill, --compact or --prune.")
+
+        if options["backfill"]:
+            since = None
+            if options["since"]:
+                try:
+                    day = datetime.strptime(options["since"], "%Y-%m-%d").date()
+                except ValueError:
+                    raise CommandError("--since must look like YYYY-MM-DD.")
+                since = datetime.combine(day, time.min, tzinfo=timezone.utc)
+            written = rollups.backfill(since=since)
+            self.stdout.write(f"Wrote {written} rollup rows.")
+
+        if options["compact"]:
+            deleted = rollups.compact(keep_hourly_days=options["compact"])
+            self.stdout.write(f"Removed {deleted} hourly rollup rows.")
+
+        if options["prune"]:
+            deleted = rollups.prune_raw(days=options["retention_days"])
+            self.stdout.write(f"Pruned {deleted} raw stat events.")
+
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,428 @@
+import io
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from listings import areas, counters, duplicates, facets, geo, rollups, search, uniques
+from listings.hll import HyperLogLog
+from listings.models import (
+    Contact,
+    LocationStatRollup,
+    OwnerStatRollup,
+    Profile,
+    Review,
+    Room,
+    RoomAggregate,
+    RoomImage,
+    RoomStat,
+    RoomStatRollup,
+    RoomViewSketch,
+    SiteStatRollup,
+    StatRollup,
+)
+
+# seeded files stay apart from uploads, so they can be told apart and removed
+PLACEHOLDER = "seed/placeholder.jpg"
+PLACEHOLDER_SIZE = (960, 640)
+
+ADJECTIVES = ["Sunny", "Quiet", "Spacious", "Cosy", "Modern", "Secure", "Bright"]
+NOUNS = ["room", "flatlet", "garden cottage", "studio", "loft", "apartment"]
+STREETS = ["Church", "Park", "Jacaranda", "Station", "Voortrekker", "Main", "Hill"]
+FEATURES = [
+    "close to campus",
+    "prepaid electricity",
+    "fibre included",
+    "secure parking",
+    "near taxi rank",
+    "shared kitchen",
+    "own bathroom",
+    "garden access",
+]
+# (stat_type, weight): mostly views, a few contacts, fewer successes
+STAT_MIX = [
+    ("view", 80),
+    ("contact_phone", 5),
+    ("contact_whatsapp", 7),
+    ("contact_email", 3),
+    ("success", 5),
+]
+
+
+def _placeholder():
+    """Save one shared image for every seeded RoomImage to point at."""
+    if not default_storage.exists(PLACEHOLDER):
+        buffer = io.BytesIO()
+        Image.new("RGB", PLACEHOLDER_SIZE, (180, 200, 190)).save(buffer, "JPEG")
+        default_storage.save(PLACEHOLDER, ContentFile(buffer.getvalue()))
+    return PLACEHOLDER
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic users, rooms, images, reviews, "
+        "contacts and view/contact events for benchmarking (see bench_listings). "
+        "Rows go in with bulk inserts, then the search/geo indexes, aggregates "
+        "and rollups are brought up to date for them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=1000)
+        parser.add_argument(
+            "--owners", type=int, help="Landlord accounts (default: rooms / 20)."
+        )
+        parser.add_argument(
+            "--tenants", type=int, help="Tenant accounts (default: rooms / 5)."
+        )
+        parser.add_argument("--images", type=int, default=1, help="Images per room.")
+        parser.add_argument(
+            "--reviews", type=float, default=2.0, help="Average reviews per room."
+        )
+        parser.add_argument(
+            "--contacts", type=float, default=3.0, help="Average contacts per room."
+        )
+        parser.add_argument(
+            "--stats", type=int, help="RoomStat events in total (default: rooms * 50)."
+        )
+        parser.add_argument(
+            "--days", type=int, default=30, help="Spread events over this many days."
+        )
+        parser.add_argument(
+            "--skip-rollups",
+            action="store_true",
+            help="Don't rebuild hourly/daily rollups for the seeded window "
+            "(slow for tens of millions of events; all-time totals are still kept).",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--prefix", default="seed", help="Username prefix.")
+        parser.add_argument(
+            "--password",
+            default="seed-password",
+            help="Password for every seeded account.",
+        )
+        parser.add_argument("--seed", type=int, help="Random seed.")
+
+    def _step(self, label, count, started):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{label:<12} {count:>10} rows  {elapsed:7.1f}s  {rate:9.0f}/s"
+        )
+
+    def handle(self, *args, **options):
+        if options["rooms"] < 1:
+            raise CommandError("--rooms must be at least 1.")
+        self.rng = random.Random(options["seed"])
+        self.place_of = {}
+        self.fingerprints = set()
+        self.places = geo.place_names()
+        self.demand = {}
+        # (room, day) -> signed-in viewers, for the unique-viewer sketches
+        self.viewers = defaultdict(set)
+        self.batch_size = options["batch_size"]
+        rooms = options["rooms"]
+
+        owners = self._users(
+            "owner", options["owners"] or max(1, rooms // 20), "landlord", options
+        )
+        tenants = self._users(
+            "tenant", options["tenants"] or max(1, rooms // 5), "tenant", options
+        )
+        room_ids = self._rooms(rooms, owners)
+        self._images(room_ids, options["images"])
+        ratings = self._reviews(room_ids, tenants, options["reviews"])
+        self._contacts(room_ids, tenants, options["contacts"])
+        since = timezone.now() - timedelta(days=options["days"])
+        events = self._stats(room_ids, tenants, options["stats"] or rooms * 50, since)
+        self._derived(
+            room_ids, ratings, events, None if options["skip_rollups"] else since
+        )
+        self.stdout.write(self.style.SUCCESS(f"Seeded {len(room_ids)} rooms."))
+
+    def _users(self, role, count, profile_role, options):
+        started = time.perf_counter()
+        prefix = f"{options['prefix']}-{role}-"
+        offset = User.objects.filter(username__startswith=prefix).count()
+        password = make_password(options["password"])
+        users = [
+            User(
+                username=f"{prefix}{offset + i}",
+                email=f"{prefix}{offset + i}@example.com",
+                password=password,
+            )
+            for i in range(count)
+        ]
+        users = User.objects.bulk_create(users, batch_size=self.batch_size)
+        # bulk_create skips the post_save signal that creates profiles
+        Profile.objects.bulk_create(
+            [Profile(user=user, role=profile_role) for user in users],
+            batch_size=self.batch_size,
+        )
+        self._step(f"{role}s", count, started)
+        return [user.pk for user in users]
+
+    def _room(self, owner_id):
+        while True:
+            room = self._random_room(owner_id)
+            # owners are created by this run, so this is every room they have
+            duplicates.assign(room)
+            if (owner_id, room.fingerprint) not in self.fingerprints:
+                self.fingerprints.add((owner_id, room.fingerprint))
+                break
+        # pre_save doesn't run for bulk_create
+        geo.locate(room)
+        return room
+
+    def _random_room(self, owner_id):
+        rng = self.rng
+        place = rng.choice(self.places)
+        return Room(
+            owner_id=owner_id,
+            title=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} in {place}",
+            description=", ".join(rng.sample(FEATURES, 3)).capitalize() + ".",
+            price=rng.randrange(800, 8000, 50),
+            location=f"{rng.choice(STREETS)} Street, {place}",
+            room_type=rng.choice(Room.ROOM_TYPES)[0],
+            contact_phone=f"+27 7{rng.randint(0, 9)} {rng.randint(0, 999):03} "
+            f"{rng.randint(0, 9999):04}",
+            is_available=rng.random() < 0.9,
+        )
+
+    def _rooms(self, count, owners):
+        started = time.perf_counter()
+        ids = []
+        for start in range(0, count, self.batch_size):
+            batch = [
+                self._room(self.rng.choice(owners))
+                for _ in range(min(self.batch_size, count - start))
+            ]
+            with transaction.atomic():
+                batch = Room.objects.bulk_create(batch)
+                search.index_rooms(batch)
+                geo.index_rooms(batch)
+            ids.extend(room.pk for room in batch)
+            self.place_of.update((room.pk, room.place) for room in batch)
+        self._step("rooms", count, started)
+        return ids
+
+    def _images(self, room_ids, per_room):
+        if per_room < 1:
+            return
+        started = time.perf_counter()
+        name = _placeholder()
+        width, height = PLACEHOLDER_SIZE
+        images = [
+            RoomImage(room_id=room_id, image=name, width=width, height=height)
+            for room_id in room_ids
+            for _ in range(per_room)
+        ]
+        RoomImage.objects.bulk_create(images, batch_size=self.batch_size)
+        self._step("images", len(images), started)
+
+    def _per_room(self, room_ids, average):
+        for room_id in room_ids:
+            yield room_id, self.rng.randint(0, round(average * 2))
+
+    def _reviews(self, room_ids, tenants, average):
+        started = time.perf_counter()
+        ratings = {}
+        reviews = []
+        for room_id, n in self._per_room(room_ids, average):
+            for _ in range(n):
+                rating = self.rng.choices([1, 2, 3, 4, 5], [1, 1, 2, 4, 4])[0]
+                reviews.append(
+                    Review(
+                        room_id=room_id, user_id=self.rng.choice(tenants), rating=rating
+                    )
+                )
+                count, total = ratings.get(room_id, (0, 0))
+                ratings[room_id] = (count + 1, total + rating)
+        Review.objects.bulk_create(reviews, batch_size=self.batch_size)
+        self._step("reviews", len(reviews), started)
+        return ratings
+
+    def _contacts(self, room_ids, tenants, average):
+        started = time.perf_counter()
+        contacts = [
+            Contact(room_id=room_id, user_id=user_id)
+            for room_id, n in self._per_room(room_ids, average)
+            for user_id in self.rng.sample(tenants, min(n, len(tenants)))
+        ]
+        Contact.objects.bulk_create(contacts, batch_size=self.batch_size)
+        self._step("contacts", len(contacts), started)
+
+    def _stats(self, room_ids, tenants, count, since):
+        """Insert ``count`` events; returns their counts per (room, stat type)."""
+        started = time.perf_counter()
+        types, weights = zip(*STAT_MIX)
+        span = (timezone.now() - since).total_seconds()
+        events = Counter()
+        for start in range(0, count, self.batch_size):
+            n = min(self.batch_size, count - start)
+            stats = [
+                RoomStat(
+                    room_id=self.rng.choice(room_ids),
+                    user_id=(
+                        self.rng.choice(tenants) if self.rng.random() < 0.3 else None
+                    ),
+                    stat_type=stat_type,
+                    created_at=since + timedelta(seconds=self.rng.random() * span),
+                )
+                for stat_type in self.rng.choices(types, weights, k=n)
+            ]
+            RoomStat.objects.bulk_create(stats)
+            events.update((stat.room_id, stat.stat_type) for stat in stats)
+            for stat in stats:
+                if stat.stat_type != "view":
+                    continue
+                place = self.place_of[stat.room_id]
+                if place:
+                    areas.accumulate(self.demand, place, stat.created_at)
+                if stat.user_id is not None:
+                    day = rollups.bucket_start(stat.created_at, StatRollup.DAY).date()
+                    self.viewers[(stat.room_id, day)].add(stat.user_id)
+        self._step("stats", count, started)
+        return events
+
+    def _sketches(self):
+        """Unique-viewer sketches of the seeded rooms, which have none yet."""
+        sketches = []
+        for (room_id, day), users in self.viewers.items():
+            sketch = HyperLogLog()
+            sketch.update(uniques.user_viewer(user_id) for user_id in users)
+            sketches.append(
+                RoomViewSketch(room_id=room_id, day=day, sketch=sketch.to_bytes())
+            )
+        RoomViewSketch.objects.bulk_create(sketches, batch_size=self.batch_size)
+
+    @transaction.atomic
+    def _derived(self, room_ids, ratings, events, since):
+        """What the signal handlers would have done for each inserted row."""
+        started = time.perf_counter()
+        contacts = Counter()
+        for (room_id, stat_type), n in events.items():
+            if stat_type.startswith(rollups.CONTACT_PREFIX):
+                contacts[room_id] += n
+        RoomAggregate.objects.bulk_create(
+            [
+                RoomAggregate(
+                    room_id=room_id,
+                    review_count=ratings.get(room_id, (0, 0))[0],
+                    rating_total=ratings.get(room_id, (0, 0))[1],
+                    contact_count=contacts[room_id],
+                )
+                for room_id in room_ids
+            ],
+            batch_size=self.batch_size,
+        )
+
+        # hourly/daily buckets are rebuilt from raw rows for the seeded window;
+        # all-time totals can't be (raw rows may have been pruned), so they
+        # are added to instead
+        if since is not None:
+            rollups.backfill(since=since)
+            self._sketches()
+        RoomStatRollup.objects.bulk_create(
+            [
+                RoomStatRollup(
+                    room_id=room_id,
+                    stat_type=stat_type,
+                    granularity=StatRollup.TOTAL,
+                    bucket=rollups.ALL_TIME,
+                    count=n,
+                )
+                for (room_id, stat_type), n in events.items()
+            ],
+            batch_size=self.batch_size,
+        )
+        rooms = {}
+        for chunk in _chunks(room_ids, self.batch_size):
+            rooms.update(
+                (pk, (location, owner_id))
+                for pk, location, owner_id in Room.objects.filter(
+                    pk__in=chunk
+                ).values_list("pk", "location", "owner_id")
+            )
+        locations = Counter()
+        owners = Counter()
+        site = Counter()
+        for (room_id, stat_type), n in events.items():
+            location, owner_id = rooms[room_id]
+            locations[(location, stat_type)] += n
+            owners[(owner_id, stat_type)] += n
+            site[stat_type] += n
+        totals = LocationStatRollup.objects.filter(granularity=StatRollup.TOTAL)
+        existing = []
+        for chunk in _chunks(list({location for location, _ in locations}), 500):
+            existing += totals.filter(location__in=chunk)
+        for row in existing:
+            row.count += locations.pop((row.location, row.stat_type), 0)
+        LocationStatRollup.objects.bulk_update(
+            existing, ["count"], batch_size=self.batch_size
+        )
+        LocationStatRollup.objects.bulk_create(
+            [
+                LocationStatRollup(
+                    location=location,
+                    stat_type=stat_type,
+                    granularity=StatRollup.TOTAL,
+                    bucket=rollups.ALL_TIME,
+                    count=n,
+                )
+                for (location, stat_type), n in locations.items()
+            ],
+            batch_size=self.batch_size,
+        )
+        existing = list(
+            SiteStatRollup.objects.filter(
+                granularity=StatRollup.TOTAL, stat_type__in=list(site)
+            )
+        )
+        for row in existing:
+            row.count += site.pop(row.stat_type)
+        SiteStatRollup.objects.bulk_update(existing, ["count"])
+        SiteStatRollup.objects.bulk_create(
+            [
+                SiteStatRollup(
+                    stat_type=stat_type,
+                    granularity=StatRollup.TOTAL,
+                    bucket=rollups.ALL_TIME,
+                    count=n,
+                )
+                for stat_type, n in site.items()
+            ]
+        )
+        # owners are created by this run, so none have totals yet
+        OwnerStatRollup.objects.bulk_create(
+            [
+                OwnerStatRollup(
+                    owner_id=owner_id,
+                    stat_type=stat_type,
+                    granularity=StatRollup.TOTAL,
+                    bucket=rollups.ALL_TIME,
+                    count=n,
+                )
+                for (owner_id, stat_type), n in owners.items()
+            ],
+            batch_size=self.batch_size,
+        )
+
+        areas.add_demand(self.demand)
+
+        facets.invalidate()
+        counters.invalidate(*counters.COUNTERS)
+        self._step("derived", len(room_ids), started)
@@ -0,0 +1,37 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto the local replica file "
+        "(SQLITE_REPLICA_PATH) with SQLite's online backup. Run it on a timer "
+        "to stand in for replication when trying out the replica router."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--replica", default="replica")
+
+    def handle(self, *args, **options):
+        alias = options["replica"]
+        if alias not in settings.DATABASES:
+            raise CommandError(f"No database alias {alias!r}; set SQLITE_REPLICA_PATH.")
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        replica = settings.DATABASES[alias]
+        for config in (primary, replica):
+            if not config["ENGINE"].endswith("sqlite3"):
+                raise CommandError("Both databases must be SQLite.")
+
+        source = sqlite3.connect(primary["NAME"])
+        target = sqlite3.connect(replica["NAME"])
+        try:
+            # pages=... copies in steps, so writers on the primary aren't
+            # blocked for the whole copy
+            source.backup(target, pages=1024)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(f"Copied {primary['NAME']} to {replica['NAME']}.")
@@ -0,0 +1,181 @@
+"""
+Serving of uploaded media.
+
+Unlike ``django.views.static.serve`` this sends strong validators and long
+cache lifetimes, answers conditional and ``Range`` requests, and streams
+files in chunks (``FileResponse`` lets the server use ``sendfile`` where the
+WSGI server supports it). With ``MEDIA_ACCEL`` set, the file is not read in
+Python at all: the response only carries ``X-Accel-Redirect`` (nginx) or
+``X-Sendfile`` (Apache) and the front-end server sends the bytes.
+
+Room image uploads and their variants get content-hashed names
+(``name.<12 hex>.ext``), so those URLs never change meaning and are marked
+``immutable``.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotAllowed,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+HASHED_NAME = re.compile(r"\.([0-9a-f]{12})\.[A-Za-z0-9]+$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+MUTABLE = "public, max-age=3600"
+
+
+def content_hash(content):
+    """First 12 hex digits of the SHA-256 of a Django ``File``; rewinds it."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()[:12]
+
+
+def hashed_name(path, digest):
+    p = PurePosixPath(path)
+    return str(p.with_name(f"{p.stem}.{digest}{p.suffix.lower()}"))
+
+
+def _etag(path, stat):
+    match = HASHED_NAME.search(path)
+    if match:
+        return quote_etag(match.group(1))
+    return quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def _byte_range(header, size):
+    """
+    ``(start, end)`` inclusive for a single ``bytes=`` range. ``None`` when
+    the header isn't one we serve (malformed, or several ranges), which
+    means sending the whole file; ``RangeNotSatisfiable`` when it's valid
+    but no byte of the file is in it.
+    """
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve(request, path):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    etag = _etag(path, stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": IMMUTABLE if HASHED_NAME.search(path) else MUTABLE,
+        "Accept-Ranges": "bytes",
+    }
+
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if not_modified is not None:
+        for name, value in headers.items():
+            not_modified[name] = value
+        return not_modified
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+
+    accel = getattr(settings, "MEDIA_ACCEL", "")
+    if accel:
+        response = HttpResponse(content_type=content_type)
+        if accel == "nginx":
+            prefix = settings.MEDIA_ACCEL_PREFIX.rstrip("/")
+            response["X-Accel-Redirect"] = f"{prefix}/{path.lstrip('/')}"
+        else:
+            response["X-Sendfile"] = fullpath
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    size = stat.st_size
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    byte_range = None
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = _byte_range(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read_range(fullpath, start, length),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(length)
+    else:
+        response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+        response.block_size = CHUNK_SIZE
+
+    if encoding:
+        response["Content-Encoding"] = encoding
+    for name, value in headers.items():
+        response[name] = value
+    return response
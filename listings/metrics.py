@@ -0,0 +1,221 @@
+"""
+Per-view SQL, template and wall-clock instrumentation.
+
+``QueryMetricsMiddleware`` counts the queries each request runs and how long
+they took, and ``InstrumentedDjangoTemplates`` (a drop-in template backend)
+adds the time spent rendering templates. The totals are sent back as a
+``Server-Timing`` header, aggregated per URL name for ``metrics_view``, and
+checked against ``settings.QUERY_BUDGETS``::
+
+    QUERY_BUDGETS = {"room_list": {"queries": 8, "db_ms": 50, "total_ms": 300}}
+
+A request over budget raises ``QueryBudgetExceeded`` when
+``QUERY_BUDGET_STRICT`` is on and logs a warning otherwise.
+
+The current request's metrics live in a context variable and every database
+connection gets a wrapper that reports to it, so queries run by async views
+(through ``sync_to_async`` threads) are counted like any others.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, JsonResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.db_wrapper(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class MetricsStore:
+    """Running per-URL-name totals for this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, name, queries, db_ms, render_ms, total_ms, over_budget):
+        with self.lock:
+            row = self.views.setdefault(
+                name,
+                {
+                    "requests": 0,
+                    "queries": 0,
+                    "max_queries": 0,
+                    "db_ms": 0.0,
+                    "render_ms": 0.0,
+                    "total_ms": 0.0,
+                    "max_total_ms": 0.0,
+                    "over_budget": 0,
+                },
+            )
+            row["requests"] += 1
+            row["queries"] += queries
+            row["max_queries"] = max(row["max_queries"], queries)
+            row["db_ms"] += db_ms
+            row["render_ms"] += render_ms
+            row["total_ms"] += total_ms
+            row["max_total_ms"] = max(row["max_total_ms"], total_ms)
+            row["over_budget"] += int(over_budget)
+
+    def snapshot(self):
+        with self.lock:
+            out = {}
+            for name, row in self.views.items():
+                n = row["requests"]
+                out[name] = {
+                    **row,
+                    "avg_queries": row["queries"] / n,
+                    "avg_db_ms": row["db_ms"] / n,
+                    "avg_render_ms": row["render_ms"] / n,
+                    "avg_total_ms": row["total_ms"] / n,
+                }
+            return out
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+store = MetricsStore()
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates`` that reports render time to the current request."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def check_budget(name, queries, db_ms, total_ms):
+    """Return a description of every budget ``name`` went over, if any."""
+    budget = getattr(settings, "QUERY_BUDGETS", {}).get(name)
+    if not budget:
+        return []
+    actual = {"queries": queries, "db_ms": db_ms, "total_ms": total_ms}
+    return [
+        f"{key}={actual[key]:.0f} > {limit}"
+        for key, limit in budget.items()
+        if key in actual and actual[key] > limit
+    ]
+
+
+class QueryMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = metrics.db_time * 1000
+        render_ms = metrics.render_time * 1000
+
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={db_ms:.1f};desc="{metrics.queries} queries"',
+                f"tpl;dur={render_ms:.1f}",
+                f"total;dur={total_ms:.1f}",
+            ]
+        )
+
+        match = getattr(request, "resolver_match", None)
+        if match is None or not match.url_name:
+            return response
+
+        problems = check_budget(match.url_name, metrics.queries, db_ms, total_ms)
+        store.add(
+            match.url_name, metrics.queries, db_ms, render_ms, total_ms, bool(problems)
+        )
+        if problems:
+            message = f"{match.url_name} over budget: {', '.join(problems)}"
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+def metrics_view(request):
+    """Per-view totals for this process; only for staff, or anyone under DEBUG."""
+    if not (settings.DEBUG or request.user.is_staff):
+        raise Http404
+    return JsonResponse({"views": store.snapshot()})
@@ -0,0 +1,72 @@
+from django.db import OperationalError, migrations, transaction
+
+# listings.search indexes the room type with its label; frozen here so later
+# changes to Room.ROOM_TYPES don't change what this migration does
+ROOM_TYPE_DOCUMENT = (
+    "room_type || ' ' || CASE room_type "
+    "WHEN 'single' THEN 'Single Room' "
+    "WHEN 'shared' THEN 'Shared Room' "
+    "WHEN 'flat' THEN 'Flat / Apartment' "
+    "ELSE room_type END"
+)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS listings_room_fts "
+                    "USING fts5(title, description, location, room_type, "
+                    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+                )
+        except OperationalError:
+            # SQLite built without FTS5: listings.search falls back to LIKE
+            return
+        schema_editor.execute(
+            "INSERT INTO listings_room_fts "
+            "(rowid, title, description, location, room_type) "
+            f"SELECT id, title, description, location, {ROOM_TYPE_DOCUMENT} "
+            "FROM listings_room"
+        )
+    elif connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS listings_room_search ("
+            "room_id bigint PRIMARY KEY "
+            "REFERENCES listings_room (id) ON DELETE CASCADE "
+            "DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS listings_room_search_document_gin "
+            "ON listings_room_search USING GIN (document)"
+        )
+        schema_editor.execute(
+            "INSERT INTO listings_room_search (room_id, document) "
+            "SELECT id, "
+            "setweight(to_tsvector('simple', title), 'A') || "
+            "setweight(to_tsvector('simple', description), 'D') || "
+            "setweight(to_tsvector('simple', location), 'B') || "
+            f"setweight(to_tsvector('simple', {ROOM_TYPE_DOCUMENT}), 'C') "
+            "FROM listings_room"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS listings_room_fts")
+    elif connection.vendor == "postgresql":
+        schema_editor.execute("DROP TABLE IF EXISTS listings_room_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 6.0 on 2026-10-17 23:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_aggregates(apps, schema_editor):
+    Room = apps.get_model("listings", "Room")
+    RoomAggregate = apps.get_model("listings", "RoomAggregate")
+    Review = apps.get_model("listings", "Review")
+    RoomStat = apps.get_model("listings", "RoomStat")
+
+    reviews = {
+        row["room"]: row
+        for row in Review.objects.values("room").annotate(
+            count=Count("id"), total=Sum("rating")
+        )
+    }
+    contacts = dict(
+        RoomStat.objects.filter(stat_type__startswith="contact")
+        .values("room")
+        .annotate(count=Count("id"))
+        .values_list("room", "count")
+    )
+
+    RoomAggregate.objects.bulk_create(
+        [
+            RoomAggregate(
+                room_id=room_id,
+                review_count=reviews.get(room_id, {}).get("count", 0),
+                rating_total=reviews.get(room_id, {}).get("total") or 0,
+                contact_count=contacts.get(room_id, 0),
+            )
+            for room_id in Room.objects.values_list("pk", flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0002_room_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoomAggregate",
+            fields=[
+                (
+                    "room",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="aggregate",
+                        serialize=False,
+                        to="listings.room",
+                    ),
+                ),
+                ("review_count", models.PositiveIntegerField(default=0)),
+                ("rating_total", models.PositiveIntegerField(default=0)),
+                ("contact_count", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
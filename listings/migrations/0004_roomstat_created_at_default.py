@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 23:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0003_room_aggregate"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="roomstat",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
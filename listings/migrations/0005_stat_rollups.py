@@ -0,0 +1,171 @@
+# Generated by Django 6.0 on 2026-10-17 23:41
+
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour
+
+ALL_TIME = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def backfill_rollups(apps, schema_editor):
+    RoomStat = apps.get_model("listings", "RoomStat")
+    RoomStatRollup = apps.get_model("listings", "RoomStatRollup")
+    LocationStatRollup = apps.get_model("listings", "LocationStatRollup")
+
+    buckets = {
+        "hour": TruncHour("created_at", tzinfo=timezone.utc),
+        "day": TruncDay("created_at", tzinfo=timezone.utc),
+        "total": None,
+    }
+    for granularity, trunc in buckets.items():
+        qs = RoomStat.objects.all()
+        fields = ["stat_type"]
+        if trunc is not None:
+            qs = qs.annotate(b=trunc)
+            fields.append("b")
+
+        RoomStatRollup.objects.bulk_create(
+            [
+                RoomStatRollup(
+                    room_id=row["room"],
+                    stat_type=row["stat_type"],
+                    granularity=granularity,
+                    bucket=row.get("b") or ALL_TIME,
+                    count=row["n"],
+                )
+                for row in qs.values("room", *fields).annotate(n=Count("id"))
+            ],
+            batch_size=1000,
+        )
+        LocationStatRollup.objects.bulk_create(
+            [
+                LocationStatRollup(
+                    location=row["room__location"],
+                    stat_type=row["stat_type"],
+                    granularity=granularity,
+                    bucket=row.get("b") or ALL_TIME,
+                    count=row["n"],
+                )
+                for row in qs.values("room__location", *fields).annotate(n=Count("id"))
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0004_roomstat_created_at_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LocationStatRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "stat_type",
+                    models.CharField(
+                        choices=[
+                            ("view", "View"),
+                            ("contact_phone", "Phone"),
+                            ("contact_whatsapp", "WhatsApp"),
+                            ("contact_email", "Email"),
+                            ("success", "Success"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[
+                            ("hour", "Hourly"),
+                            ("day", "Daily"),
+                            ("total", "All time"),
+                        ],
+                        max_length=5,
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("location", models.CharField(max_length=200)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("location", "stat_type", "granularity", "bucket"),
+                        name="uniq_location_stat_rollup",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="RoomStatRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "stat_type",
+                    models.CharField(
+                        choices=[
+                            ("view", "View"),
+                            ("contact_phone", "Phone"),
+                            ("contact_whatsapp", "WhatsApp"),
+                            ("contact_email", "Email"),
+                            ("success", "Success"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[
+                            ("hour", "Hourly"),
+                            ("day", "Daily"),
+                            ("total", "All time"),
+                        ],
+                        max_length=5,
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "room",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stat_rollups",
+                        to="listings.room",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("room", "stat_type", "granularity", "bucket"),
+                        name="uniq_room_stat_rollup",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
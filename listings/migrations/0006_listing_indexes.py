@@ -0,0 +1,80 @@
+# Generated by Django 6.0 on 2026-10-17 23:42
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0005_stat_rollups"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="contact",
+            index=models.Index(fields=["room", "user"], name="contact_room_user_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="locationstatrollup",
+            index=models.Index(
+                fields=["granularity", "stat_type", "-count"],
+                name="locationstatrollup_gran_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="profile",
+            index=models.Index(fields=["role"], name="profile_role_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="room",
+            index=models.Index(
+                models.OrderBy(models.F("created_at"), descending=True),
+                models.OrderBy(models.F("id"), descending=True),
+                condition=models.Q(("is_available", True)),
+                name="room_available_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="room",
+            index=models.Index(
+                fields=["owner", "-created_at"], name="room_owner_recent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="room",
+            index=models.Index(
+                models.F("owner"),
+                django.db.models.functions.text.Lower("title"),
+                django.db.models.functions.text.Lower("location"),
+                models.F("room_type"),
+                models.F("price"),
+                name="room_duplicate_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="roomstat",
+            index=models.Index(
+                fields=["stat_type", "created_at"], name="roomstat_type_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="roomstat",
+            index=models.Index(
+                fields=["room", "stat_type"], name="roomstat_room_type_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="roomstat",
+            index=models.Index(fields=["created_at"], name="roomstat_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="roomstatrollup",
+            index=models.Index(
+                fields=["granularity", "stat_type", "-count"],
+                name="roomstatrollup_gran_idx",
+            ),
+        ),
+    ]
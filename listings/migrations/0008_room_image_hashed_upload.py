@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 23:46
+
+import listings.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0007_room_image_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="roomimage",
+            name="image",
+            field=models.ImageField(upload_to=listings.models.room_image_upload_to),
+        ),
+    ]
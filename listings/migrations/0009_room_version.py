@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0008_room_image_hashed_upload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
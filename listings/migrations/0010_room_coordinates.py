@@ -0,0 +1,162 @@
+# Generated by Django 6.0 on 2026-10-17 23:51
+
+import re
+
+from django.db import migrations, models
+
+# listings.geo.geocode and geohash as of this migration, frozen so later
+# changes to the gazetteer don't change what this migration writes
+# lower-case place name -> (lat, lng)
+GAZETTEER = {
+    "pretoria": (-25.7479, 28.2293),
+    "tshwane": (-25.7479, 28.2293),
+    "hatfield": (-25.7487, 28.2380),
+    "sunnyside": (-25.7517, 28.2050),
+    "arcadia": (-25.7460, 28.2110),
+    "brooklyn": (-25.7700, 28.2370),
+    "menlo park": (-25.7700, 28.2600),
+    "lynnwood": (-25.7650, 28.2750),
+    "garsfontein": (-25.7930, 28.2990),
+    "silverton": (-25.7300, 28.3050),
+    "eersterust": (-25.7150, 28.3250),
+    "mamelodi": (-25.7100, 28.3950),
+    "mamelodi east": (-25.7030, 28.4150),
+    "mamelodi west": (-25.7220, 28.3680),
+    "mahube valley": (-25.7000, 28.4200),
+    "atteridgeville": (-25.7717, 28.0717),
+    "soshanguve": (-25.5253, 28.1006),
+    "mabopane": (-25.4970, 28.1000),
+    "ga rankuwa": (-25.6140, 27.9960),
+    "centurion": (-25.8603, 28.1894),
+    "midrand": (-25.9990, 28.1260),
+    "tembisa": (-25.9964, 28.2268),
+    "kempton park": (-26.1000, 28.2333),
+    "johannesburg": (-26.2041, 28.0473),
+    "braamfontein": (-26.1929, 28.0305),
+    "auckland park": (-26.1826, 28.0030),
+    "soweto": (-26.2485, 27.8540),
+    "sandton": (-26.1076, 28.0567),
+    "randburg": (-26.0936, 28.0064),
+    "alexandra": (-26.1030, 28.0970),
+    "germiston": (-26.2170, 28.1650),
+    "boksburg": (-26.2125, 28.2625),
+    "benoni": (-26.1885, 28.3208),
+    "potchefstroom": (-26.7145, 27.0970),
+    "polokwane": (-23.9045, 29.4689),
+    "mbombela": (-25.4658, 30.9853),
+    "nelspruit": (-25.4658, 30.9853),
+    "bloemfontein": (-29.0852, 26.1596),
+    "durban": (-29.8587, 31.0218),
+    "pietermaritzburg": (-29.6006, 30.3794),
+    "east london": (-33.0292, 27.8546),
+    "gqeberha": (-33.9608, 25.6022),
+    "port elizabeth": (-33.9608, 25.6022),
+    "makhanda": (-33.3042, 26.5328),
+    "stellenbosch": (-33.9321, 18.8602),
+    "cape town": (-33.9249, 18.4241),
+}
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def normalize(text):
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def geocode(location):
+    text = f" {normalize(location)} "
+    best = None
+    for name, point in GAZETTEER.items():
+        pos = text.find(f" {name} ")
+        if pos == -1:
+            continue
+        # longer names are more specific; on a tie the place named first wins
+        rank = (-len(name), pos)
+        if best is None or rank < best[0]:
+            best = (rank, point)
+    return best[1] if best else None
+
+
+def geohash(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def geocode_rooms(apps, schema_editor):
+    Room = apps.get_model("listings", "Room")
+    rooms = []
+    for room in Room.objects.only("id", "location").iterator(chunk_size=1000):
+        point = geocode(room.location)
+        if point:
+            room.latitude, room.longitude = point
+            room.geohash = geohash(*point)
+            rooms.append(room)
+    Room.objects.bulk_update(
+        rooms, ["latitude", "longitude", "geohash"], batch_size=1000
+    )
+
+
+def create_rtree(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS listings_room_rtree "
+        "USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+    )
+    schema_editor.execute(
+        "INSERT INTO listings_room_rtree (id, min_lat, max_lat, min_lng, max_lng) "
+        "SELECT id, latitude, latitude, longitude, longitude FROM listings_room "
+        "WHERE latitude IS NOT NULL"
+    )
+
+
+def drop_rtree(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS listings_room_rtree")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0009_room_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="geohash",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=12
+            ),
+        ),
+        migrations.AddField(
+            model_name="room",
+            name="latitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="room",
+            name="longitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(geocode_rooms, migrations.RunPython.noop),
+        migrations.RunPython(create_rtree, drop_rtree),
+    ]
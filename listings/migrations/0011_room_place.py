@@ -0,0 +1,112 @@
+# Generated by Django 6.0 on 2026-10-17 23:53
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+# listings.geo.resolve as of this migration, frozen so later changes to the
+# gazetteer don't change what this migration writes. Each name was its own
+# place then; 0018_place_demand merges the ones that became aliases.
+PLACE_NAMES = [
+    "pretoria",
+    "tshwane",
+    "hatfield",
+    "sunnyside",
+    "arcadia",
+    "brooklyn",
+    "menlo park",
+    "lynnwood",
+    "garsfontein",
+    "silverton",
+    "eersterust",
+    "mamelodi",
+    "mamelodi east",
+    "mamelodi west",
+    "mahube valley",
+    "atteridgeville",
+    "soshanguve",
+    "mabopane",
+    "ga rankuwa",
+    "centurion",
+    "midrand",
+    "tembisa",
+    "kempton park",
+    "johannesburg",
+    "braamfontein",
+    "auckland park",
+    "soweto",
+    "sandton",
+    "randburg",
+    "alexandra",
+    "germiston",
+    "boksburg",
+    "benoni",
+    "potchefstroom",
+    "polokwane",
+    "mbombela",
+    "nelspruit",
+    "bloemfontein",
+    "durban",
+    "pietermaritzburg",
+    "east london",
+    "gqeberha",
+    "port elizabeth",
+    "makhanda",
+    "stellenbosch",
+    "cape town",
+]
+
+
+def normalize(text):
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def place_of(location):
+    text = f" {normalize(location)} "
+    best = None
+    for name in PLACE_NAMES:
+        pos = text.find(f" {name} ")
+        if pos == -1:
+            continue
+        # longer names are more specific; on a tie the place named first wins
+        rank = (-len(name), pos)
+        if best is None or rank < best[0]:
+            best = (rank, name.title())
+    return best[1] if best else None
+
+
+def set_places(apps, schema_editor):
+    Room = apps.get_model("listings", "Room")
+    rooms = []
+    for room in Room.objects.only("id", "location").iterator(chunk_size=1000):
+        place = place_of(room.location)
+        if place:
+            room.place = place
+            rooms.append(room)
+    Room.objects.bulk_update(rooms, ["place"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0010_room_coordinates"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="place",
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name="room",
+            index=models.Index(
+                condition=models.Q(("is_available", True)),
+                fields=["place"],
+                name="room_available_place_idx",
+            ),
+        ),
+        migrations.RunPython(set_places, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 6.0 on 2026-10-18 00:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_owner_rollups(apps, schema_editor):
+    # from the per-room rollups, which outlive pruned raw events
+    RoomStatRollup = apps.get_model("listings", "RoomStatRollup")
+    OwnerStatRollup = apps.get_model("listings", "OwnerStatRollup")
+
+    rows = (
+        RoomStatRollup.objects.filter(room__owner__isnull=False)
+        .values("room__owner", "stat_type", "granularity", "bucket")
+        .annotate(n=Sum("count"))
+        .order_by()
+    )
+    OwnerStatRollup.objects.bulk_create(
+        (
+            OwnerStatRollup(
+                owner_id=row["room__owner"],
+                stat_type=row["stat_type"],
+                granularity=row["granularity"],
+                bucket=row["bucket"],
+                count=row["n"],
+            )
+            for row in rows.iterator(chunk_size=2000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0011_room_place"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OwnerStatRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "stat_type",
+                    models.CharField(
+                        choices=[
+                            ("view", "View"),
+                            ("contact_phone", "Phone"),
+                            ("contact_whatsapp", "WhatsApp"),
+                            ("contact_email", "Email"),
+                            ("success", "Success"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[
+                            ("hour", "Hourly"),
+                            ("day", "Daily"),
+                            ("total", "All time"),
+                        ],
+                        max_length=5,
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stat_rollups",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+                "indexes": [
+                    models.Index(
+                        fields=["granularity", "stat_type", "-count"],
+                        name="ownerstatrollup_gran_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("owner", "stat_type", "granularity", "bucket"),
+                        name="uniq_owner_stat_rollup",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_owner_rollups, migrations.RunPython.noop),
+    ]
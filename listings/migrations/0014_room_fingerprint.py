@@ -0,0 +1,75 @@
+# Generated by Django 6.0 on 2026-10-18 00:37
+
+import hashlib
+import re
+import unicodedata
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+
+# listings.duplicates.fingerprint as of this migration, frozen so later
+# changes to it don't change what this migration writes
+WORDS = re.compile(r"[^\W_]+")
+KEY_FIELDS = ("title", "location", "room_type", "price")
+
+
+def normalize(text):
+    return " ".join(WORDS.findall(unicodedata.normalize("NFKC", text or "").casefold()))
+
+
+def fingerprint(title, location, room_type, price):
+    key = "|".join(
+        [
+            normalize(title),
+            normalize(location),
+            room_type or "",
+            f"{Decimal(str(price)):.2f}",
+        ]
+    )
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def fill_fingerprints(apps, schema_editor):
+    """Fingerprint every room; later copies of a duplicate get a ``:<pk>`` suffix."""
+    Room = apps.get_model("listings", "Room")
+    seen = set()
+    batch = []
+    rooms = Room.objects.order_by("pk").only("id", "owner_id", *KEY_FIELDS)
+    for room in rooms.iterator(chunk_size=1000):
+        room.fingerprint = fingerprint(*(getattr(room, field) for field in KEY_FIELDS))
+        if (room.owner_id, room.fingerprint) in seen:
+            room.fingerprint = f"{room.fingerprint}:{room.pk}"
+        seen.add((room.owner_id, room.fingerprint))
+        batch.append(room)
+        if len(batch) >= 1000:
+            Room.objects.bulk_update(batch, ["fingerprint"])
+            batch = []
+    Room.objects.bulk_update(batch, ["fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0012_owner_stat_rollup"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="room",
+            name="room_duplicate_idx",
+        ),
+        migrations.AddField(
+            model_name="room",
+            name="fingerprint",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="room",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "fingerprint"), name="room_owner_fingerprint_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0016_room_view_sketches"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RateLimitWindow",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=200)),
+                ("window", models.BigIntegerField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("expires_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["expires_at"], name="ratelimit_expires_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("key", "window"), name="uniq_ratelimit_key_window"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+# places that were separate gazetteer entries and are now one place; the
+# other aliases (short names like "pta") resolve on the next
+# `manage.py rebuild_geo_index`
+RENAMED_PLACES = {
+    "Tshwane": "Pretoria",
+    "Nelspruit": "Mbombela",
+    "Port Elizabeth": "Gqeberha",
+}
+
+
+def merge_places_and_rebuild_demand(apps, schema_editor):
+    Room = apps.get_model("listings", "Room")
+    RoomStatRollup = apps.get_model("listings", "RoomStatRollup")
+    AreaDemand = apps.get_model("listings", "AreaDemand")
+
+    for old, new in RENAMED_PLACES.items():
+        Room.objects.filter(place=old).update(place=new)
+
+    # demand as of each place's latest view, days weighted at midday
+    half_life = getattr(settings, "AREA_DEMAND_HALF_LIFE_HOURS", 72)
+    days = {}
+    for row in (
+        RoomStatRollup.objects.filter(granularity="day", stat_type="view")
+        .exclude(room__place="")
+        .values("room__place", "bucket")
+        .annotate(n=Sum("count"))
+        .order_by()
+    ):
+        days.setdefault(row["room__place"], []).append(
+            (row["bucket"] + timedelta(hours=12), row["n"])
+        )
+    rows = []
+    for place, views in days.items():
+        last = max(when for when, _ in views)
+        score = sum(
+            n * 2 ** (-(last - when).total_seconds() / 3600 / half_life)
+            for when, n in views
+        )
+        rows.append(
+            AreaDemand(
+                place=place,
+                score=score,
+                views=sum(n for _, n in views),
+                last_view_at=last,
+            )
+        )
+    AreaDemand.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0017_rate_limit_windows"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AreaDemand",
+            fields=[
+                (
+                    "place",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("score", models.FloatField(default=0)),
+                ("views", models.PositiveIntegerField(default=0)),
+                ("last_view_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(
+            merge_places_and_rebuild_demand, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 6.0 on 2026-10-18 01:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# the gazetteer listings.geo shipped with until now: names that share a
+# point are one place, named after the first; the rest become its aliases
+# lower-case place name -> (lat, lng)
+GAZETTEER = {
+    "pretoria": (-25.7479, 28.2293),
+    "tshwane": (-25.7479, 28.2293),
+    "hatfield": (-25.7487, 28.2380),
+    "sunnyside": (-25.7517, 28.2050),
+    "arcadia": (-25.7460, 28.2110),
+    "brooklyn": (-25.7700, 28.2370),
+    "menlo park": (-25.7700, 28.2600),
+    "lynnwood": (-25.7650, 28.2750),
+    "garsfontein": (-25.7930, 28.2990),
+    "silverton": (-25.7300, 28.3050),
+    "eersterust": (-25.7150, 28.3250),
+    "mamelodi": (-25.7100, 28.3950),
+    "mamelodi east": (-25.7030, 28.4150),
+    "mamelodi west": (-25.7220, 28.3680),
+    "mahube valley": (-25.7000, 28.4200),
+    "atteridgeville": (-25.7717, 28.0717),
+    "soshanguve": (-25.5253, 28.1006),
+    "mabopane": (-25.4970, 28.1000),
+    "ga rankuwa": (-25.6140, 27.9960),
+    "centurion": (-25.8603, 28.1894),
+    "midrand": (-25.9990, 28.1260),
+    "tembisa": (-25.9964, 28.2268),
+    "kempton park": (-26.1000, 28.2333),
+    "johannesburg": (-26.2041, 28.0473),
+    "braamfontein": (-26.1929, 28.0305),
+    "auckland park": (-26.1826, 28.0030),
+    "soweto": (-26.2485, 27.8540),
+    "sandton": (-26.1076, 28.0567),
+    "randburg": (-26.0936, 28.0064),
+    "alexandra": (-26.1030, 28.0970),
+    "germiston": (-26.2170, 28.1650),
+    "boksburg": (-26.2125, 28.2625),
+    "benoni": (-26.1885, 28.3208),
+    "potchefstroom": (-26.7145, 27.0970),
+    "polokwane": (-23.9045, 29.4689),
+    "mbombela": (-25.4658, 30.9853),
+    "nelspruit": (-25.4658, 30.9853),
+    "bloemfontein": (-29.0852, 26.1596),
+    "durban": (-29.8587, 31.0218),
+    "pietermaritzburg": (-29.6006, 30.3794),
+    "east london": (-33.0292, 27.8546),
+    "gqeberha": (-33.9608, 25.6022),
+    "port elizabeth": (-33.9608, 25.6022),
+    "makhanda": (-33.3042, 26.5328),
+    "stellenbosch": (-33.9321, 18.8602),
+    "cape town": (-33.9249, 18.4241),
+}
+
+# short forms people type -> gazetteer name
+SHORT_NAMES = {
+    "pta": "pretoria",
+    "joburg": "johannesburg",
+    "jozi": "johannesburg",
+    "jhb": "johannesburg",
+    "pmb": "pietermaritzburg",
+}
+
+
+def fill_places(apps, schema_editor):
+    Place = apps.get_model("listings", "Place")
+    PlaceAlias = apps.get_model("listings", "PlaceAlias")
+    names = {}
+    for name, point in GAZETTEER.items():
+        names.setdefault(point, []).append(name)
+    for short, name in SHORT_NAMES.items():
+        names[GAZETTEER[name]].append(short)
+    aliases = []
+    for (lat, lng), (name, *others) in names.items():
+        place = Place.objects.create(name=name.title(), latitude=lat, longitude=lng)
+        aliases += [PlaceAlias(place=place, alias=other) for other in others]
+    PlaceAlias.objects.bulk_create(aliases)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0018_place_demand"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Place",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+        migrations.CreateModel(
+            name="PlaceAlias",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("alias", models.CharField(max_length=100, unique=True)),
+                (
+                    "place",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="aliases",
+                        to="listings.place",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "place aliases",
+            },
+        ),
+        migrations.RunPython(fill_places, migrations.RunPython.noop),
+    ]
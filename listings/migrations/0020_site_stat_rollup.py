@@ -0,0 +1,95 @@
+# Generated by Django 6.0 on 2026-10-18 02:07
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_site_rollups(apps, schema_editor):
+    # from the per-location rollups, which outlive pruned raw events and
+    # deleted rooms, as the site totals used to be summed
+    LocationStatRollup = apps.get_model("listings", "LocationStatRollup")
+    SiteStatRollup = apps.get_model("listings", "SiteStatRollup")
+
+    rows = (
+        LocationStatRollup.objects.values("stat_type", "granularity", "bucket")
+        .annotate(n=Sum("count"))
+        .order_by()
+    )
+    SiteStatRollup.objects.bulk_create(
+        (
+            SiteStatRollup(
+                stat_type=row["stat_type"],
+                granularity=row["granularity"],
+                bucket=row["bucket"],
+                count=row["n"],
+            )
+            for row in rows.iterator(chunk_size=2000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0019_places"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SiteStatRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "stat_type",
+                    models.CharField(
+                        choices=[
+                            ("view", "View"),
+                            ("contact_phone", "Phone"),
+                            ("contact_whatsapp", "WhatsApp"),
+                            ("contact_email", "Email"),
+                            ("success", "Success"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[
+                            ("hour", "Hourly"),
+                            ("day", "Daily"),
+                            ("total", "All time"),
+                        ],
+                        max_length=5,
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "abstract": False,
+                "indexes": [
+                    models.Index(
+                        fields=["granularity", "stat_type", "-count"],
+                        name="sitestatrollup_gran_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("stat_type", "granularity", "bucket"),
+                        name="uniq_site_stat_rollup",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_site_rollups, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,17 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Q
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.utils import timezone
+
+from . import duplicates
+
+DUPLICATE_MESSAGE = (
+    "You already posted a listing with the same title, location, type and price."
+)
 
 
 class Room(models.Model):
@@ -19,7 +28,16 @@ class Room(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=8, decimal_places=2)
     location = models.CharField(max_length=200)
+    # normalized place name and coordinates, geocoded from location on save
+    # (see listings.geo)
+    place = models.CharField(max_length=100, blank=True, editable=False)
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     room_type = models.CharField(max_length=20, choices=ROOM_TYPES)
+    # hash of the normalized title, location, type and price; unique per
+    # owner (see listings.duplicates)
+    fingerprint = models.CharField(max_length=64, blank=True, editable=False)
 
     # Contacts
     contact_phone = models.CharField(max_length=20)
@@ -28,10 +46,75 @@ class Room(models.Model):
 
     is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped whenever anything shown on the room's card changes; part of the
+    # card fragment cache key (listings.fragments)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        indexes = [
+            # room_list / keyset pagination: available rooms, newest first
+            models.Index(
+                F("created_at").desc(),
+                F("id").desc(),
+                condition=Q(is_available=True),
+                name="room_available_recent_idx",
+            ),
+            models.Index(fields=["owner", "-created_at"], name="room_owner_recent_idx"),
+            # facet counts per place (listings.facets)
+            models.Index(
+                fields=["place"],
+                condition=Q(is_available=True),
+                name="room_available_place_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "fingerprint"], name="room_owner_fingerprint_uniq"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.location}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        version = self.__dict__.get("version")
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "version" in update_fields:
+            # saved as version = version + 1, so an instance loaded before
+            # some other bump can never write an older version back
+            self.version = F("version") + 1
+        try:
+            super().save(*args, **kwargs)
+        except BaseException:
+            self.__dict__.pop("version", None)
+            if version is not None:
+                self.version = version
+            raise
+        # the new number (or the one post_save bumped to) is only read back
+        # if something asks for it
+        self.__dict__.pop("version", None)
+
+    def clean(self):
+        # the (owner, fingerprint) constraint can't be validated on its own:
+        # forms leave out both fields and the fingerprint is set on save
+        if self.owner_id is None:
+            return
+        try:
+            value = duplicates.fingerprint(
+                self.title, self.location, self.room_type, self.price
+            )
+        except ArithmeticError:
+            # an invalid price, reported by clean_fields()
+            return
+        if self.pk and duplicates.base_of(self.fingerprint) == value:
+            # not changing what makes it a duplicate
+            return
+        others = Room.objects.filter(owner_id=self.owner_id, fingerprint=value)
+        if others.exclude(pk=self.pk).exists():
+            raise ValidationError(DUPLICATE_MESSAGE)
+
 
 class Review(models.Model):
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="reviews")
@@ -54,6 +137,9 @@ class Profile(models.Model):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
     is_verified = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [models.Index(fields=["role"], name="profile_role_idx")]
+
     def __str__(self):
         return f"{self.user.username} ({self.role})"
 
@@ -69,6 +155,9 @@ class Contact(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["room", "user"], name="contact_room_user_idx")]
+
     def __str__(self):
         return f"{self.user} → {self.room.title}"
 
@@ -85,15 +174,288 @@ class RoomStat(models.Model):
     room = models.ForeignKey(Room, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     stat_type = models.CharField(max_length=20, choices=STAT_CHOICES)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # set by the writer, not on insert, so batched events keep their own time
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["stat_type", "created_at"], name="roomstat_type_time_idx"
+            ),
+            # owner dashboards join through room and filter on stat_type
+            models.Index(fields=["room", "stat_type"], name="roomstat_room_type_idx"),
+            models.Index(fields=["created_at"], name="roomstat_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.stat_type} — {self.room.title}"
 
 
+def room_image_upload_to(instance, filename):
+    """``rooms/<name>.<content hash>.<ext>``, so each URL is immutable."""
+    from .media import content_hash, hashed_name
+
+    return hashed_name(f"rooms/{filename}", content_hash(instance.image.file))
+
+
 class RoomImage(models.Model):
     room = models.ForeignKey(Room, related_name="images", on_delete=models.CASCADE)
-    image = models.ImageField(upload_to="rooms/")
+    image = models.ImageField(upload_to=room_image_upload_to)
+
+    # filled in by listings.images once the resized copies exist:
+    # {"card": {"width": 480, "height": 320, "webp": "rooms/...", "jpeg": ...}}
+    variants = models.JSONField(default=dict, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def variant(self, name):
+        """``(jpeg_url, webp_url, width, height)`` for ``name``, or the original."""
+        formats = (self.variants or {}).get(name)
+        if not formats:
+            return self.image.url, None, self.width, self.height
+        storage = self.image.storage
+        return (
+            storage.url(formats["jpeg"]),
+            storage.url(formats["webp"]) if formats.get("webp") else None,
+            formats.get("width"),
+            formats.get("height"),
+        )
 
     def __str__(self):
         return f"Image for {self.room.title}"
+
+
+class RoomAggregate(models.Model):
+    """
+    Denormalized per-room counters, kept current by ``listings.aggregates``
+    so listing pages don't have to join and GROUP BY reviews and stats.
+    """
+
+    room = models.OneToOneField(
+        Room, on_delete=models.CASCADE, primary_key=True, related_name="aggregate"
+    )
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    contact_count = models.PositiveIntegerField(default=0)
+
+    @property
+    def avg_rating(self):
+        if not self.review_count:
+            return None
+        return self.rating_total / self.review_count
+
+    def __str__(self):
+        return f"Aggregates for room {self.room_id}"
+
+
+class StatRollup(models.Model):
+    """Shared shape of the time-bucketed ``RoomStat`` rollup tables."""
+
+    HOUR = "hour"
+    DAY = "day"
+    TOTAL = "total"
+    GRANULARITY_CHOICES = [
+        (HOUR, "Hourly"),
+        (DAY, "Daily"),
+        (TOTAL, "All time"),
+    ]
+
+    stat_type = models.CharField(max_length=20, choices=RoomStat.STAT_CHOICES)
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    # start of the hour/day; TOTAL rows all use listings.rollups.ALL_TIME
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        indexes = [
+            # all-time totals and "top locations by views" read these columns
+            models.Index(
+                fields=["granularity", "stat_type", "-count"],
+                name="%(class)s_gran_idx",
+            ),
+        ]
+
+
+class RoomStatRollup(StatRollup):
+    room = models.ForeignKey(
+        Room, on_delete=models.CASCADE, related_name="stat_rollups"
+    )
+
+    class Meta(StatRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["room", "stat_type", "granularity", "bucket"],
+                name="uniq_room_stat_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.stat_type} x{self.count} — room {self.room_id} @ {self.bucket}"
+
+
+class LocationStatRollup(StatRollup):
+    location = models.CharField(max_length=200)
+
+    class Meta(StatRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["location", "stat_type", "granularity", "bucket"],
+                name="uniq_location_stat_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.stat_type} x{self.count} — {self.location} @ {self.bucket}"
+
+
+class OwnerStatRollup(StatRollup):
+    """Events across all of a landlord's rooms, for the dashboard."""
+
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="stat_rollups"
+    )
+
+    class Meta(StatRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "stat_type", "granularity", "bucket"],
+                name="uniq_owner_stat_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.stat_type} x{self.count} — owner {self.owner_id} @ {self.bucket}"
+
+
+class SiteStatRollup(StatRollup):
+    """Events across the whole site: at most one row per bucket and stat type."""
+
+    class Meta(StatRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["stat_type", "granularity", "bucket"],
+                name="uniq_site_stat_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.stat_type} x{self.count} @ {self.bucket}"
+
+
+class Place(models.Model):
+    """
+    A canonical place rooms are grouped by (``Room.place``), with its
+    coordinates. ``listings.geo`` resolves a room's location text to the most
+    specific place, or alias of one, that it names.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class PlaceAlias(models.Model):
+    """Another name for a place ("Tshwane", "PTA"), matched like the name itself."""
+
+    place = models.ForeignKey(Place, on_delete=models.CASCADE, related_name="aliases")
+    alias = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        verbose_name_plural = "place aliases"
+
+    def __str__(self):
+        return f"{self.alias} → {self.place}"
+
+
+class AreaDemand(models.Model):
+    """
+    Time-decayed view demand per place (``Room.place``), kept current by
+    ``listings.areas``. ``score`` is stored as of ``last_view_at`` and
+    decayed lazily when read or added to.
+    """
+
+    place = models.CharField(max_length=100, primary_key=True)
+    score = models.FloatField(default=0)
+    views = models.PositiveIntegerField(default=0)
+    last_view_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Demand for {self.place}"
+
+
+class SimilarRoom(models.Model):
+    """
+    Precomputed "similar rooms" for a room's page, ``rank`` 0 first. Rebuilt
+    by ``listings.recommend`` (``manage.py build_recommendations``).
+    """
+
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="similar")
+    similar = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["room", "rank"], name="uniq_similar_room_rank"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["computed_at"], name="similarroom_computed_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.similar_id} is #{self.rank + 1} for room {self.room_id}"
+
+
+class RoomViewSketch(models.Model):
+    """
+    A HyperLogLog sketch (``listings.hll``) of the distinct viewers of a room
+    on one UTC day, kept current by ``listings.uniques``.
+    """
+
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="sketches")
+    day = models.DateField()
+    sketch = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["room", "day"], name="uniq_room_view_day")
+        ]
+
+    def __str__(self):
+        return f"Viewers of room {self.room_id} on {self.day}"
+
+
+class RateLimitWindow(models.Model):
+    """
+    Requests counted against one rate-limit key in one fixed window, for
+    ``listings.ratelimit.DatabaseStore``.
+    """
+
+    key = models.CharField(max_length=200)
+    window = models.BigIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key", "window"], name="uniq_ratelimit_key_window"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="ratelimit_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.key}: {self.count} in window {self.window}"
@@ -0,0 +1,96 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 60
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode(values):
+    payload = json.dumps(list(values), separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _decode(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def encode_cursor(obj):
+    """Opaque cursor pointing just past ``obj`` in ``(-created_at, -id)`` order."""
+    return _encode([obj.created_at.isoformat(), obj.pk])
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = _decode(cursor)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def page_size_from(value, default=PAGE_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(qs, cursor=None, size=PAGE_SIZE):
+    """
+    Return ``(items, next_cursor)`` for one page of ``qs``.
+
+    Rows are ordered newest first on ``(created_at, id)`` and the cursor is a
+    seek predicate on that pair, so page N costs the same as page 1 (no OFFSET).
+    """
+    qs = qs.order_by("-created_at", "-id")
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        qs = qs.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+
+    # fetch one extra row to know whether another page exists
+    items = list(qs[: size + 1])
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = encode_cursor(items[-1])
+    return items, next_cursor
+
+
+def ordered_page(qs, fields, cursor=None, size=PAGE_SIZE):
+    """
+    Like ``keyset_page`` for any ascending order: ``fields`` are numeric
+    columns or annotations, the last of them unique (usually ``"id"``), and
+    the cursor holds their values on the last row returned.
+    """
+    qs = qs.order_by(*fields)
+    if cursor:
+        try:
+            after = _decode(cursor)
+            if len(after) != len(fields) or not all(
+                isinstance(v, (int, float)) and not isinstance(v, bool) for v in after
+            ):
+                raise ValueError(cursor)
+        except (ValueError, TypeError):
+            raise InvalidCursor(cursor)
+        # (f1, f2, ...) > (v1, v2, ...), spelled out for every backend
+        seek = Q()
+        for i, field in enumerate(fields):
+            seek |= Q(**dict(zip(fields[:i], after[:i])), **{f"{field}__gt": after[i]})
+        qs = qs.filter(seek)
+
+    items = list(qs[: size + 1])
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = _encode([getattr(items[-1], field) for field in fields])
+    return items, next_cursor
@@ -0,0 +1,277 @@
+"""
+Rate limits for write endpoints.
+
+Each scope has a rate like ``"30/m"`` (requests per second, minute, hour
+or day, optionally ``"30/5m"``). Requests are counted per signed-in user,
+or per client address for anonymous ones. ``rate_limit(scope)`` wraps a view,
+sync or async, and answers 429 with ``Retry-After`` once the rate is used
+up. ``hit()`` checks one request inline where only part of a view is
+limited, like the view counting in ``room_detail``.
+
+Configured through ``settings.RATE_LIMITS``::
+
+    RATE_LIMITS = {
+        "BACKEND": "listings.ratelimit.MemoryStore",
+        "OPTIONS": {},
+        "RATES": {"track_contact": "30/m"},  # scopes not listed are unlimited
+        "ENABLED": True,
+    }
+
+Stores:
+
+- ``MemoryStore``: a token bucket per key in this process. Bursts up to the
+  limit, then refills evenly over the period.
+- ``CacheStore``: a fixed-window counter in a Django cache, shared by every
+  worker using it. One ``incr`` per check, plus an ``add`` for the first
+  request of each window.
+- ``DatabaseStore``: fixed-window ``RateLimitWindow`` rows, for deployments
+  with no shared cache, written through the writer queue. A check is one
+  ``UPDATE`` while its window has room. The first request of a window, and
+  every request over the limit, also tries an ``INSERT`` in a savepoint, and
+  every ``prune_every`` new windows a ``DELETE`` drops the expired rows.
+  These writes don't pin clients to the primary (``listings.routers``).
+
+Signed-out clients are told apart by address. Behind reverse proxies set
+``TRUSTED_PROXIES`` to how many there are: the address is then read from
+``X-Forwarded-For``, which clients can forge beyond the proxies' entries.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+from . import writer
+from .models import RateLimitWindow
+
+DEFAULTS = {
+    "BACKEND": "listings.ratelimit.MemoryStore",
+    "OPTIONS": {},
+    "RATES": {},
+    "ENABLED": True,
+}
+RATE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$")
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """``(limit, period in seconds)`` for a rate like ``"30/m"``."""
+    match = RATE.match(rate)
+    if not match:
+        raise ValueError(f"Invalid rate {rate!r}; expected e.g. '30/m' or '5/10s'.")
+    limit, count, unit = match.groups()
+    return int(limit), int(count or 1) * UNITS[unit]
+
+
+class MemoryStore:
+    """Token buckets in this process; the least recently used go first when full."""
+
+    blocking = False
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def hit(self, key, limit, period):
+        now = time.monotonic()
+        refill = limit / period
+        with self.lock:
+            tokens, last = self.buckets.pop(key, (limit, now))
+            tokens = min(limit, tokens + (now - last) * refill)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / refill
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_size:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+def _window(period):
+    now = time.time()
+    window = int(now // period)
+    return window, (window + 1) * period - now
+
+
+class CacheStore:
+    """Fixed-window counters in a Django cache."""
+
+    # the shared kinds (file, db, memcached, redis) do I/O on every call
+    blocking = True
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    def hit(self, key, limit, period):
+        cache = caches[self.alias]
+        window, left = _window(period)
+        cache_key = f"ratelimit:{key}:{window}"
+        try:
+            count = cache.incr(cache_key)
+        except ValueError:
+            # first request in this window, or another worker just added it
+            count = 1 if cache.add(cache_key, 1, period + 1) else cache.incr(cache_key)
+        return 0 if count <= limit else left
+
+
+class DatabaseStore:
+    """Fixed-window counters as ``RateLimitWindow`` rows."""
+
+    blocking = True
+
+    def __init__(self, prune_every=1000):
+        # expired rows are deleted after this many new windows
+        self.prune_every = prune_every
+        self.created = 0
+
+    def hit(self, key, limit, period):
+        return writer.call(self._hit, key, limit, period)
+
+    def _hit(self, key, limit, period):
+        window, left = _window(period)
+        counted = RateLimitWindow.objects.filter(
+            key=key, window=window, count__lt=limit
+        ).update(count=F("count") + 1)
+        if counted:
+            return 0
+        now = time.time()
+        try:
+            with transaction.atomic():
+                RateLimitWindow.objects.create(
+                    key=key,
+                    window=window,
+                    count=1,
+                    expires_at=datetime.fromtimestamp(now + left, dt_timezone.utc),
+                )
+        except IntegrityError:
+            # the window exists and is full
+            return left
+        self.created += 1
+        if self.created % self.prune_every == 0:
+            RateLimitWindow.objects.filter(
+                expires_at__lt=datetime.fromtimestamp(now, dt_timezone.utc)
+            ).delete()
+        return 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "RATE_LIMITS", {})}
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            config = _config()
+            _store = import_string(config["BACKEND"])(**config["OPTIONS"])
+        return _store
+
+
+@receiver(setting_changed)
+def _reset_store(setting, **kwargs):
+    global _store
+    if setting == "RATE_LIMITS":
+        with _store_lock:
+            _store = None
+
+
+def client_ip(request):
+    """
+    The client's address. With ``TRUSTED_PROXIES`` proxies in front, each
+    appends the address it saw to ``X-Forwarded-For``, so the client is the
+    entry that many from the end; earlier ones are whatever the client sent.
+    """
+    proxies = getattr(settings, "TRUSTED_PROXIES", 0)
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    if proxies and forwarded:
+        addresses = [a.strip() for a in forwarded.split(",") if a.strip()]
+        if addresses:
+            return addresses[-min(proxies, len(addresses))]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def client_key(request, user):
+    if user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{client_ip(request)}"
+
+
+def _rate(scope):
+    config = _config()
+    rate = config["RATES"].get(scope)
+    if not config["ENABLED"] or not rate:
+        return None
+    return parse_rate(rate)
+
+
+def hit(scope, request, user):
+    """
+    Count one request by ``user`` (or the client) against ``scope``. Returns
+    how many seconds to wait before the next one is allowed, 0 if this one is.
+    """
+    rate = _rate(scope)
+    if rate is None:
+        return 0
+    return get_store().hit(f"{scope}:{client_key(request, user)}", *rate)
+
+
+async def ahit(scope, request, user):
+    """``hit()`` for async views."""
+    if _rate(scope) is None:
+        return 0
+    if get_store().blocking:
+        return await sync_to_async(hit)(scope, request, user)
+    return hit(scope, request, user)
+
+
+def too_many_requests(wait):
+    response = HttpResponse("Too many requests.", status=429)
+    response["Retry-After"] = str(max(1, math.ceil(wait)))
+    return response
+
+
+def rate_limit(scope):
+    """Limit a view to ``RATE_LIMITS["RATES"][scope]``."""
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                wait = await ahit(scope, request, await request.auser())
+                if wait:
+                    return too_many_requests(wait)
+                return await view(request, *args, **kwargs)
+
+        else:
+
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                wait = hit(scope, request, request.user)
+                if wait:
+                    return too_many_requests(wait)
+                return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
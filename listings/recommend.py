@@ -0,0 +1,245 @@
+"""
+Precomputed "similar rooms".
+
+``build()`` scores available rooms against each other and keeps the best
+``TOP_K`` for each as ``SimilarRoom`` rows, which ``room_detail`` reads with
+one indexed query. Similarity is a weighted sum (``WEIGHTS``) of:
+
+- text: cosine of the title and description's TF-IDF vectors, with words
+  hashed into ``TEXT_DIM`` buckets so the matrix stays small and dense
+- type: the same room type or not
+- price: cosine of an angle that turns 45 degrees per doubling of the price
+- place: the same place (``Room.place``, see ``listings.geo``)
+- coview: how many signed-in users viewed both rooms in the last
+  ``COVIEW_DAYS`` days, as a cosine over viewers
+
+The first three are rows of one NumPy matrix, weighted so that a single
+matrix product sums them. Rooms are only scored against the rest of their
+place, ``BLOCK_SIZE`` rows at a time, plus whatever they were co-viewed with.
+
+Without ``full``, only places that changed since the last build are redone:
+those with new rooms, rooms without recommendations yet, or new views by
+signed-in users. Edits to existing rooms wait for the next full build.
+"""
+
+import math
+import zlib
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from . import duplicates, fragments
+from .models import Room, RoomStat, SimilarRoom
+
+TOP_K = 6
+TEXT_DIM = 256
+COVIEW_DAYS = 90
+# most recent rooms per user counted for co-views, so heavy browsers don't
+# add thousands of pairs each
+COVIEW_ROOMS = 20
+BLOCK_SIZE = 512
+WEIGHTS = {"text": 0.4, "type": 0.2, "price": 0.2, "place": 0.2, "coview": 0.5}
+TYPE_INDEX = {code: i for i, (code, _) in enumerate(Room.ROOM_TYPES)}
+
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+
+
+def features(rooms):
+    """One weighted row per room; dot products sum the content similarities."""
+    n = len(rooms)
+    rows = []
+    cols = []
+    for i, room in enumerate(rooms):
+        for word in duplicates.normalize(f"{room.title} {room.description}").split():
+            rows.append(i)
+            cols.append(zlib.crc32(word.encode()) % TEXT_DIM)
+    text = np.zeros((n, TEXT_DIM), dtype=np.float32)
+    np.add.at(text, (rows, cols), 1)
+    idf = np.log((1 + n) / (1 + np.count_nonzero(text, axis=0))) + 1
+    text *= idf.astype(np.float32)
+    _unit_rows(text)
+
+    types = np.zeros((n, len(TYPE_INDEX)), dtype=np.float32)
+    types[np.arange(n), [TYPE_INDEX.get(room.room_type, 0) for room in rooms]] = 1
+
+    prices = np.array([float(room.price) for room in rooms], dtype=np.float64)
+    angle = np.log2(np.clip(prices, 1, None)) * (np.pi / 4)
+    price = np.stack([np.cos(angle), np.sin(angle)], axis=1).astype(np.float32)
+
+    return np.hstack(
+        [
+            math.sqrt(WEIGHTS["text"]) * text,
+            math.sqrt(WEIGHTS["type"]) * types,
+            math.sqrt(WEIGHTS["price"]) * price,
+        ]
+    )
+
+
+def coviews(since):
+    """``{room_id: {other_id: score}}`` from views by signed-in users."""
+    views = (
+        RoomStat.objects.filter(
+            stat_type="view", user__isnull=False, created_at__gte=since
+        )
+        .order_by("user_id", "-created_at")
+        .values_list("user_id", "room_id")
+    )
+    viewers = Counter()
+    pairs = Counter()
+
+    def add(rooms):
+        viewers.update(rooms)
+        rooms = sorted(rooms)
+        for i, a in enumerate(rooms):
+            for b in rooms[i + 1 :]:
+                pairs[(a, b)] += 1
+
+    user = None
+    rooms = []
+    for user_id, room_id in views.iterator(chunk_size=2000):
+        if user_id != user:
+            add(rooms)
+            user, rooms = user_id, []
+        if len(rooms) < COVIEW_ROOMS and room_id not in rooms:
+            rooms.append(room_id)
+    add(rooms)
+
+    scores = defaultdict(dict)
+    for (a, b), n in pairs.items():
+        score = n / math.sqrt(viewers[a] * viewers[b])
+        scores[a][b] = scores[b][a] = score
+    return scores
+
+
+def _score_block(members, matrix, places, pairs, index_of, ids, k):
+    """``{room index: [(similar index, score), ...]}`` for one place's rooms."""
+    members = np.asarray(members)
+    place_bonus = WEIGHTS["place"] if places[members[0]] else 0
+    block = matrix[members]
+    results = {}
+    for start in range(0, len(members), BLOCK_SIZE):
+        rows = members[start : start + BLOCK_SIZE]
+        scores = matrix[rows] @ block.T + place_bonus
+        scores[np.arange(len(rows)), np.arange(start, start + len(rows))] = -np.inf
+        if len(members) - 1 > k:
+            tops = np.argpartition(-scores, k, axis=1)[:, :k]
+        else:
+            tops = np.broadcast_to(np.arange(len(members)), scores.shape)
+        for r, i in enumerate(rows):
+            candidates = {
+                int(members[j]): float(scores[r, j])
+                for j in tops[r]
+                if np.isfinite(scores[r, j])
+            }
+            for other, coview in pairs.get(ids[i], {}).items():
+                j = index_of.get(other)
+                if j is None or j == i:
+                    continue
+                if j not in candidates:
+                    same_place = places[j] and places[j] == places[i]
+                    candidates[j] = float(matrix[i] @ matrix[j]) + (
+                        WEIGHTS["place"] if same_place else 0
+                    )
+                candidates[j] += WEIGHTS["coview"] * coview
+            results[int(i)] = sorted(candidates.items(), key=lambda item: -item[1])[:k]
+    return results
+
+
+def _dirty_places(since):
+    """Places (``""`` for rooms without one) that changed after ``since``."""
+    rooms = Room.objects.filter(is_available=True).filter(
+        Q(created_at__gt=since) | Q(similar__isnull=True)
+    )
+    views = RoomStat.objects.filter(
+        stat_type="view", user__isnull=False, created_at__gt=since
+    )
+    return set(rooms.values_list("place", flat=True).distinct()) | set(
+        views.values_list("room__place", flat=True).distinct()
+    )
+
+
+def _save(results, ids, now):
+    room_ids = [ids[i] for i in results]
+    rows = [
+        SimilarRoom(
+            room_id=ids[i],
+            similar_id=ids[j],
+            rank=rank,
+            score=score,
+            computed_at=now,
+        )
+        for i, similar in results.items()
+        for rank, (j, score) in enumerate(similar)
+    ]
+    with transaction.atomic():
+        for start in range(0, len(room_ids), 1000):
+            SimilarRoom.objects.filter(
+                room_id__in=room_ids[start : start + 1000]
+            ).delete()
+        SimilarRoom.objects.bulk_create(rows, batch_size=1000)
+
+
+def build(full=False, k=TOP_K):
+    """
+    Recompute similar rooms (every place with ``full``, else only the changed
+    ones). Returns the number of rooms whose recommendations were rebuilt.
+    """
+    now = timezone.now()
+    last = SimilarRoom.objects.aggregate(last=Max("computed_at"))["last"]
+    dirty = None if full or last is None else _dirty_places(last)
+    if dirty is not None and not dirty:
+        return 0
+
+    rooms = list(
+        Room.objects.filter(is_available=True)
+        .order_by("pk")
+        .values_list(
+            "pk", "place", "room_type", "price", "title", "description", named=True
+        )
+    )
+    if not rooms:
+        SimilarRoom.objects.all().delete()
+        return 0
+    ids = [room.pk for room in rooms]
+    places = [room.place for room in rooms]
+    index_of = {room_id: i for i, room_id in enumerate(ids)}
+    matrix = features(rooms)
+    pairs = coviews(now - timedelta(days=COVIEW_DAYS))
+
+    blocks = defaultdict(list)
+    for i, place in enumerate(places):
+        if dirty is None or place in dirty:
+            blocks[place].append(i)
+
+    rebuilt = 0
+    for members in blocks.values():
+        results = _score_block(members, matrix, places, pairs, index_of, ids, k)
+        _save(results, ids, now)
+        rebuilt += len(results)
+    if full:
+        # rooms taken down since the last build
+        SimilarRoom.objects.exclude(room__is_available=True).delete()
+    return rebuilt
+
+
+def similar_rooms(room_id):
+    """``room_id``'s similar rooms that are still listed, best first."""
+    rows = (
+        SimilarRoom.objects.filter(room_id=room_id, similar__is_available=True)
+        .select_related("similar")
+        .only("similar__id", "similar__version")
+        .order_by("rank")
+    )
+    return [row.similar for row in rows]
+
+
+def similar_cards(room_id):
+    return fragments.render_cards(similar_rooms(room_id))
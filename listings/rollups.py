@@ -0,0 +1,234 @@
+"""
+Hourly, daily and all-time rollups of ``RoomStat`` events.
+
+``apply()`` runs on every ``stats_recorded`` batch and bumps one counter row
+per (room | location | owner | the site, stat_type, granularity, bucket), so
+analytics read a bounded number of rows instead of counting raw events. ``backfill()``
+rebuilds the tables from raw events, ``compact()`` drops hourly rows once
+they're old enough that the daily rows suffice, and ``prune_raw()`` applies
+the ``ROOMSTAT_RETENTION_DAYS`` policy to the raw table.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import (
+    LocationStatRollup,
+    OwnerStatRollup,
+    Room,
+    RoomStat,
+    RoomStatRollup,
+    SiteStatRollup,
+    StatRollup,
+)
+
+ALL_TIME = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+CONTACT_PREFIX = "contact"
+# what rollups and area demand need from each stat's room
+STAT_ROOM_FIELDS = ("location", "owner_id", "place")
+
+
+def bucket_start(when, granularity):
+    when = when.astimezone(dt_timezone.utc)
+    if granularity == StatRollup.HOUR:
+        return when.replace(minute=0, second=0, microsecond=0)
+    if granularity == StatRollup.DAY:
+        return when.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ALL_TIME
+
+
+def rooms_for(stats):
+    """
+    ``{room_id: Room}`` for a ``stats_recorded`` batch with the fields its
+    receivers read (``STAT_ROOM_FIELDS``). Ingest loads them onto
+    ``stat.room`` already; anything else costs one query.
+    """
+    field = RoomStat._meta.get_field("room")
+    rooms = {}
+    for stat in stats:
+        if field.is_cached(stat) and stat.room is not None:
+            if not stat.room.get_deferred_fields() & set(STAT_ROOM_FIELDS):
+                rooms[stat.room_id] = stat.room
+    missing = {stat.room_id for stat in stats} - rooms.keys()
+    if missing:
+        rooms.update(Room.objects.only(*STAT_ROOM_FIELDS).in_bulk(missing))
+    return rooms
+
+
+def _upsert(model, key_fields, counts):
+    """
+    Add each ``{key: n}`` in ``counts`` to ``model``'s row for that key,
+    creating missing rows, with one ``INSERT ... ON CONFLICT DO UPDATE``
+    per batch. SQLite (3.24+) and PostgreSQL both support it; Django's
+    ``bulk_create(update_conflicts=True)`` can only overwrite the count.
+    """
+    if not counts:
+        return
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in (*key_fields, "count")]
+    table = qn(model._meta.db_table)
+    columns = ", ".join(qn(field.column) for field in fields)
+    conflict = ", ".join(qn(field.column) for field in fields[:-1])
+    row = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    items = list(counts.items())
+    batch_size = connection.ops.bulk_batch_size(fields, items) or len(items)
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), batch_size):
+            batch = items[start : start + batch_size]
+            params = [
+                field.get_db_prep_save(value, connection)
+                for key, n in batch
+                for field, value in zip(fields, (*key, n))
+            ]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES "
+                + ", ".join([row] * len(batch))
+                + f" ON CONFLICT ({conflict}) DO UPDATE SET"
+                f" {qn('count')} = {table}.{qn('count')} + excluded.{qn('count')}",
+                params,
+            )
+
+
+def apply(stats):
+    """
+    Fold a batch of freshly written ``RoomStat`` rows into the rollups: one
+    upsert per table however many rows change (plus one query for the rooms
+    unless ingest loaded them, see ``rooms_for()``).
+    Run it in a transaction; ``stats_recorded`` receivers already are.
+    """
+    if not stats:
+        return
+
+    rooms = {
+        pk: (room.location, room.owner_id) for pk, room in rooms_for(stats).items()
+    }
+    by_room = Counter()
+    by_location = Counter()
+    by_owner = Counter()
+    by_site = Counter()
+    for stat in stats:
+        location, owner_id = rooms.get(stat.room_id, (None, None))
+        for granularity, _ in StatRollup.GRANULARITY_CHOICES:
+            bucket = bucket_start(stat.created_at, granularity)
+            by_room[(stat.room_id, stat.stat_type, granularity, bucket)] += 1
+            by_site[(stat.stat_type, granularity, bucket)] += 1
+            if location is not None:
+                by_location[(location, stat.stat_type, granularity, bucket)] += 1
+            if owner_id is not None:
+                by_owner[(owner_id, stat.stat_type, granularity, bucket)] += 1
+
+    key = ("stat_type", "granularity", "bucket")
+    _upsert(RoomStatRollup, ("room", *key), by_room)
+    _upsert(LocationStatRollup, ("location", *key), by_location)
+    _upsert(OwnerStatRollup, ("owner", *key), by_owner)
+    _upsert(SiteStatRollup, key, by_site)
+
+
+def _grouped(qs, granularity, *fields):
+    if granularity == StatRollup.HOUR:
+        qs = qs.annotate(b=TruncHour("created_at", tzinfo=dt_timezone.utc))
+    elif granularity == StatRollup.DAY:
+        qs = qs.annotate(b=TruncDay("created_at", tzinfo=dt_timezone.utc))
+    if granularity == StatRollup.TOTAL:
+        return qs.values(*fields, "stat_type")
+    return qs.values(*fields, "stat_type", "b")
+
+
+def backfill(since=None, batch_size=2000):
+    """
+    Rebuild rollups from raw ``RoomStat`` rows.
+
+    With ``since`` only hourly/daily buckets from that day on are rebuilt and
+    all-time totals are left alone; without it everything is recomputed, so
+    don't run a full backfill after raw events have been pruned.
+    """
+    raw = RoomStat.objects.all()
+    granularities = [StatRollup.HOUR, StatRollup.DAY, StatRollup.TOTAL]
+    if since is not None:
+        since = bucket_start(since, StatRollup.DAY)
+        raw = raw.filter(created_at__gte=since)
+        granularities = [StatRollup.HOUR, StatRollup.DAY]
+
+    written = 0
+    with transaction.atomic():
+        for model, field, attname in (
+            (RoomStatRollup, "room", "room_id"),
+            (LocationStatRollup, "room__location", "location"),
+            (OwnerStatRollup, "room__owner", "owner_id"),
+            (SiteStatRollup, None, None),
+        ):
+            fields = [field] if field else []
+            old = model.objects.filter(granularity__in=granularities)
+            if since is not None:
+                old = old.filter(bucket__gte=since)
+            old.delete()
+
+            for granularity in granularities:
+                rows = _grouped(raw, granularity, *fields).annotate(n=Count("id"))
+                objs = []
+                for row in rows.order_by().iterator(chunk_size=batch_size):
+                    key = {attname: row[field] for field in fields}
+                    if None in key.values():
+                        # ownerless rooms
+                        continue
+                    objs.append(
+                        model(
+                            stat_type=row["stat_type"],
+                            granularity=granularity,
+                            bucket=row.get("b") or ALL_TIME,
+                            count=row["n"],
+                            **key,
+                        )
+                    )
+                model.objects.bulk_create(objs, batch_size=batch_size)
+                written += len(objs)
+    return written
+
+
+def compact(keep_hourly_days=7):
+    """Delete hourly rollups older than ``keep_hourly_days``; daily rows remain."""
+    cutoff = bucket_start(
+        timezone.now() - timedelta(days=keep_hourly_days), StatRollup.DAY
+    )
+    deleted = 0
+    for model in (RoomStatRollup, LocationStatRollup, OwnerStatRollup, SiteStatRollup):
+        n, _ = model.objects.filter(
+            granularity=StatRollup.HOUR, bucket__lt=cutoff
+        ).delete()
+        deleted += n
+    return deleted
+
+
+def prune_raw(days=None, batch_size=5000):
+    """Delete raw events older than ``days`` (default ``ROOMSTAT_RETENTION_DAYS``)."""
+    days = days if days is not None else settings.ROOMSTAT_RETENTION_DAYS
+    if days is None:
+        return 0
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = 0
+    while True:
+        ids = list(
+            RoomStat.objects.filter(created_at__lt=cutoff).values_list("pk", flat=True)[
+                :batch_size
+            ]
+        )
+        if not ids:
+            return deleted
+        RoomStat.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+
+
+def totals():
+    """All-time event counts keyed by ``stat_type``: one row per type."""
+    return dict(
+        SiteStatRollup.objects.filter(granularity=StatRollup.TOTAL).values_list(
+            "stat_type", "count"
+        )
+    )
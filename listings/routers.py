@@ -0,0 +1,125 @@
+"""
+Primary/replica database routing.
+
+Writes go to ``default``. Reads made while serving a request are spread
+over ``settings.DATABASE_REPLICAS`` (empty by default, so everything stays on
+``default``). Reads outside a request stay on ``default`` too: migrations,
+management commands and the ingest thread want the current data, not a
+lagging copy.
+
+Replicas lag, so a client that just wrote would otherwise not see its own
+change on the next page. ``ReplicaPinningMiddleware`` pins the rest of the
+writing request to the primary. It also sets a short-lived cookie that keeps
+that client's following requests there for ``REPLICA_PIN_SECONDS``.
+Writes to ``UNPINNED_MODELS`` (rate-limit counters, the database cache)
+don't pin: reading pages is what they count, and pinning every reader would
+leave the replicas idle.
+"""
+
+import contextvars
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = "primary_pin"
+# read on every request and written on login: a lagging copy logs people out
+PRIMARY_APPS = {"sessions"}
+# bookkeeping no page reads back: writing it doesn't pin the client
+# (django_cache.cacheentry is the database cache's table)
+UNPINNED_MODELS = {"listings.ratelimitwindow", "django_cache.cacheentry"}
+
+_state = contextvars.ContextVar("replica_state", default=None)
+
+
+class RequestState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def _replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def _pin_seconds():
+    return getattr(settings, "REPLICA_PIN_SECONDS", 10)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = _replicas()
+        if not replicas:
+            return None
+        state = _state.get()
+        if state is None or state.pinned or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            # related lookups follow the object they start from
+            return instance._state.db
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        # the database cache's stand-in model has no label_lower
+        label = f"{model._meta.app_label}.{model._meta.model_name}"
+        if state is not None and label not in UNPINNED_MODELS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS or db not in _replicas()
+
+
+class ReplicaPinningMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return _state.set(RequestState(pinned=pinned))
+
+    def _finish(self, response, state):
+        if state.wrote:
+            until = time.time() + _pin_seconds()
+            response.set_cookie(
+                PIN_COOKIE, f"{until:.0f}", max_age=_pin_seconds(), httponly=True
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self._start(request)
+        state = _state.get()
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, state)
+
+    async def __acall__(self, request):
+        token = self._start(request)
+        state = _state.get()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, state)
@@ -0,0 +1,204 @@
+"""
+Full-text index over room listings.
+
+SQLite uses an FTS5 virtual table keyed by room id; Postgres uses a side
+table holding a weighted ``tsvector`` with a GIN index. Both are kept in sync
+from ``Room`` save/delete signals and can be rebuilt with
+``manage.py rebuild_search_index``. ``room_list`` orders text searches by
+relevance (``annotate_rank``), paging on ``(rank, id)``. On any other
+backend (or an SQLite build without FTS5) searches fall back to
+``icontains`` filtering, newest first.
+"""
+
+import re
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SQLITE_TABLE = "listings_room_fts"
+POSTGRES_TABLE = "listings_room_search"
+
+# column weights: title, description, location, room_type
+SQLITE_WEIGHTS = (10.0, 1.0, 5.0, 2.0)
+
+_available = {}
+
+
+def backend():
+    """Return ``"sqlite"``, ``"postgresql"`` or ``None`` for the active database."""
+    vendor = connection.vendor
+    if vendor == "sqlite":
+        table = SQLITE_TABLE
+    elif vendor == "postgresql":
+        table = POSTGRES_TABLE
+    else:
+        return None
+
+    key = (connection.alias, str(connection.settings_dict["NAME"]))
+    if key not in _available:
+        _available[key] = table in connection.introspection.table_names()
+    return vendor if _available[key] else None
+
+
+def terms(q):
+    return re.findall(r"\w+", (q or "").lower())
+
+
+def _document(room):
+    return (
+        room.title,
+        room.description,
+        room.location,
+        f"{room.room_type} {room.get_room_type_display()}",
+    )
+
+
+def _sqlite_query(words):
+    # every word must match; the trailing * makes each one a prefix query
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def _postgres_query(words):
+    return " & ".join(f"{w}:*" for w in words)
+
+
+def index_rooms(rooms):
+    kind = backend()
+    if kind is None:
+        return
+
+    rows = [(room.pk, *_document(room)) for room in rooms]
+    if not rows:
+        return
+
+    with connection.cursor() as cursor:
+        if kind == "sqlite":
+            cursor.executemany(
+                f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s",
+                [(row[0],) for row in rows],
+            )
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_TABLE} "
+                "(rowid, title, description, location, room_type) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {POSTGRES_TABLE} (room_id, document) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'D') || "
+                "setweight(to_tsvector('simple', %s), 'B') || "
+                "setweight(to_tsvector('simple', %s), 'C')) "
+                "ON CONFLICT (room_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+
+def index_room(room):
+    index_rooms([room])
+
+
+def remove_room(room_id):
+    kind = backend()
+    if kind is None:
+        return
+    with connection.cursor() as cursor:
+        if kind == "sqlite":
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [room_id])
+        else:
+            cursor.execute(
+                f"DELETE FROM {POSTGRES_TABLE} WHERE room_id = %s", [room_id]
+            )
+
+
+def rebuild(batch_size=1000):
+    """Drop every indexed document and re-index all rooms. Returns the count."""
+    from .models import Room
+
+    kind = backend()
+    if kind is None:
+        return 0
+
+    # searches keep seeing the old index until the new one is complete
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {SQLITE_TABLE if kind == 'sqlite' else POSTGRES_TABLE}"
+            )
+
+        total = 0
+        batch = []
+        for room in Room.objects.order_by("pk").iterator(chunk_size=batch_size):
+            batch.append(room)
+            if len(batch) >= batch_size:
+                index_rooms(batch)
+                total += len(batch)
+                batch = []
+        index_rooms(batch)
+    return total + len(batch)
+
+
+def _match_sql(words):
+    if backend() == "sqlite":
+        return (
+            f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s",
+            [_sqlite_query(words)],
+        )
+    return (
+        f"SELECT room_id FROM {POSTGRES_TABLE} "
+        "WHERE document @@ to_tsquery('simple', %s)",
+        [_postgres_query(words)],
+    )
+
+
+def filter_rooms(qs, q):
+    """Restrict a ``Room`` queryset to rows matching every word of ``q``."""
+    words = terms(q)
+    if not words:
+        return qs
+
+    if backend() is None:
+        match = Q()
+        for word in words:
+            match &= (
+                Q(title__icontains=word)
+                | Q(description__icontains=word)
+                | Q(location__icontains=word)
+                | Q(room_type__icontains=word)
+            )
+        return qs.filter(match)
+
+    sql, params = _match_sql(words)
+    return qs.filter(id__in=RawSQL(sql, params))
+
+
+def annotate_rank(qs, q):
+    """
+    Annotate a ``Room`` queryset already narrowed by ``filter_rooms`` with
+    ``search_rank``, lower for better matches: FTS5's ``bm25`` with the
+    column weights, or Postgres's ``ts_rank`` negated. ``None`` when there's
+    nothing to rank by (no words, or no full-text index).
+    """
+    words = terms(q)
+    kind = backend()
+    if not words or kind is None:
+        return None
+
+    qn = connection.ops.quote_name
+    room_id = f"{qn(qs.model._meta.db_table)}.{qn('id')}"
+    if kind == "sqlite":
+        weights = ", ".join(str(w) for w in SQLITE_WEIGHTS)
+        sql = (
+            f"SELECT bm25({SQLITE_TABLE}, {weights}) FROM {SQLITE_TABLE} "
+            f"WHERE {SQLITE_TABLE} MATCH %s AND rowid = {room_id}"
+        )
+        params = [_sqlite_query(words)]
+    else:
+        sql = (
+            f"SELECT -ts_rank(document, to_tsquery('simple', %s)) "
+            f"FROM {POSTGRES_TABLE} WHERE room_id = {room_id}"
+        )
+        params = [_postgres_query(words)]
+    return qs.annotate(search_rank=RawSQL(sql, params, output_field=FloatField()))
@@ -1,16 +1,125 @@
-from django.db.models import Count
-from .models import RoomStat
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import counters, rollups, uniques
+from .hll import HyperLogLog
+from .models import (
+    OwnerStatRollup,
+    Room,
+    RoomStatRollup,
+    RoomViewSketch,
+    StatRollup,
+)
+
+CHANNELS = [
+    ("contact_phone", "Phone"),
+    ("contact_whatsapp", "WhatsApp"),
+    ("contact_email", "Email"),
+]
+TREND_DAYS = 30
 
 
 def stats_summary():
+    """Site-wide event totals, read from the all-time rollups (see listings.rollups)."""
+    totals = rollups.totals()
+    return {
+        "total_views": totals.get("view", 0),
+        "total_contacts": sum(
+            n for stat_type, n in totals.items() if stat_type.startswith("contact")
+        ),
+        "total_success": totals.get("success", 0),
+        "city_demand": counters.get("area_heatmap"),
+    }
+
+
+def _conversion(successes, contacts):
+    return round(100 * successes / contacts) if contacts else None
+
+
+def _summary(counts):
+    contacts = sum(counts.get(stat_type, 0) for stat_type, _ in CHANNELS)
+    return {
+        "views": counts.get("view", 0),
+        "channels": [
+            {"label": label, "count": counts.get(stat_type, 0)}
+            for stat_type, label in CHANNELS
+        ],
+        "contacts": contacts,
+        "successes": counts.get("success", 0),
+        "conversion": _conversion(counts.get("success", 0), contacts),
+    }
+
+
+def owner_dashboard(owner, days=TREND_DAYS):
+    """
+    Rooms, per-room and per-owner event counts, a daily trend and distinct
+    viewers over the last ``days`` for ``owner``, in four queries however
+    many rooms or events they have.
+    """
+    rooms = list(
+        Room.objects.filter(owner=owner)
+        .annotate(image_count=Count("images"))
+        .order_by("-created_at")
+    )
+
+    per_room = {}
+    for room_id, stat_type, count in RoomStatRollup.objects.filter(
+        room__owner=owner, granularity=StatRollup.TOTAL
+    ).values_list("room_id", "stat_type", "count"):
+        per_room.setdefault(room_id, {})[stat_type] = count
+    for room in rooms:
+        room.stats = _summary(per_room.get(room.pk, {}))
+
+    today = rollups.bucket_start(timezone.now(), StatRollup.DAY)
+    since = today - timedelta(days=days - 1)
+    totals = {}
+    daily = {}
+    for granularity, bucket, stat_type, count in OwnerStatRollup.objects.filter(
+        Q(granularity=StatRollup.TOTAL)
+        | Q(granularity=StatRollup.DAY, bucket__gte=since),
+        owner=owner,
+    ).values_list("granularity", "bucket", "stat_type", "count"):
+        if granularity == StatRollup.TOTAL:
+            totals[stat_type] = count
+        else:
+            daily.setdefault(bucket.date(), {})[stat_type] = count
+
+    trend = []
+    for offset in range(days):
+        day = (since + timedelta(days=offset)).date()
+        counts = daily.get(day, {})
+        trend.append(
+            {
+                "day": day,
+                "views": counts.get("view", 0),
+                "contacts": sum(counts.get(t, 0) for t, _ in CHANNELS),
+                "successes": counts.get("success", 0),
+            }
+        )
+    sketches = uniques.sketches(
+        RoomViewSketch.objects.filter(
+            room__owner=owner, day__gte=since.date()
+        ).values_list("room_id", "sketch")
+    )
+    overall = HyperLogLog()
+    for room in rooms:
+        sketch = sketches.get(room.pk)
+        room.stats["unique_viewers"] = sketch.count() if sketch else 0
+        if sketch:
+            overall.merge(sketch)
+
+    peak = max([point["views"] for point in trend] + [1])
+    for point in trend:
+        point["height"] = round(100 * point["views"] / peak)
+
     return {
-        "total_views": RoomStat.objects.filter(stat_type="view").count(),
-        "total_contacts": RoomStat.objects.filter(
-            stat_type__startswith="contact"
-        ).count(),
-        "total_success": RoomStat.objects.filter(stat_type="success").count(),
-        "city_demand": RoomStat.objects.filter(stat_type="view")
-        .values("room__location")
-        .annotate(count=Count("id"))
-        .order_by("-count"),
+        "rooms": rooms,
+        "room_count": len(rooms),
+        "image_count": sum(room.image_count for room in rooms),
+        "totals": _summary(totals),
+        "unique_viewers": overall.count(),
+        "trend": trend,
+        "trend_days": days,
     }
@@ -0,0 +1,186 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import (
+    aggregates,
+    areas,
+    counters,
+    duplicates,
+    facets,
+    fragments,
+    geo,
+    images,
+    rollups,
+    search,
+    uniques,
+)
+from .models import (
+    Contact,
+    Place,
+    PlaceAlias,
+    Profile,
+    Review,
+    Room,
+    RoomImage,
+    RoomStat,
+)
+
+logger = logging.getLogger(__name__)
+
+# Sent with ``stats=[RoomStat, ...]`` whenever stat rows are written, whether
+# one at a time through save() or in bulk, so derived counters stay in step.
+stats_recorded = Signal()
+
+
+def send_stats_recorded(stats):
+    """
+    Send ``stats_recorded`` for rows that are already saved, in a savepoint
+    of its own. If a receiver fails, the derived data for this batch is
+    rolled back and the error logged, but the raw rows stay: rollups,
+    aggregates and sketches can be rebuilt from them (``rollup_stats
+    --backfill``, ``reconcile_aggregates``).
+    """
+    try:
+        with transaction.atomic():
+            stats_recorded.send(sender=RoomStat, stats=stats)
+    except Exception:
+        logger.exception("Derived data for %d RoomStat rows failed", len(stats))
+
+
+@receiver([post_save, post_delete], sender=Place)
+@receiver([post_save, post_delete], sender=PlaceAlias)
+def places_changed(sender, **kwargs):
+    geo.forget_places()
+
+
+@receiver(pre_save, sender=Room)
+def geocode_room(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "location" in update_fields:
+        geo.locate(instance)
+
+
+@receiver(pre_save, sender=RoomImage)
+def strip_image_metadata(sender, instance, **kwargs):
+    images.strip_upload(instance)
+
+
+@receiver(pre_save, sender=Room)
+def fingerprint_room(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(duplicates.KEY_FIELDS) & set(update_fields):
+        duplicates.assign(instance)
+
+
+@receiver(post_save, sender=Room)
+def room_saved(sender, instance, created, update_fields=None, **kwargs):
+    search.index_room(instance)
+    geo.index_room(instance)
+    if created:
+        aggregates.room_created(instance)
+    else:
+        # a full save bumps the version itself (Room.save)
+        if update_fields is not None and "version" not in update_fields:
+            fragments.bump([instance.pk])
+
+
+@receiver(post_delete, sender=Room)
+def room_deleted(sender, instance, **kwargs):
+    search.remove_room(instance.pk)
+    geo.remove_room(instance.pk)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    if created:
+        aggregates.review_added(instance)
+    else:
+        aggregates.review_changed(instance)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    aggregates.review_removed(instance)
+
+
+@receiver(post_save, sender=RoomStat)
+def room_stat_saved(sender, instance, created, **kwargs):
+    if created:
+        send_stats_recorded([instance])
+
+
+@receiver(stats_recorded)
+def update_room_aggregates(sender, stats, **kwargs):
+    aggregates.stats_added(stats)
+
+
+@receiver(stats_recorded)
+def update_stat_rollups(sender, stats, **kwargs):
+    rollups.apply(stats)
+
+
+@receiver(stats_recorded)
+def update_area_demand(sender, stats, **kwargs):
+    areas.views_added(stats)
+
+
+@receiver(stats_recorded)
+def update_view_sketches(sender, stats, **kwargs):
+    uniques.views_recorded(stats)
+
+
+@receiver([post_save, post_delete], sender=Room)
+def invalidate_room_counters(sender, **kwargs):
+    counters.invalidate("room_count", "rooms_available")
+
+
+@receiver([post_save, post_delete], sender=Room)
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_facets(sender, **kwargs):
+    facets.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Contact)
+def invalidate_contact_counter(sender, **kwargs):
+    counters.invalidate("contact_count")
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_review_counter(sender, **kwargs):
+    counters.invalidate("review_count")
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_landlord_counter(sender, **kwargs):
+    counters.invalidate("landlord_count")
+
+
+@receiver(stats_recorded)
+def invalidate_stat_counters(sender, stats, **kwargs):
+    counters.invalidate("contacts_made", "success_matches")
+
+
+@receiver(post_delete, sender=RoomImage)
+def delete_image_variants(sender, instance, **kwargs):
+    images.delete_variants(instance)
+
+
+@receiver([post_save, post_delete], sender=RoomImage)
+@receiver([post_save, post_delete], sender=Review)
+def bump_card_version(sender, instance, **kwargs):
+    fragments.bump([instance.room_id])
+
+
+@receiver(stats_recorded)
+def bump_contacted_cards(sender, stats, **kwargs):
+    # the card's "Popular" badge depends on the contact count
+    room_ids = {s.room_id for s in stats if s.stat_type.startswith("contact")}
+    if room_ids:
+        fragments.bump(room_ids)
+
+
+@receiver(post_save, sender=Profile)
+def bump_owner_cards(sender, instance, **kwargs):
+    # cards show the owner's "Verified" badge
+    fragments.bump(owner_id=instance.user_id)
@@ -0,0 +1,35 @@
+// Infinite scroll for the room grid: fetches the next keyset page as a
+// fragment and appends it. The "Load more" link still works without JS.
+(function () {
+  const grid = document.getElementById("roomGrid");
+  const button = document.getElementById("loadMore");
+  if (!grid || !button) return;
+
+  let nextUrl = button.dataset.moreUrl;
+  let loading = false;
+
+  async function loadMore() {
+    if (!nextUrl || loading) return;
+    loading = true;
+    try {
+      const res = await fetch(nextUrl, { headers: { Accept: "application/json" } });
+      if (!res.ok) return;
+      const data = await res.json();
+      grid.insertAdjacentHTML("beforeend", data.html);
+      nextUrl = data.more_url;
+      if (!nextUrl) button.parentElement.remove();
+    } finally {
+      loading = false;
+    }
+  }
+
+  button.addEventListener("click", (e) => {
+    e.preventDefault();
+    loadMore();
+  });
+
+  const observer = new IntersectionObserver((entries) => {
+    if (entries.some((entry) => entry.isIntersecting)) loadMore();
+  });
+  observer.observe(button);
+})();
@@ -0,0 +1,17 @@
+from django import template
+
+register = template.Library()
+
+
+@register.inclusion_tag("listings/room_picture.html")
+def room_picture(image, variant="card", alt="Room image", lazy=True):
+    """Render ``image`` as a <picture> using its resized WebP/JPEG ``variant``."""
+    src, webp, width, height = image.variant(variant)
+    return {
+        "src": src,
+        "webp": webp,
+        "width": width,
+        "height": height,
+        "alt": alt,
+        "lazy": lazy,
+    }
@@ -1,3 +1,1832 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import (
+    IntegrityError,
+    OperationalError,
+    connection,
+    connections,
+    router,
+    transaction,
+)
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    aggregates,
+    areas,
+    bulk,
+    counters,
+    fragments,
+    geo,
+    images,
+    ingest,
+    ratelimit,
+    recommend,
+    rollups,
+    search,
+    signals,
+    uniques,
+    writer,
+)
+from .forms import RoomForm
+from .hll import HyperLogLog
+from .metrics import QueryBudgetExceeded
+from .models import (
+    AreaDemand,
+    Contact,
+    OwnerStatRollup,
+    Place,
+    PlaceAlias,
+    RateLimitWindow,
+    Review,
+    Room,
+    RoomAggregate,
+    RoomImage,
+    RoomStat,
+    RoomStatRollup,
+    RoomViewSketch,
+    StatRollup,
+)
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page
+from .routers import PIN_COOKIE, ReplicaPinningMiddleware
+
+EXPLAINABLE = re.compile(r"^\s*(SELECT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+# The settings hold the production defaults. Test cases that drive the
+# tracking views write their stats inline and count every view, so they can
+# check what was recorded (and leave nothing queued for another database).
+# Their writes stay in the test's transaction, which the tuned profile's
+# writer thread couldn't see, and the tracking views' budgets, sized for
+# queued writes, are checked in QueryBudgetTests instead.
+TRACKING_VIEWS = {"room_detail", "track_contact", "mark_success"}
+inline_stats = override_settings(
+    STAT_INGEST={**settings.STAT_INGEST, "EAGER": True},
+    VIEW_DEDUPE={**settings.VIEW_DEDUPE, "SECONDS": 0},
+    SQLITE_WRITE_QUEUE=False,
+    QUERY_BUDGETS={
+        name: budget
+        for name, budget in settings.QUERY_BUDGETS.items()
+        if name not in TRACKING_VIEWS
+    },
+)
+
+
+def full_scans(sql):
+    """Tables the database would read in full to run ``sql``."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            details = [row[-1] for row in cursor.fetchall()]
+            # "SCAN t" is a table scan; "SCAN t USING [COVERING] INDEX i" walks
+            # an index and "SCAN t VIRTUAL TABLE" is the FTS index itself
+            return [
+                m.group(1)
+                for m in (re.match(r"SCAN (\w+)$", d.strip()) for d in details)
+                if m
+            ]
+        if connection.vendor == "postgresql":
+            # tiny test tables always favour seq scans; ask what else it could do
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {sql}")
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            return re.findall(r"Seq Scan on (\w+)", plan)
+    return []
+
+
+def cursor_of(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user("owner", "o@example.com", "pw")
+        cls.rooms = [
+            Room.objects.create(
+                owner=owner,
+                title=f"Room {i}",
+                description="d",
+                price=2000 + i,
+                location="Hatfield",
+                room_type="single",
+                contact_phone="+27 71 000 0000",
+            )
+            for i in range(7)
+        ]
+        # five rooms listed in the same instant, two later
+        same = timezone.now() - timedelta(days=1)
+        Room.objects.filter(pk__in=[r.pk for r in cls.rooms[:5]]).update(
+            created_at=same
+        )
+
+    def page_ids(self, cursor=None, size=2):
+        rooms, next_cursor = keyset_page(Room.objects.all(), cursor, size)
+        return [room.pk for room in rooms], next_cursor
+
+    def test_cursor_round_trip(self):
+        room = Room.objects.get(pk=self.rooms[3].pk)
+        self.assertEqual(decode_cursor(encode_cursor(room)), (room.created_at, room.pk))
+
+    def test_pages_walk_ties_on_created_at_once(self):
+        seen, cursor = self.page_ids()
+        while cursor:
+            ids, cursor = self.page_ids(cursor)
+            seen += ids
+        expected = list(
+            Room.objects.order_by("-created_at", "-id").values_list("pk", flat=True)
+        )
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_tampered_cursors_are_rejected(self):
+        good = self.page_ids()[1]
+        for cursor in (
+            "not base64!",
+            good[:-3],
+            cursor_of(["yesterday", 1]),
+            cursor_of([timezone.now().isoformat()]),
+            cursor_of({"a": 1}),
+        ):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    self.page_ids(cursor)
+                response = self.client.get(
+                    reverse("room_list_more"), {"cursor": cursor}
+                )
+                self.assertEqual(response.status_code, 400)
+        # the full page falls back to the first page
+        response = self.client.get(reverse("room_list"), {"cursor": "not base64!"})
+        self.assertEqual(response.status_code, 200)
+
+
+@inline_stats
+class QueryPlanTests(TestCase):
+    """
+    Every query behind the hot listing views must be answerable from an
+    index. A failure here means a change dropped or bypassed one of the
+    indexes in ``listings.models`` and the query now scans a whole table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.landlord = User.objects.create_user("landlord", "l@example.com", "pw")
+        cls.landlord.profile.role = "landlord"
+        cls.landlord.profile.save()
+        cls.tenant = User.objects.create_user("tenant", "t@example.com", "pw")
+
+        cls.rooms = [
+            Room.objects.create(
+                owner=cls.landlord,
+                title=f"Room {i}",
+                description="Sunny room near campus",
+                price=2000 + i,
+                location="Mamelodi East" if i % 2 else "Hatfield",
+                room_type="single" if i % 2 else "flat",
+                contact_phone="+27 71 000 0000",
+            )
+            for i in range(30)
+        ]
+        room = cls.rooms[0]
+        Contact.objects.create(room=room, user=cls.tenant)
+        Review.objects.create(room=room, user=cls.tenant, rating=4)
+        RoomStat.objects.create(room=room, user=cls.tenant, stat_type="view")
+        RoomStat.objects.create(room=room, user=cls.tenant, stat_type="contact_email")
+
+    def assertIndexedQueries(self, func):
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        self.assertTrue(ctx.captured_queries)
+
+        scans = {}
+        for query in ctx.captured_queries:
+            sql = query["sql"]
+            if EXPLAINABLE.match(sql):
+                for table in full_scans(sql):
+                    scans.setdefault(table, []).append(sql)
+        self.assertEqual(scans, {}, "queries fell back to full table scans")
+
+    def get(self, url, status=200):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_home(self):
+        self.assertIndexedQueries(lambda: self.get(reverse("home")))
+
+    def test_room_list(self):
+        url = reverse("room_list")
+        self.assertIndexedQueries(lambda: self.get(url))
+        self.assertIndexedQueries(lambda: self.get(f"{url}?type=single"))
+        self.assertIndexedQueries(lambda: self.get(f"{url}?q=sunny"))
+
+    def test_room_list_facets(self):
+        url = reverse("room_list")
+        response = self.get(url)
+        counts = {
+            facet["param"]: {o["label"]: o["count"] for o in facet["options"]}
+            for facet in response.context["facets"]
+        }
+        self.assertEqual(counts["type"], {"Single Room": 15, "Flat / Apartment": 15})
+        self.assertEqual(counts["place"], {"Hatfield": 15, "Mamelodi East": 15})
+        self.assertEqual(counts["rating"], {"4★ & up": 1, "3★ & up": 1, "2★ & up": 1})
+        self.assertIndexedQueries(
+            lambda: self.get(f"{url}?q=sunny&price=1500-2500&rating=3&place=Hatfield")
+        )
+
+    def test_room_list_nearby(self):
+        url = reverse("room_list")
+        response = self.get(f"{url}?near=Hatfield&radius=5&size=10")
+        # Hatfield rooms first, Mamelodi East (~18 km away) excluded
+        self.assertEqual(len(response.context["cards"]), 10)
+        self.assertNotContains(response, "Mamelodi East")
+        self.assertIndexedQueries(lambda: self.get(f"{url}?near=Hatfield"))
+        self.assertIndexedQueries(
+            lambda: self.get(f"{url}?bbox=28.0,-25.9,28.5,-25.6&type=single")
+        )
+        self.assertIndexedQueries(lambda: self.get(response.context["more_url"]))
+
+    def test_text_search_ranks_by_relevance(self):
+        # the older room has the word in its title, which weighs the most
+        titled = Room.objects.create(
+            owner=self.landlord,
+            title="Attic loft",
+            description="Bright",
+            price=2100,
+            location="Hatfield",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+        Room.objects.create(
+            owner=self.landlord,
+            title="Garden room",
+            description="Next to a loft conversion",
+            price=2200,
+            location="Hatfield",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+        url = reverse("room_list_more")
+        first = self.get(f"{url}?q=loft&size=1").json()
+        self.assertIn("Attic loft", first["html"])
+        second = self.get(first["more_url"]).json()
+        self.assertIn("Garden room", second["html"])
+        self.assertEqual(second["next_cursor"], None)
+        self.assertIndexedQueries(lambda: self.get(first["more_url"]))
+        # a newest-first cursor doesn't fit the ranked order
+        newest = self.get(f"{url}?size=1").json()["next_cursor"]
+        self.get(f"{url}?q=loft&cursor={newest}", status=400)
+
+    def test_nearby_pages_are_ordered_in_the_database(self):
+        url = reverse("room_list_more")
+        seen = []
+        more_url = f"{url}?near=Hatfield&radius=30&size=7"
+        while more_url:
+            data = self.get(more_url).json()
+            seen += re.findall(r'href="/room/(\d+)/"', data["html"])
+            more_url = data["more_url"]
+        # every room once, the Hatfield ones before those ~18 km away
+        self.assertEqual(sorted(map(int, seen)), sorted(r.pk for r in self.rooms))
+        located = {str(r.pk): r.location for r in self.rooms}
+        self.assertEqual(
+            [located[pk] for pk in seen],
+            sorted((located[pk] for pk in seen), key=lambda l: l != "Hatfield"),
+        )
+        self.get(f"{url}?near=Hatfield&cursor=WyJ4IiwxXQ", status=400)
+
+    def test_room_list_next_page(self):
+        first = self.get(reverse("room_list"))
+        self.assertTrue(first.context["more_url"])
+        self.assertIndexedQueries(lambda: self.get(first.context["more_url"]))
+
+    def test_room_detail(self):
+        self.client.force_login(self.tenant)
+        url = reverse("room_detail", args=[self.rooms[0].pk])
+        self.assertIndexedQueries(lambda: self.get(url))
+
+    def test_services(self):
+        self.assertIndexedQueries(lambda: self.get(reverse("services")))
+
+    def test_dashboard(self):
+        self.client.force_login(self.landlord)
+        self.assertIndexedQueries(lambda: self.get(reverse("dashboard")))
+
+    def test_track_contact(self):
+        self.client.force_login(self.tenant)
+        url = reverse("track_contact", args=[self.rooms[0].pk, "whatsapp"])
+        self.assertIndexedQueries(lambda: self.get(url, status=302))
+
+    def test_add_review(self):
+        self.client.force_login(self.tenant)
+        url = reverse("add_review", args=[self.rooms[0].pk])
+        self.assertIndexedQueries(
+            lambda: self.client.post(url, {"rating": 5, "comment": "Great"})
+        )
+
+    def test_api(self):
+        url = reverse("api_room_list")
+        self.assertIndexedQueries(lambda: self.get(f"{url}?type=single"))
+        detail = reverse("api_room_detail", args=[self.rooms[0].pk])
+        self.assertIndexedQueries(lambda: self.get(detail))
+
+    def test_room_form_duplicate_check(self):
+        room = self.rooms[1]
+        form = RoomForm(
+            {
+                "title": room.title.upper(),
+                "description": "Another listing",
+                "price": room.price,
+                "location": room.location.lower(),
+                "room_type": room.room_type,
+                "contact_phone": "+27 71 000 0000",
+                "is_available": True,
+            },
+            user=self.landlord,
+        )
+        self.assertIndexedQueries(lambda: self.assertFalse(form.is_valid()))
+
+
+class QueryMetricsMiddlewareTests(TestCase):
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("room_list"))
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+    @override_settings(
+        QUERY_BUDGETS={"room_list": {"queries": 0}}, QUERY_BUDGET_STRICT=True
+    )
+    def test_budget_raises_in_strict_mode(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse("room_list"))
+
+    @override_settings(
+        QUERY_BUDGETS={"room_list": {"queries": 0}}, QUERY_BUDGET_STRICT=False
+    )
+    def test_budget_logs_otherwise(self):
+        with self.assertLogs("listings.metrics", "WARNING"):
+            self.client.get(reverse("room_list"))
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TransactionTestCase):
+    """Budgets as deployed: no wrapping transaction, whose savepoints would count."""
+
+    def test_tracking_views_fit_their_budgets(self):
+        # as in production, the views only queue their events
+        self.enterContext(mock.patch.object(ingest.Pipeline, "_ensure_thread"))
+        self.addCleanup(ingest.flush)
+        owner = User.objects.create_user("owner", "o@example.com", "pw")
+        tenant = User.objects.create_user("tenant", "t@example.com", "pw")
+        room = Room.objects.create(
+            owner=owner,
+            title="Backroom",
+            description="Near the station",
+            price=1800,
+            location="Sunnyside",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+        self.client.force_login(tenant)
+        for store in ("MemoryStore", "DatabaseStore"):
+            limits = {**settings.RATE_LIMITS, "BACKEND": f"listings.ratelimit.{store}"}
+            with self.subTest(store=store), self.settings(RATE_LIMITS=limits):
+                response = self.client.get(reverse("room_detail", args=[room.pk]))
+                self.assertEqual(response.status_code, 200)
+                for method in ("whatsapp", "phone"):
+                    response = self.client.get(
+                        reverse("track_contact", args=[room.pk, method])
+                    )
+                    self.assertEqual(response.status_code, 302)
+                response = self.client.post(reverse("mark_success", args=[room.pk]))
+                self.assertEqual(response.status_code, 302)
+        self.assertFalse(RoomStat.objects.exists())
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "o@example.com", "pw")
+
+    def setUp(self):
+        caches["counters"].clear()
+
+    def add_room(self, title="Flatlet"):
+        return Room.objects.create(
+            owner=self.owner,
+            title=title,
+            description="d",
+            price=2400,
+            location="Brooklyn",
+            room_type="flat",
+            contact_phone="+27 71 000 0000",
+        )
+
+    def test_signals_mark_counters_stale(self):
+        self.assertEqual(counters.get("room_count"), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(counters.get("room_count"), 0)
+        room = self.add_room()
+        self.assertEqual(
+            counters.get_many(["room_count", "rooms_available"]),
+            {
+                "room_count": 1,
+                "rooms_available": 1,
+            },
+        )
+        room.is_available = False
+        room.save()
+        self.assertEqual(counters.get("rooms_available"), 0)
+
+    def test_only_the_lock_holder_recomputes(self):
+        counters.get("room_count")
+        self.add_room()
+        # another worker is recomputing: the stale value is served meanwhile
+        cache = caches["counters"]
+        cache.add(counters._lock_key("room_count"), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(counters.get("room_count"), 0)
+        cache.delete(counters._lock_key("room_count"))
+        self.assertEqual(counters.get("room_count"), 1)
+
+    def test_cold_cache_waits_then_computes(self):
+        self.add_room()
+        caches["counters"].add(counters._lock_key("room_count"), 1)
+        with mock.patch.object(counters, "WAIT_LIMIT", 0.1):
+            with self.assertNumQueries(1):
+                self.assertEqual(counters.get("room_count"), 1)
+
+    def test_room_version_is_bumped_without_reading_it_back(self):
+        room = self.add_room()
+        with CaptureQueriesContext(connection) as ctx:
+            room.save()
+        self.assertFalse(
+            [
+                q
+                for q in ctx.captured_queries
+                if q["sql"].startswith("SELECT")
+                and '"listings_room"."version"' in q["sql"]
+            ]
+        )
+        self.assertEqual(room.version, 2)
+        room.save(update_fields=["price"])
+        self.assertEqual(room.version, 3)
+
+    def test_failed_save_keeps_the_version(self):
+        self.add_room("Garden flat")
+        room = self.add_room("Loft")
+        room.title = "Garden flat"
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            room.save()
+        self.assertEqual(room.version, 1)
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        caches["fragments"].clear()
+        self.owner = User.objects.create_user("owner", "o@example.com", "pw")
+        self.tenant = User.objects.create_user("tenant", "t@example.com", "pw")
+        self.room = Room.objects.create(
+            owner=self.owner,
+            title="Cottage",
+            description="Garden",
+            price=2600,
+            location="Melville",
+            room_type="single",
+        )
+
+    def card(self):
+        rooms = Room.objects.filter(pk=self.room.pk).only("id", "version")
+        return str(fragments.render_cards(rooms)[0])
+
+    def test_cached_card_costs_one_cache_lookup(self):
+        self.card()
+        room = Room.objects.only("id", "version").get(pk=self.room.pk)
+        with self.assertNumQueries(0):
+            fragments.render_cards([room])
+
+    def test_version_bump_invalidates_the_card(self):
+        self.assertIn("Cottage", self.card())
+        self.room.title = "Garden cottage"
+        self.room.save()
+        self.assertIn("Garden cottage", self.card())
+
+        Review.objects.create(room=self.room, user=self.tenant, rating=4)
+        self.assertIn("4.0/5", self.card())
+
+        self.assertNotIn("Verified", self.card())
+        self.owner.profile.is_verified = True
+        self.owner.profile.save()
+        self.assertIn("Verified", self.card())
+
+    def test_stale_rows_are_never_cached(self):
+        # the page read a newer version than the row the card was built from,
+        # e.g. from a replica that is further behind
+        room = Room.objects.only("id", "version").get(pk=self.room.pk)
+        room.version += 1
+        self.assertIn("Cottage", str(fragments.render_cards([room])[0]))
+        self.assertIsNone(caches["fragments"].get(fragments.card_key(room)))
+
+        Room.objects.filter(pk=room.pk).update(title="Renamed", version=room.version)
+        self.assertIn("Renamed", self.card())
+
+
+class AggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "o@example.com", "pw")
+        cls.tenant = User.objects.create_user("tenant", "t@example.com", "pw")
+        cls.room = Room.objects.create(
+            owner=cls.owner,
+            title="Cottage",
+            description="Own entrance",
+            price=2900,
+            location="Arcadia",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+
+    def counters(self):
+        agg = RoomAggregate.objects.get(room=self.room)
+        return agg.review_count, agg.rating_total, agg.contact_count
+
+    def test_signal_handlers_keep_counters(self):
+        self.assertEqual(self.counters(), (0, 0, 0))
+        review = Review.objects.create(room=self.room, user=self.tenant, rating=4)
+        Review.objects.create(room=self.room, user=self.owner, rating=2)
+        RoomStat.objects.create(room=self.room, stat_type="contact_email")
+        RoomStat.objects.create(room=self.room, stat_type="view")
+        self.assertEqual(self.counters(), (2, 6, 1))
+        review.rating = 5
+        review.save()
+        self.assertEqual(self.counters(), (2, 7, 1))
+        review.delete()
+        self.assertEqual(self.counters(), (1, 2, 1))
+        self.assertEqual(aggregates.reconcile(dry_run=True), 0)
+
+    def test_reconcile_repairs_drift_in_chunks(self):
+        rooms = [self.room] + [
+            Room.objects.create(
+                owner=self.owner,
+                title=f"Room {i}",
+                description="d",
+                price=2000,
+                location="Arcadia",
+                room_type="single",
+                contact_phone="+27 71 000 0000",
+            )
+            for i in range(4)
+        ]
+        for room in rooms:
+            RoomStat.objects.create(room=room, stat_type="contact_phone")
+        RoomAggregate.objects.filter(room__in=rooms[:2]).update(contact_count=9)
+        RoomAggregate.objects.filter(room=rooms[2]).delete()
+
+        self.assertEqual(aggregates.reconcile(dry_run=True, batch_size=2), 3)
+        self.assertEqual(aggregates.reconcile(batch_size=2), 3)
+        self.assertEqual(
+            list(RoomAggregate.objects.values_list("contact_count", flat=True)),
+            [1] * 5,
+        )
+        self.assertEqual(aggregates.reconcile(), 0)
+
+    @override_settings(ROOMSTAT_RETENTION_DAYS=2)
+    def test_reconcile_counts_pruned_days_from_rollups(self):
+        old = RoomStat.objects.create(room=self.room, stat_type="contact_email")
+        RoomStat.objects.create(room=self.room, stat_type="contact_email")
+        RoomStat.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+        rollups.backfill()
+        self.assertEqual(rollups.prune_raw(), 1)
+
+        RoomAggregate.objects.filter(room=self.room).update(contact_count=0)
+        self.assertEqual(aggregates.reconcile(), 1)
+        self.assertEqual(self.counters(), (0, 0, 2))
+
+
+class IngestTests(TestCase):
+    class Pipeline(ingest.Pipeline):
+        # flushes are driven by the test, not the background thread
+        def _ensure_thread(self):
+            pass
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "o@example.com", "pw")
+        cls.room = Room.objects.create(
+            owner=cls.owner,
+            title="Backroom",
+            description="Near the station",
+            price=1800,
+            location="Sunnyside",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+
+    def event(self, stat_type="view", room_id=None):
+        return {
+            "room_id": room_id or self.room.pk,
+            "user_id": None,
+            "stat_type": stat_type,
+            "created_at": timezone.now().isoformat(),
+        }
+
+    def test_events_wait_for_a_full_batch_and_insert_in_bulk(self):
+        pipeline = self.Pipeline({"BATCH_SIZE": 3, "FLUSH_INTERVAL": 3600})
+        for _ in range(2):
+            pipeline.put(self.event())
+        self.assertFalse(pipeline.wakeup.is_set())
+        self.assertEqual(RoomStat.objects.count(), 0)
+        pipeline.put(self.event())
+        self.assertTrue(pipeline.wakeup.is_set())
+
+        for _ in range(4):
+            pipeline.put(self.event("contact_email"))
+        # a deleted room's events are dropped, not the batch
+        pipeline.put(self.event(room_id=self.room.pk + 1000))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(pipeline.flush(), 7)
+        inserts = [
+            q
+            for q in ctx.captured_queries
+            if q["sql"].startswith('INSERT INTO "listings_roomstat" ')
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(RoomStat.objects.count(), 7)
+        self.assertEqual(pipeline.flush(), 0)
+
+    def test_file_spool_survives_a_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "spool.jsonl")
+            first = ingest.FileBackend(path)
+            for stat_type in ["view", "view", "success", "contact_phone"]:
+                first.put(self.event(stat_type))
+
+            # a new process picks up where the old one stopped
+            second = ingest.FileBackend(path)
+            self.assertEqual(len(second.drain(3)), 3)
+            self.assertTrue(os.path.exists(path + ".draining"))
+            second.put(self.event("contact_email"))
+            third = ingest.FileBackend(path)
+            self.assertEqual(
+                [e["stat_type"] for e in third.drain(3)], ["contact_phone"]
+            )
+            self.assertEqual(
+                [e["stat_type"] for e in third.drain(3)], ["contact_email"]
+            )
+            self.assertEqual(third.drain(3), [])
+            self.assertFalse(os.path.exists(path + ".draining"))
+
+    @inline_stats
+    def test_failing_receiver_keeps_the_raw_rows(self):
+        def broken(sender, stats, **kwargs):
+            raise RuntimeError("bug in a derived counter")
+
+        signals.stats_recorded.connect(broken)
+        self.addCleanup(signals.stats_recorded.disconnect, broken)
+        with self.assertLogs("listings.signals", "ERROR"):
+            ingest.record(self.room, "view")
+        self.assertEqual(RoomStat.objects.count(), 1)
+        # nothing derived from the batch was half-applied
+        self.assertFalse(RoomStatRollup.objects.exists())
+
+    def test_failed_write_keeps_the_batch(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for backend, options in (
+                ("listings.ingest.MemoryBackend", {}),
+                ("listings.ingest.FileBackend", {"path": os.path.join(tmp, "s")}),
+            ):
+                with self.subTest(backend=backend):
+                    RoomStat.objects.all().delete()
+                    pipeline = self.Pipeline(
+                        {"BACKEND": backend, "OPTIONS": options, "BATCH_SIZE": 2}
+                    )
+                    for stat_type in ("view", "view", "success"):
+                        pipeline.put(self.event(stat_type))
+                    with mock.patch.object(
+                        ingest, "_write", side_effect=OperationalError("locked")
+                    ), self.assertRaises(OperationalError):
+                        pipeline.flush()
+                    self.assertEqual(len(pipeline.backend), 3)
+                    self.assertFalse(RoomStat.objects.exists())
+                    self.assertEqual(pipeline.flush(), 3)
+                    self.assertEqual(pipeline.flush(), 0)
+
+    def test_failed_write_leaves_the_spool_for_another_process(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "spool.jsonl")
+            config = {"BACKEND": "listings.ingest.FileBackend", "BATCH_SIZE": 2}
+            first = self.Pipeline({**config, "OPTIONS": {"path": path}})
+            for stat_type in ("view", "success", "contact_email"):
+                first.put(self.event(stat_type))
+            # the second batch fails after the first was written
+            with mock.patch.object(
+                ingest, "_write", side_effect=[None, OperationalError("locked")]
+            ), self.assertRaises(OperationalError):
+                first.flush()
+            second = self.Pipeline({**config, "OPTIONS": {"path": path}})
+            self.assertEqual(second.flush(), 1)
+            self.assertEqual(
+                list(RoomStat.objects.values_list("stat_type", flat=True)),
+                ["contact_email"],
+            )
+
+
+class IngestDeletedUserTests(TransactionTestCase):
+    """SQLite checks foreign keys at commit, which TestCase never reaches."""
+
+    def test_events_of_a_deleted_user_are_kept_anonymously(self):
+        owner = User.objects.create_user("owner", "o@example.com", "pw")
+        tenant = User.objects.create_user("tenant", "t@example.com", "pw")
+        room = Room.objects.create(
+            owner=owner,
+            title="Backroom",
+            description="Near the station",
+            price=1800,
+            location="Sunnyside",
+            room_type="single",
+        )
+        pipeline = IngestTests.Pipeline({"BATCH_SIZE": 10})
+        for user_id in (owner.pk, tenant.pk):
+            pipeline.put(
+                {
+                    "room_id": room.pk,
+                    "user_id": user_id,
+                    "stat_type": "view",
+                    "created_at": timezone.now().isoformat(),
+                }
+            )
+        tenant.delete()
+        self.assertEqual(pipeline.flush(), 2)
+        self.assertEqual(
+            sorted(RoomStat.objects.values_list("user_id", flat=True), key=str),
+            sorted([owner.pk, None], key=str),
+        )
+
+
+class RollupTests(TestCase):
+    def test_batches_upsert_one_statement_per_table(self):
+        owner = User.objects.create_user("owner", "o@example.com", "pw")
+        rooms = [
+            Room.objects.create(
+                owner=owner,
+                title=f"Room {i}",
+                description="Near campus",
+                price=2500,
+                location="Hatfield",
+                room_type="single",
+                contact_phone="+27 71 000 0000",
+            )
+            for i in range(3)
+        ]
+        now = timezone.now()
+        stats = RoomStat.objects.bulk_create(
+            RoomStat(room=room, stat_type=stat_type, created_at=when)
+            for room in rooms
+            for stat_type in ("view", "contact_email")
+            for when in (now, now - timedelta(hours=1))
+        )
+        # the rooms are already loaded on stat.room
+        with self.assertNumQueries(4):
+            rollups.apply(stats)
+        # a second batch adds to the existing rows, loading its rooms first
+        fetched = list(RoomStat.objects.filter(pk__in=[s.pk for s in stats[:2]]))
+        with self.assertNumQueries(5):
+            rollups.apply(fetched)
+
+        total = RoomStatRollup.objects.get(
+            room=rooms[0], stat_type="view", granularity=StatRollup.TOTAL
+        )
+        self.assertEqual(total.count, 4)
+        # one site-wide row per stat type, however many locations there are
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(rollups.totals(), {"view": 8, "contact_email": 6})
+        self.assertNotIn("location", ctx.captured_queries[0]["sql"])
+        hours = OwnerStatRollup.objects.filter(
+            owner=owner, stat_type="view", granularity=StatRollup.HOUR
+        )
+        self.assertEqual(sorted(hours.values_list("count", flat=True)), [4, 4])
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.landlord = User.objects.create_user("landlord", "l@example.com", "pw")
+        self.landlord.profile.role = "landlord"
+        self.landlord.profile.save()
+        self.client.force_login(self.landlord)
+
+    def add_room(self, events):
+        room = Room.objects.create(
+            owner=self.landlord,
+            # distinct rooms: an owner can't list the same one twice
+            title=f"Room {Room.objects.count() + 1}",
+            description="Near campus",
+            price=2500,
+            location="Hatfield",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+        for stat_type in events:
+            RoomStat.objects.create(room=room, stat_type=stat_type)
+        return room
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("dashboard"))
+        return response, len(ctx.captured_queries)
+
+    def test_per_owner_and_per_room_counts_in_constant_queries(self):
+        self.add_room(["view", "view", "contact_whatsapp", "success"])
+        _, one_room = self.dashboard_queries()
+        for _ in range(4):
+            self.add_room(["view", "contact_phone", "contact_whatsapp"])
+        response, five_rooms = self.dashboard_queries()
+
+        self.assertEqual(one_room, five_rooms)
+        totals = response.context["totals"]
+        self.assertEqual(totals["views"], 6)
+        self.assertEqual(
+            [channel["count"] for channel in totals["channels"]], [4, 5, 0]
+        )
+        self.assertEqual(totals["conversion"], 11)
+        self.assertEqual(response.context["trend"][-1]["views"], 6)
+        first = response.context["rooms"][-1]
+        self.assertEqual((first.stats["views"], first.stats["conversion"]), (2, 100))
+
+
+class DuplicateTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", "o@example.com", "pw")
+        self.room = self.add_room(self.owner, "Garden room", "Quiet room near campus")
+
+    def add_room(self, owner, title, description):
+        return Room.objects.create(
+            owner=owner,
+            title=title,
+            description=description,
+            price=2500,
+            location="Hatfield, Pretoria",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+
+    def form(self, title, location, instance=None):
+        return RoomForm(
+            {
+                "title": title,
+                "description": "Another listing",
+                "price": "2500.00",
+                "location": location,
+                "room_type": "single",
+                "contact_phone": "+27 71 000 0000",
+                "is_available": True,
+            },
+            instance=instance,
+            user=self.owner,
+        )
+
+    def test_fingerprint_ignores_case_spacing_and_punctuation(self):
+        self.assertFalse(self.form("GARDEN  room!", "hatfield pretoria").is_valid())
+        self.assertTrue(self.form("Garden room", "Hatfield", self.room).is_valid())
+        self.assertTrue(self.form("Garden room 2", "Hatfield, Pretoria").is_valid())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.add_room(self.owner, "garden room.", "Copy")
+
+    def test_admin_rejects_a_repost_instead_of_failing(self):
+        admin = User.objects.create_superuser("admin", "a@example.com", "pw")
+        self.client.force_login(admin)
+        response = self.client.post(
+            reverse("admin:listings_room_add"),
+            {
+                "title": "GARDEN ROOM",
+                "owner": self.owner.pk,
+                "description": "Copy",
+                "price": "2500",
+                "location": "Hatfield, Pretoria",
+                "room_type": "single",
+                "contact_phone": "+27 71 000 0000",
+                "is_available": "on",
+                "images-TOTAL_FORMS": "0",
+                "images-INITIAL_FORMS": "0",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "You already posted a listing")
+        self.assertEqual(Room.objects.count(), 1)
+
+    def test_near_duplicate_descriptions_are_grouped_across_owners(self):
+        text = (
+            "Spacious sunny room with a private bathroom, fibre wifi, secure "
+            "parking and a shared kitchen, five minutes from the campus gate"
+        )
+        other = User.objects.create_user("other", "x@example.com", "pw")
+        repost = self.add_room(other, "Sunny room", text.replace("gate", "entrance"))
+        original = self.add_room(self.owner, "Sunny room", text)
+        self.add_room(other, "Flat", "Two bedroom flat with a garden and a garage")
+
+        out = StringIO()
+        call_command("find_duplicate_rooms", "--cross-owner", stdout=out)
+        self.assertIn(f"{repost.pk} (other), {original.pk} (owner)", out.getvalue())
+        self.assertIn("1 groups, 2 rooms", out.getvalue())
+
+
+@inline_stats
+class RecommendationTests(TestCase):
+    def setUp(self):
+        caches["fragments"].clear()
+        self.owner = User.objects.create_user("owner", "o@example.com", "pw")
+        self.tenant = User.objects.create_user("tenant", "t@example.com", "pw")
+
+    def add_room(self, title, location, price=2500, room_type="single"):
+        return Room.objects.create(
+            owner=self.owner,
+            title=title,
+            description=f"{title} with wifi and parking",
+            price=price,
+            location=location,
+            room_type=room_type,
+            contact_phone="+27 71 000 0000",
+        )
+
+    def test_similar_rooms_from_content_and_coviews(self):
+        room = self.add_room("Garden cottage", "Hatfield")
+        alike = self.add_room("Garden cottage near campus", "Hatfield", 2600)
+        unlike = self.add_room("Penthouse flat", "Hatfield", 9000, "flat")
+        elsewhere = self.add_room("Loft", "Soweto")
+        for viewed in (room, elsewhere):
+            RoomStat.objects.create(room=viewed, user=self.tenant, stat_type="view")
+
+        self.assertEqual(recommend.build(), 4)
+        similar = [r.pk for r in recommend.similar_rooms(room.pk)]
+        # co-viewed rooms rank high even from another area
+        self.assertEqual(similar, [elsewhere.pk, alike.pk, unlike.pk])
+
+        response = self.client.get(reverse("room_detail", args=[room.pk]))
+        self.assertContains(response, "Similar rooms")
+        self.assertContains(response, "Garden cottage near campus")
+        with self.assertNumQueries(1):
+            recommend.similar_rooms(room.pk)
+
+        # only the new room's area is rebuilt
+        self.add_room("Cellar", "Soweto")
+        self.assertEqual(recommend.build(), 2)
+
+
+@inline_stats
+class UniqueViewerTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", "o@example.com", "pw")
+        self.owner.profile.role = "landlord"
+        self.owner.profile.save()
+        self.room = Room.objects.create(
+            owner=self.owner,
+            title="Garden cottage",
+            description="Quiet",
+            price=2500,
+            location="Hatfield",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+
+    def test_hyperloglog_estimates_and_merges(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        a.update(range(20000))
+        b.update(range(10000, 30000))
+        self.assertAlmostEqual(a.count() / 20000, 1, delta=0.1)
+        restored = HyperLogLog.from_bytes(a.to_bytes())
+        self.assertAlmostEqual(restored.merge(b).count() / 30000, 1, delta=0.1)
+        small = HyperLogLog()
+        small.update(["x", "y", "z", "x"])
+        self.assertEqual(small.count(), 3)
+
+    @override_settings(VIEW_DEDUPE={"SECONDS": 60})
+    def test_repeat_views_are_counted_once(self):
+        url = reverse("room_detail", args=[self.room.pk])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(RoomStat.objects.filter(stat_type="view").count(), 1)
+
+        # a different visitor still counts
+        self.client.get(url, HTTP_USER_AGENT="another browser")
+        self.assertEqual(RoomStat.objects.filter(stat_type="view").count(), 2)
+        today = timezone.now().date()
+        self.assertEqual(uniques.unique_viewers(self.room.pk, today), 2)
+
+    def test_dashboard_shows_unique_viewers(self):
+        url = reverse("room_detail", args=[self.room.pk])
+        for n in range(3):
+            self.client.get(url, HTTP_USER_AGENT=f"browser {n}")
+        # without deduplication repeats are views, not viewers
+        self.client.get(url, HTTP_USER_AGENT="browser 0")
+
+        self.client.login(username="owner", password="pw")
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.context["totals"]["views"], 4)
+        self.assertEqual(response.context["unique_viewers"], 3)
+        self.assertEqual(response.context["rooms"][0].stats["unique_viewers"], 3)
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.landlord = User.objects.create_user("landlord", "l@example.com", "pw")
+        self.landlord.profile.role = "landlord"
+        self.landlord.profile.save()
+        self.client.force_login(self.landlord)
+        Room.objects.create(
+            owner=self.landlord,
+            title="Garden room",
+            description="Quiet",
+            price=2500,
+            location="Hatfield",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+
+    def upload(self, name, content):
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post(reverse("import_rooms"), {"file": upload})
+
+    def test_csv_import_skips_duplicates_and_invalid_rows(self):
+        rows = [
+            "title,description,price,location,room_type,contact_phone,is_available",
+            # same as the existing room, ignoring case
+            "garden ROOM,Quiet,2500.00,hatfield,single,+27 71 000 0000,true",
+            "Loft,Top floor,3100,Sunnyside,flat,+27 71 000 0001,false",
+            "Loft,Top floor,3100,Sunnyside,flat,+27 71 000 0001,false",
+            "Cellar,Cool,cheap,Soweto,single,+27 71 000 0002,",
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.upload("rooms.csv", "\n".join(rows))
+        result = response.context["result"]
+        self.assertEqual((result.created, result.duplicates), (1, 2))
+        self.assertEqual(result.errors, [(5, "price: Enter a number.")])
+        # one duplicate check for the whole chunk
+        checks = [q for q in ctx.captured_queries if 'fingerprint" IN' in q["sql"]]
+        self.assertEqual(len(checks), 1)
+
+        loft = Room.objects.get(title="Loft")
+        self.assertFalse(loft.is_available)
+        self.assertEqual(loft.place, "Sunnyside")
+        self.assertTrue(RoomAggregate.objects.filter(room=loft).exists())
+        self.assertEqual(list(search.filter_rooms(Room.objects.all(), "loft")), [loft])
+
+    def test_room_saved_during_the_import_is_a_duplicate(self):
+        rows = [
+            "title,description,price,location,room_type,contact_phone",
+            "Loft,Top floor,3100,Sunnyside,flat,+27 71 000 0001",
+            "Garden room,Quiet,2500,Hatfield,single,+27 71 000 0000",
+        ]
+        garden = Room.objects.get(title="Garden room").fingerprint
+        # the garden room is saved elsewhere after the chunk was checked
+        with mock.patch.object(bulk, "_existing", side_effect=[set(), {garden}]):
+            result = bulk.import_rooms(
+                self.landlord, bulk.read_rows(BytesIO("\n".join(rows).encode()), "csv")
+            )
+        self.assertEqual((result.created, result.duplicates), (1, 1))
+        self.assertEqual(result.errors, [])
+        self.assertEqual(Room.objects.filter(title="Loft").count(), 1)
+        self.assertTrue(RoomAggregate.objects.filter(room__title="Loft").exists())
+
+    def test_export_round_trips_through_jsonl_import(self):
+        response = self.client.get(reverse("export_rooms"), {"format": "jsonl"})
+        self.assertTrue(response.streaming)
+        exported = b"".join(response.streaming_content).decode()
+        self.assertEqual(json.loads(exported)["title"], "Garden room")
+
+        other = User.objects.create_user("other", "x@example.com", "pw")
+        result = bulk.import_rooms(
+            other, bulk.read_rows(BytesIO(exported.encode()), "jsonl")
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual(other.rooms.get().location, "Hatfield")
+
+
+class AreaDemandTests(TestCase):
+    def setUp(self):
+        caches["counters"].clear()
+        self.owner = User.objects.create_user("owner", "o@example.com", "pw")
+
+    def add_room(self, location):
+        return Room.objects.create(
+            owner=self.owner,
+            # distinct rooms: an owner can't list the same one twice
+            title=f"Room {Room.objects.count() + 1}",
+            description="Near campus",
+            price=2500,
+            location=location,
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+
+    def test_aliases_share_one_decayed_place(self):
+        spellings = ["Pretoria", "pretoria ", "Pretoria CBD", "Tshwane", "PTA"]
+        rooms = [self.add_room(location) for location in spellings[:4]]
+        self.assertEqual({room.place for room in rooms}, {"Pretoria"})
+        self.assertEqual(self.add_room(spellings[4]).place, "Pretoria")
+        for room in rooms:
+            RoomStat.objects.create(room=room, stat_type="view")
+        # two views one half-life ago count as one view now
+        hatfield = self.add_room("Hatfield, Pretoria")
+        then = timezone.now() - timedelta(hours=72)
+        for _ in range(2):
+            RoomStat.objects.create(room=hatfield, stat_type="view", created_at=then)
+
+        response = self.client.get(reverse("heatmap"))
+        rows = response.context["heatmap"]
+        self.assertEqual(
+            [(row["city"], row["count"]) for row in rows],
+            [("Pretoria", 4), ("Hatfield", 2)],
+        )
+        self.assertAlmostEqual(rows[0]["demand"], 4, places=0)
+        self.assertAlmostEqual(rows[1]["demand"], 1, places=0)
+        self.assertContains(response, "Pretoria (4)")
+        with self.assertNumQueries(0):
+            self.client.get(reverse("heatmap"))
+
+    def test_places_and_aliases_are_data(self):
+        self.addCleanup(geo.forget_places)
+        self.assertEqual(self.add_room("Near Tuks").place, "")
+        hatfield = Place.objects.get(name="Hatfield")
+        PlaceAlias.objects.create(place=hatfield, alias="Tuks")
+        room = self.add_room("Near Tuks")
+        self.assertEqual(room.place, "Hatfield")
+        self.assertEqual(
+            (room.latitude, room.longitude), (hatfield.latitude, hatfield.longitude)
+        )
+        # an alias never takes over another place's own name
+        PlaceAlias.objects.create(place=hatfield, alias="Sunnyside Gardens")
+        Place.objects.create(name="Sunnyside Gardens", latitude=-25.75, longitude=28.2)
+        self.assertEqual(self.add_room("Sunnyside Gardens").place, "Sunnyside Gardens")
+        # loaded once, not per save
+        with self.assertNumQueries(0):
+            geo.resolve("Hatfield")
+
+    @override_settings(AREA_DEMAND_HALF_LIFE_HOURS=6)
+    def test_short_half_life_and_distant_dates_stay_finite(self):
+        room = self.add_room("Hatfield")
+        now = timezone.now()
+        # decades apart and out of order within the batch
+        for when in (now + timedelta(days=20000), now, now + timedelta(days=10)):
+            RoomStat.objects.create(room=room, stat_type="view", created_at=when)
+        demand = AreaDemand.objects.get(place="Hatfield")
+        self.assertEqual(demand.views, 3)
+        self.assertAlmostEqual(demand.score, 1)
+        self.assertAlmostEqual(areas.current(demand.score, demand.last_view_at, now), 1)
+        self.assertEqual(areas.heatmap()[0]["city"], "Hatfield")
+
+    def test_a_place_added_concurrently_is_merged_not_duplicated(self):
+        now = timezone.now()
+        bulk_create = AreaDemand.objects.bulk_create
+
+        def racing(rows, **kwargs):
+            # another worker inserts the same place after our read
+            bulk_create(
+                [AreaDemand(place="Hatfield", score=2, views=2, last_view_at=now)]
+            )
+            return bulk_create(rows, **kwargs)
+
+        totals = {}
+        areas.accumulate(totals, "Hatfield", now)
+        with mock.patch.object(AreaDemand.objects, "bulk_create", racing):
+            areas.add_demand(totals)
+        demand = AreaDemand.objects.get(place="Hatfield")
+        self.assertEqual((demand.views, demand.score), (3, 3))
+
+    def test_half_life_is_validated(self):
+        for value in (0, -6, "72"):
+            with override_settings(AREA_DEMAND_HALF_LIFE_HOURS=value):
+                with self.assertRaises(ImproperlyConfigured):
+                    areas.half_life()
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "o@example.com", "pw")
+        cls.room = Room.objects.create(
+            owner=cls.owner,
+            title="Loft",
+            description="Top floor",
+            price=2600,
+            location="Hatfield",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+
+    def test_reads_follow_writes_to_the_primary(self):
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Room))
+            if request.method == "POST":
+                Contact.objects.create(room=self.room, user=self.owner)
+                seen.append(router.db_for_read(Room))
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+        factory = RequestFactory()
+        self.assertNotIn(PIN_COOKIE, middleware(factory.get("/")).cookies)
+        response = middleware(factory.post("/"))
+        self.assertEqual(seen, ["replica", "replica", "default"])
+
+        # the writer's next request stays on the primary, others don't
+        pinned = factory.get("/")
+        pinned.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        middleware(pinned)
+        middleware(factory.get("/"))
+        self.assertEqual(seen[3:], ["default", "replica"])
+
+    @override_settings(RATE_LIMITS={"BACKEND": "listings.ratelimit.DatabaseStore"})
+    def test_rate_limit_counters_dont_pin(self):
+        def view(request):
+            ratelimit.get_store().hit("room_view:ip:10.0.0.1", 5, 60)
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(RequestFactory().get("/"))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(RateLimitWindow.objects.count(), 1)
+
+
+@inline_stats
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "o@example.com", "pw")
+        cls.tenant = User.objects.create_user("tenant", "t@example.com", "pw")
+        cls.room = Room.objects.create(
+            owner=cls.owner,
+            title="Garden flat",
+            description="Quiet",
+            price=3100,
+            location="Brooklyn, Pretoria",
+            room_type="flat",
+            contact_phone="+27 71 000 0000",
+        )
+
+    def test_sparse_fields(self):
+        response = self.client.get(
+            reverse("api_room_list"), {"fields": "id,title,place"}
+        )
+        self.assertEqual(
+            response.json()["results"],
+            [{"id": self.room.pk, "title": "Garden flat", "place": "Brooklyn"}],
+        )
+        response = self.client.get(reverse("api_room_list"), {"fields": "owner"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag_changes_with_room_version(self):
+        for url in (
+            reverse("api_room_list"),
+            reverse("api_room_detail", args=[self.room.pk]),
+        ):
+            etag = self.client.get(url)["ETag"]
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+            Review.objects.create(room=self.room, user=self.tenant, rating=5)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+            Review.objects.all().delete()
+
+    def test_unavailable_rooms_are_hidden(self):
+        Room.objects.filter(pk=self.room.pk).update(is_available=False)
+        self.assertEqual(
+            self.client.get(reverse("api_room_list")).json()["results"], []
+        )
+        response = self.client.get(reverse("api_room_detail", args=[self.room.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(
+            override_settings(
+                MEDIA_ROOT=tmp.name,
+                IMAGE_PIPELINE={**settings.IMAGE_PIPELINE, "EAGER": True},
+            )
+        )
+        self.owner = User.objects.create_user("owner", "o@example.com", "pw")
+        self.room = Room.objects.create(
+            owner=self.owner,
+            title="Attic",
+            description="Skylight",
+            price=2100,
+            location="Observatory",
+            room_type="single",
+        )
+        self.client.force_login(self.owner)
+        self.url = reverse("upload_room_images", args=[self.room.pk])
+
+    def photo(self, size=(3000, 1500), orientation=None, fmt="JPEG"):
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        # GPS position, which mustn't end up in the variants
+        exif[0x8825] = {1: "S", 2: (33.0, 55.0, 0.0)}
+        buf = BytesIO()
+        Image.new("RGB", size, "teal").save(buf, fmt, exif=exif)
+        return buf.getvalue()
+
+    def upload(self, name, data, content_type="image/jpeg"):
+        return self.client.post(
+            self.url, {"images": SimpleUploadedFile(name, data, content_type)}
+        )
+
+    def test_variants_are_generated(self):
+        # orientation 6: stored sideways, displayed rotated a quarter turn
+        response = self.upload("attic.jpg", self.photo(orientation=6))
+        self.assertEqual(response.status_code, 302)
+        image = RoomImage.objects.get(room=self.room)
+        self.assertIsNotNone(image.processed_at)
+        self.assertEqual((image.width, image.height), (1500, 3000))
+        # the original, served until the variants exist, is upright and bare
+        with image.image.open("rb") as f, Image.open(f) as original:
+            self.assertEqual(original.size, (1500, 3000))
+            self.assertFalse(original.getexif())
+        self.assertEqual(set(image.variants), set(images.VARIANTS))
+        for name, edge in images.VARIANTS.items():
+            formats = image.variants[name]
+            self.assertEqual((formats["width"], formats["height"]), (edge // 2, edge))
+            for ext, (fmt, _) in images.FORMATS.items():
+                with image.image.storage.open(formats[ext]) as f, Image.open(f) as out:
+                    self.assertEqual(out.format, fmt)
+                    self.assertEqual(out.size, (edge // 2, edge))
+                    self.assertFalse(out.getexif())
+        jpeg, webp, width, height = image.variant("card")
+        self.assertTrue(webp.endswith(".webp"))
+        self.assertEqual((width, height), (240, 480))
+
+    def test_clean_uploads_are_stored_as_sent(self):
+        buf = BytesIO()
+        Image.new("RGB", (40, 30), "teal").save(buf, "PNG")
+        self.upload("plan.png", buf.getvalue(), "image/png")
+        image = RoomImage.objects.get(room=self.room)
+        with image.image.open("rb") as f:
+            self.assertEqual(f.read(), buf.getvalue())
+
+    def test_corrupt_upload_is_rejected(self):
+        truncated = self.photo()[:200]
+        for name, data in (("broken.jpg", b"not an image"), ("cut.jpg", truncated)):
+            response = self.upload(name, data)
+            self.assertEqual(response.status_code, 302)
+        self.assertFalse(RoomImage.objects.exists())
+
+    def test_unsupported_format_is_rejected(self):
+        svg = b'<svg xmlns="http://www.w3.org/2000/svg" width="1" height="1"/>'
+        self.upload("plan.svg", svg, "image/svg+xml")
+        # a real image behind an extension Pillow doesn't write
+        self.upload("attic.txt", self.photo(), "text/plain")
+        self.assertFalse(RoomImage.objects.exists())
+
+    def test_unreadable_original_is_served_as_is(self):
+        image = RoomImage.objects.create(
+            room=self.room, image=SimpleUploadedFile("odd.jpg", b"\xff\xd8 junk")
+        )
+        with self.assertLogs("listings.images", "WARNING"):
+            self.assertIsNone(images.process_image(image.pk))
+        out, err = StringIO(), StringIO()
+        with self.assertLogs("listings.images", "WARNING"):
+            call_command("process_images", stdout=out, stderr=err)
+        self.assertIn("Processed 0 images (1 failed)", out.getvalue())
+        self.assertIn(f"Image {image.pk}: not processed", err.getvalue())
+        image.refresh_from_db()
+        self.assertEqual(image.variants, {})
+        self.assertIsNone(image.processed_at)
+        self.assertEqual(image.variant("card")[0], image.image.url)
+
+
+class MediaTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        os.makedirs(os.path.join(tmp.name, "rooms"))
+        self.body = bytes(range(256)) * 4
+        with open(os.path.join(tmp.name, "rooms", "a.0123456789ab.jpg"), "wb") as f:
+            f.write(self.body)
+        self.enterContext(override_settings(MEDIA_ROOT=tmp.name, MEDIA_ACCEL=""))
+        self.url = reverse("media", args=["rooms/a.0123456789ab.jpg"])
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        if response.streaming:
+            return response, b"".join(response.streaming_content)
+        return response, response.content
+
+    def test_etag_and_not_modified(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.body)
+        self.assertEqual(response["ETag"], '"0123456789ab"')
+        self.assertIn("immutable", response["Cache-Control"])
+        response = self.client.get(
+            self.url, headers={"If-None-Match": '"0123456789ab"'}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_single_range(self):
+        response, body = self.get(Range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.body[10:20])
+        self.assertEqual(response["Content-Range"], "bytes 10-19/1024")
+        response, body = self.get(Range="bytes=-24")
+        self.assertEqual(body, self.body[-24:])
+
+    def test_if_range(self):
+        response, body = self.get(Range="bytes=0-9", **{"If-Range": '"0123456789ab"'})
+        self.assertEqual(response.status_code, 206)
+        # a stale validator gets the whole current file
+        response, body = self.get(Range="bytes=0-9", **{"If-Range": '"stale"'})
+        self.assertEqual((response.status_code, body), (200, self.body))
+
+    def test_unsatisfiable_range(self):
+        for header in ("bytes=1024-", "bytes=-0"):
+            response, _ = self.get(Range=header)
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response["Content-Range"], "bytes */1024")
+
+    def test_unusable_range_is_ignored(self):
+        for header in ("bytes=0-1,5-9", "bytes=9-2", "items=0-1", "bytes=x-"):
+            response, body = self.get(Range=header)
+            self.assertEqual((response.status_code, body), (200, self.body))
+
+
+@inline_stats
+class AsyncViewTests(TestCase):
+    """The tracking views are async; drive them through the ASGI handler."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "o@example.com", "pw")
+        cls.tenant = User.objects.create_user("tenant", "t@example.com", "pw")
+        cls.room = Room.objects.create(
+            owner=cls.owner,
+            title="Backroom",
+            description="Near the station",
+            price=1800,
+            location="Sunnyside",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+
+    async def test_track_contact(self):
+        await self.async_client.aforce_login(self.tenant)
+        url = reverse("track_contact", args=[self.room.pk, "whatsapp"])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], "https://wa.me/27710000000")
+        self.assertRegex(response["Server-Timing"], r'desc="[1-9]\d* queries"')
+        self.assertTrue(
+            await Contact.objects.filter(room=self.room, user=self.tenant).aexists()
+        )
+        self.assertEqual(
+            await RoomStat.objects.filter(stat_type="contact_whatsapp").acount(), 1
+        )
+
+    async def test_room_detail_and_mark_success(self):
+        await self.async_client.aforce_login(self.tenant)
+        response = await self.async_client.get(
+            reverse("room_detail", args=[self.room.pk])
+        )
+        self.assertContains(response, "Backroom")
+        response = await self.async_client.post(
+            reverse("mark_success", args=[self.room.pk])
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(await RoomStat.objects.acount(), 2)
+
+    async def test_contact_methods(self):
+        await self.async_client.aforce_login(self.tenant)
+        expected = {
+            "phone": "tel:+27710000000",
+            "email": "mailto:o@example.com?subject=RentARoom%20enquiry%3A%20Backroom",
+        }
+        for method, location in expected.items():
+            response = await self.async_client.get(
+                reverse("track_contact", args=[self.room.pk, method])
+            )
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response["Location"].startswith(location))
+        # one Contact however many times the tenant gets in touch
+        self.assertEqual(await Contact.objects.filter(room=self.room).acount(), 1)
+        self.assertEqual(
+            await RoomStat.objects.filter(stat_type__startswith="contact").acount(), 2
+        )
+
+    async def test_anonymous_users_log_in_first(self):
+        for url in (
+            reverse("track_contact", args=[self.room.pk, "phone"]),
+            reverse("mark_success", args=[self.room.pk]),
+        ):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response["Location"].startswith(settings.LOGIN_URL))
+        self.assertFalse(await RoomStat.objects.aexists())
+
+    async def test_unavailable_room_is_not_found(self):
+        await Room.objects.filter(pk=self.room.pk).aupdate(is_available=False)
+        await self.async_client.aforce_login(self.tenant)
+        for url in (
+            reverse("room_detail", args=[self.room.pk]),
+            reverse("track_contact", args=[self.room.pk, "phone"]),
+        ):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 404)
+        response = await self.async_client.post(reverse("mark_success", args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(await RoomStat.objects.aexists())
+
+    async def test_concurrent_room_views(self):
+        url = reverse("room_detail", args=[self.room.pk])
+        responses = await asyncio.gather(
+            *(self.async_client.get(url) for _ in range(5))
+        )
+        self.assertEqual([r.status_code for r in responses], [200] * 5)
+        self.assertEqual(await RoomStat.objects.filter(stat_type="view").acount(), 5)
+
+
+@inline_stats
+class RateLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "o@example.com", "pw")
+        cls.tenant = User.objects.create_user("tenant", "t@example.com", "pw")
+        cls.room = Room.objects.create(
+            owner=cls.owner,
+            title="Backroom",
+            description="Near the station",
+            price=1800,
+            location="Sunnyside",
+            room_type="single",
+            contact_phone="+27 71 000 0000",
+        )
+
+    def test_stores(self):
+        self.assertEqual(ratelimit.parse_rate("5/10m"), (5, 600))
+        with self.assertRaises(ValueError):
+            ratelimit.parse_rate("5 per minute")
+        for store in (
+            ratelimit.MemoryStore(),
+            ratelimit.CacheStore(),
+            ratelimit.DatabaseStore(),
+        ):
+            with self.subTest(store=type(store).__name__):
+                caches["default"].clear()
+                self.assertEqual(store.hit("k", 2, 60), 0)
+                self.assertEqual(store.hit("k", 2, 60), 0)
+                wait = store.hit("k", 2, 60)
+                self.assertTrue(0 < wait <= 60)
+                self.assertEqual(store.hit("other", 2, 60), 0)
+        self.assertEqual(RateLimitWindow.objects.count(), 2)
+
+    def test_client_ip_behind_proxies(self):
+        request = RequestFactory().get(
+            "/",
+            REMOTE_ADDR="10.0.0.2",
+            HTTP_X_FORWARDED_FOR="6.6.6.6, 203.0.113.7, 10.0.0.1",
+        )
+        self.assertEqual(ratelimit.client_ip(request), "10.0.0.2")
+        with self.settings(TRUSTED_PROXIES=2):
+            # the entry before the proxies' own; 6.6.6.6 came from the client
+            self.assertEqual(ratelimit.client_ip(request), "203.0.113.7")
+        with self.settings(TRUSTED_PROXIES=5):
+            self.assertEqual(ratelimit.client_ip(request), "6.6.6.6")
+
+    @override_settings(
+        RATE_LIMITS={"RATES": {"track_contact": "2/m", "room_view": "1/m"}}
+    )
+    async def test_views_answer_429(self):
+        await self.async_client.aforce_login(self.tenant)
+        url = reverse("track_contact", args=[self.room.pk, "whatsapp"])
+        for _ in range(2):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 302)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response["Retry-After"]) <= 60)
+        self.assertEqual(
+            await RoomStat.objects.filter(stat_type="contact_whatsapp").acount(), 2
+        )
+
+        # room pages still render, the extra views just aren't counted
+        detail = reverse("room_detail", args=[self.room.pk])
+        for _ in range(2):
+            response = await self.async_client.get(detail)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(await RoomStat.objects.filter(stat_type="view").acount(), 1)
+
+    @override_settings(
+        CACHES={
+            **settings.CACHES,
+            "ratelimit": {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                "LOCATION": "test_ratelimit_cache",
+            },
+        },
+        RATE_LIMITS={
+            "BACKEND": "listings.ratelimit.CacheStore",
+            "OPTIONS": {"alias": "ratelimit"},
+            "RATES": {
+                "track_contact": "1/m",
+                "mark_success": "1/m",
+                "room_view": "1/m",
+            },
+        },
+    )
+    async def test_async_views_with_a_database_cache(self):
+        # the database cache can't be used from the event loop itself
+        await sync_to_async(call_command)("createcachetable", "test_ratelimit_cache")
+        await self.async_client.aforce_login(self.tenant)
+        for url in (
+            reverse("track_contact", args=[self.room.pk, "whatsapp"]),
+            reverse("mark_success", args=[self.room.pk]),
+        ):
+            statuses = [(await self.async_client.get(url)).status_code for _ in "ab"]
+            self.assertEqual(statuses, [302, 429])
+        detail = reverse("room_detail", args=[self.room.pk])
+        for _ in "ab":
+            response = await self.async_client.get(detail)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(await RoomStat.objects.filter(stat_type="view").acount(), 1)
+
+
+@override_settings(SQLITE_WRITE_QUEUE=True)
+class WriteQueueTests(TransactionTestCase):
+    """The queue's thread has its own connection, so no wrapping transaction."""
+
+    def setUp(self):
+        self.queue = writer.WriteQueue()
+        self.addCleanup(self.queue.shutdown, writer.TIMEOUT)
+        self.enterContext(mock.patch.object(writer, "_queue", self.queue))
+        self.expires = timezone.now() + timedelta(minutes=1)
+
+    def window(self, key, window=1):
+        RateLimitWindow.objects.create(key=key, window=window, expires_at=self.expires)
+        return threading.current_thread().name
+
+    def hold(self):
+        """Block the writer thread until the returned event is set."""
+        started, release = threading.Event(), threading.Event()
+
+        def wait():
+            started.set()
+            release.wait(writer.TIMEOUT)
+
+        future = self.queue.submit(wait)
+        started.wait(writer.TIMEOUT)
+        return future, release
+
+    def test_the_writer_keeps_its_connection(self):
+        # CONN_MAX_AGE is 0 here, as it is for every connection under ASGI
+        wrapper = type(connections["default"])
+        with mock.patch.object(wrapper, "close", autospec=True) as close:
+            for _ in range(2):
+                self.queue.submit(int).result(writer.TIMEOUT)
+        close.assert_not_called()
+
+    def test_writes_run_one_at_a_time_in_one_thread(self):
+        running, overlaps, lock = [0], [], threading.Lock()
+
+        def write(key):
+            with lock:
+                running[0] += 1
+                overlaps.append(running[0] > 1)
+            time.sleep(0.01)
+            name = self.window(key)
+            with lock:
+                running[0] -= 1
+            return name
+
+        threads_seen = []
+        callers = [
+            threading.Thread(
+                target=lambda i=i: threads_seen.append(writer.call(write, f"k{i}"))
+            )
+            for i in range(8)
+        ]
+        for t in callers:
+            t.start()
+        for t in callers:
+            t.join()
+        self.assertEqual(set(threads_seen), {"sqlite-writer"})
+        self.assertFalse(any(overlaps))
+        self.assertEqual(RateLimitWindow.objects.count(), 8)
+
+    def test_results_and_exceptions_reach_the_caller(self):
+        self.assertEqual(writer.call(self.window, "a"), "sqlite-writer")
+        held, release = self.hold()
+        # queued together: one commit, a savepoint each
+        futures = [
+            self.queue.submit(self.window, "a"),
+            self.queue.submit(self.window, "b"),
+        ]
+        release.set()
+        held.result(writer.TIMEOUT)
+        with self.assertRaises(IntegrityError):
+            futures[0].result(writer.TIMEOUT)
+        self.assertEqual(futures[1].result(writer.TIMEOUT), "sqlite-writer")
+        self.assertEqual(
+            sorted(RateLimitWindow.objects.values_list("key", flat=True)), ["a", "b"]
+        )
+
+    async def test_acall(self):
+        self.assertEqual(await writer.acall(self.window, "a"), "sqlite-writer")
+        with self.assertRaises(IntegrityError):
+            await writer.acall(self.window, "a")
+
+    def test_open_transaction_writes_in_place(self):
+        with transaction.atomic():
+            self.assertEqual(
+                writer.call(self.window, "a"), threading.current_thread().name
+            )
+
+    def test_shutdown_commits_what_is_queued(self):
+        held, release = self.hold()
+        futures = [self.queue.submit(self.window, f"k{i}") for i in range(3)]
+        thread = self.queue.thread
+        threading.Timer(0.05, release.set).start()
+        self.queue.shutdown(writer.TIMEOUT)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(all(f.done() for f in futures))
+        self.assertEqual(RateLimitWindow.objects.count(), 3)
+        # the next write starts a new thread
+        self.assertEqual(writer.call(self.window, "after"), "sqlite-writer")
+        self.assertIsNot(self.queue.thread, thread)
+
+
+@inline_stats
+class SeedAndBenchTests(TestCase):
+    # the bench turns the limits off for its own requests
+    @override_settings(RATE_LIMITS={"RATES": {"track_contact": "1/m"}})
+    def test_seed_then_bench_against_baseline(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        # a room seen before seeding keeps its unique viewers
+        owner = User.objects.create_user("owner", "o@example.com", "pw")
+        room = Room.objects.create(
+            owner=owner,
+            title="Backroom",
+            description="Near the station",
+            price=1800,
+            location="Sunnyside",
+            room_type="single",
+        )
+        sketch = HyperLogLog()
+        sketch.update(["anonymous viewer"])
+        RoomViewSketch.objects.create(
+            room=room, day=timezone.now().date(), sketch=sketch.to_bytes()
+        )
+
+        call_command("seed_data", rooms=30, stats=300, seed=1, stdout=StringIO())
+        self.assertEqual(Room.objects.count(), 31)
+        self.assertEqual(RoomStat.objects.count(), 300)
+        self.assertEqual(uniques.unique_viewers(room.pk, timezone.now().date()), 1)
+        self.assertTrue(RoomViewSketch.objects.exclude(room=room).exists())
+        # seeded files stay in their own folder
+        self.assertEqual(os.listdir(media.name), ["seed"])
+        # the derived tables match what the signal handlers would have written
+        self.assertEqual(aggregates.reconcile(dry_run=True), 0)
+        self.assertEqual(sum(rollups.totals().values()), 300)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "baseline.json")
+            options = {"requests": 2, "warmup": 0, "stdout": StringIO()}
+            call_command("bench_listings", save=path, **options)
+            with open(path) as f:
+                results = json.load(f)["results"]
+            self.assertIn("room_list near", results)
+            self.assertEqual(results["track_contact"]["statuses"], {"302": 2})
+            self.assertIsNotNone(results["dashboard"]["queries"])
+
+            out = StringIO()
+            call_command("bench_listings", baseline=path, **{**options, "stdout": out})
+            self.assertIn("vs baseline", out.getvalue())
@@ -0,0 +1,231 @@
+"""
+Unique viewers per room.
+
+A viewer is the signed-in user, else the session, else the client's address
+and user agent, hashed by ``viewer_key()``. ``ingest.record`` drops a view
+when ``first_view()`` says the same viewer already saw the room within
+``VIEW_DEDUPE["SECONDS"]``, so reloading a page queues nothing. Recent
+pairs live in a bounded LRU, either per process or in a cache every worker
+shares::
+
+    VIEW_DEDUPE = {
+        "BACKEND": "listings.uniques.MemoryBackend",  # or CacheBackend
+        "OPTIONS": {"max_size": 50000},  # CacheBackend: {"alias": "default"}
+        "SECONDS": 1800,  # 0 turns deduplication off
+    }
+
+Views that are written also go into a HyperLogLog sketch per room and UTC
+day (``RoomViewSketch``), from the ``stats_recorded`` signal. ``sketches()``
+merges any range of days, so distinct viewers are a read of a few small
+rows. Raw ``RoomStat`` rows don't keep the viewer, so ``backfill()`` can
+only rebuild sketches from views by signed-in users.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import ratelimit, rollups
+from .hll import HyperLogLog
+from .models import RoomStat, RoomViewSketch, StatRollup
+
+DEFAULTS = {
+    "BACKEND": "listings.uniques.MemoryBackend",
+    "OPTIONS": {},
+    "SECONDS": 30 * 60,
+}
+
+
+class MemoryBackend:
+    """Per-process LRU of ``key -> expiry``; the oldest keys go first when full."""
+
+    def __init__(self, max_size=50000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, key, seconds):
+        now = time.monotonic()
+        with self.lock:
+            expires = self.entries.get(key)
+            if expires is not None and expires > now:
+                self.entries.move_to_end(key)
+                return False
+            self.entries[key] = now + seconds
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            return True
+
+
+class CacheBackend:
+    """Keys in a Django cache, shared by every worker that uses it."""
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    def add(self, key, seconds):
+        return caches[self.alias].add(f"viewed:{key}", 1, seconds)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "VIEW_DEDUPE", {})}
+
+
+def _get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            config = _config()
+            _backend = import_string(config["BACKEND"])(**config["OPTIONS"])
+        return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting == "VIEW_DEDUPE":
+        with _backend_lock:
+            _backend = None
+
+
+def _hash(raw):
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+def user_viewer(user_id):
+    return _hash(f"user:{user_id}")
+
+
+def viewer_key(request, user):
+    """Who is viewing, as an opaque string (never the session key itself)."""
+    if user.is_authenticated:
+        return user_viewer(user.pk)
+    session_key = request.session.session_key
+    if session_key:
+        return _hash(f"session:{session_key}")
+    return _hash(
+        f"client:{ratelimit.client_ip(request)}:"
+        f"{request.META.get('HTTP_USER_AGENT', '')}"
+    )
+
+
+def first_view(viewer, room_id):
+    """Whether ``viewer`` hasn't seen ``room_id`` within the dedupe window."""
+    seconds = _config()["SECONDS"]
+    if not seconds:
+        return True
+    return _get_backend().add(f"{viewer}:{room_id}", seconds)
+
+
+def _day(when):
+    return rollups.bucket_start(when, StatRollup.DAY).date()
+
+
+def _merge_new(room_id, day, sketch):
+    try:
+        with transaction.atomic():
+            RoomViewSketch.objects.create(
+                room_id=room_id, day=day, sketch=sketch.to_bytes()
+            )
+    except IntegrityError:
+        # another writer created the row first
+        row = RoomViewSketch.objects.select_for_update().get(room_id=room_id, day=day)
+        row.sketch = sketch.merge(HyperLogLog.from_bytes(row.sketch)).to_bytes()
+        row.save(update_fields=["sketch"])
+
+
+def views_recorded(stats):
+    """Add the viewers in a ``stats_recorded`` batch to the daily sketches."""
+    viewers = defaultdict(set)
+    for stat in stats:
+        if stat.stat_type != "view":
+            continue
+        # set by ingest; stats written some other way only know the user
+        viewer = getattr(stat, "viewer", None) or (
+            stat.user_id and user_viewer(stat.user_id)
+        )
+        if viewer:
+            viewers[(stat.room_id, _day(stat.created_at))].add(viewer)
+    if not viewers:
+        return
+
+    with transaction.atomic(savepoint=False):
+        rows = {
+            (row.room_id, row.day): row
+            for row in RoomViewSketch.objects.select_for_update().filter(
+                room_id__in={room_id for room_id, _ in viewers},
+                day__in={day for _, day in viewers},
+            )
+        }
+        changed = []
+        for (room_id, day), added in sorted(viewers.items()):
+            row = rows.get((room_id, day))
+            if row is None:
+                sketch = HyperLogLog()
+                sketch.update(added)
+                _merge_new(room_id, day, sketch)
+                continue
+            sketch = HyperLogLog.from_bytes(row.sketch)
+            sketch.update(added)
+            row.sketch = sketch.to_bytes()
+            changed.append(row)
+        RoomViewSketch.objects.bulk_update(changed, ["sketch"])
+
+
+def backfill(since, batch_size=2000):
+    """Rebuild the sketches from ``since``'s day on from signed-in views."""
+    since = rollups.bucket_start(since, StatRollup.DAY)
+    views = (
+        RoomStat.objects.filter(
+            stat_type="view", user__isnull=False, created_at__gte=since
+        )
+        .order_by()
+        .values_list("room_id", "user_id", "created_at")
+    )
+    built = defaultdict(HyperLogLog)
+    for room_id, user_id, created_at in views.iterator(chunk_size=batch_size):
+        built[(room_id, _day(created_at))].add(user_viewer(user_id))
+    with transaction.atomic():
+        RoomViewSketch.objects.filter(day__gte=since.date()).delete()
+        RoomViewSketch.objects.bulk_create(
+            [
+                RoomViewSketch(room_id=room_id, day=day, sketch=sketch.to_bytes())
+                for (room_id, day), sketch in built.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(built)
+
+
+def sketches(rows):
+    """Merge ``(key, sketch bytes)`` rows into ``{key: HyperLogLog}``."""
+    merged = {}
+    for key, data in rows:
+        sketch = HyperLogLog.from_bytes(data)
+        if key in merged:
+            merged[key].merge(sketch)
+        else:
+            merged[key] = sketch
+    return merged
+
+
+def unique_viewers(room_id, since, until=None):
+    """Estimated distinct viewers of ``room_id`` between two dates (inclusive)."""
+    rows = RoomViewSketch.objects.filter(room_id=room_id, day__gte=since)
+    if until is not None:
+        rows = rows.filter(day__lte=until)
+    merged = sketches(rows.values_list("room_id", "sketch"))
+    return merged[room_id].count() if merged else 0
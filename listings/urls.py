@@ -1,9 +1,10 @@
 from django.urls import path
-from . import views
+from . import api, metrics, views
 
 urlpatterns = [
     path("", views.room_list, name="home"),
     path("rooms/", views.room_list, name="room_list"),
+    path("rooms/more/", views.room_list_more, name="room_list_more"),
     path("room/<int:pk>/", views.room_detail, name="room_detail"),
     path("rooms/new/", views.create_room, name="create_room"),
     path("register/", views.register, name="register"),
@@ -11,6 +12,8 @@ urlpatterns = [
     path("logout/", views.user_logout, name="logout"),
     path("dashboard/", views.dashboard, name="dashboard"),
     path("dashboard/add/", views.create_room, name="add_room"),
+    path("dashboard/import/", views.import_rooms, name="import_rooms"),
+    path("dashboard/export/", views.export_rooms, name="export_rooms"),
     path("rooms/<int:pk>/edit/", views.edit_room, name="edit_room"),
     path("rooms/<int:pk>/delete/", views.delete_room, name="delete_room"),
     path(
@@ -34,4 +37,8 @@ urlpatterns = [
     path("about/", views.about, name="about"),
     path("services/", views.services, name="services"),
     path("contact/", views.contact, name="contact"),
+    path("heatmap/", views.heatmap, name="heatmap"),
+    path("_metrics/", metrics.metrics_view, name="metrics"),
+    path("api/rooms/", api.room_list, name="api_room_list"),
+    path("api/rooms/<int:pk>/", api.room_detail, name="api_room_detail"),
 ]
@@ -1,15 +1,43 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
-from .models import Room, Review, Contact, RoomStat, RoomImage, Profile
+from .models import Room, Review, Contact, RoomImage
 from django.contrib.auth import login, logout, authenticate
-from .forms import UserRegisterForm, RoomForm
-from django.db.models import Avg, Count, Q
-from django.http import HttpResponseForbidden
-from urllib.parse import quote
+from .forms import UserRegisterForm, RoomForm, RoomImageForm
+from django.http import (
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.template.loader import render_to_string
+from django.urls import reverse
+from urllib.parse import quote, urlencode
+from .pagination import InvalidCursor, page_size_from
+from . import (
+    browse,
+    bulk,
+    counters,
+    facets,
+    fragments,
+    images,
+    ingest,
+    ratelimit,
+    recommend,
+    uniques,
+    writer,
+)
+from .services import owner_dashboard
 from django.contrib import messages
 import re
 
 
+class ContactRedirect(HttpResponseRedirect):
+    # hands the visitor to their dialer or mail client
+    allowed_schemes = ["http", "https", "tel", "mailto"]
+
+
 def is_landlord(user):
     return hasattr(user, "profile") and user.profile.role == "landlord"
 
@@ -39,10 +67,9 @@ def home(request):
         return redirect(f"/rooms/?{querystring}" if querystring else "/rooms/")
 
     context = {
-        "room_count": Room.objects.count(),
-        "contact_count": Contact.objects.count(),
-        "review_count": Review.objects.count(),
-        "landlord_count": Profile.objects.filter(role="landlord").count(),
+        **counters.get_many(
+            ["room_count", "contact_count", "review_count", "landlord_count"]
+        ),
         "values": {
             "q": q,
             "location": location,
@@ -63,13 +90,14 @@ def about(request):
 
 
 def services(request):
+    values = counters.get_many(
+        ["rooms_available", "room_count", "contacts_made", "success_matches"]
+    )
     context = {
-        "rooms_available": Room.objects.filter(is_available=True).count(),
-        "total_rooms": Room.objects.count(),
-        "contacts_made": RoomStat.objects.filter(
-            stat_type__startswith="contact"
-        ).count(),
-        "success_matches": RoomStat.objects.filter(stat_type="success").count(),
+        "rooms_available": values["rooms_available"],
+        "total_rooms": values["room_count"],
+        "contacts_made": values["contacts_made"],
+        "success_matches": values["success_matches"],
     }
     return render(request, "listings/services.html", context)
 
@@ -78,47 +106,47 @@ def contact(request):
     return render(request, "listings/contact.html")
 
 
-def room_list(request):
-    q = (request.GET.get("q") or "").strip()
-    location = (request.GET.get("location") or "").strip()
-    room_type = (request.GET.get("type") or "").strip()
-
-    rooms_qs = Room.objects.filter(is_available=True)
+def heatmap(request):
+    """Areas by time-decayed demand (listings.areas), cached for a minute."""
+    return render(
+        request,
+        "listings/heatmap.html",
+        {"heatmap": counters.get("area_heatmap")},
+    )
 
-    # Search logic
-    if q:
-        rooms_qs = rooms_qs.filter(
-            Q(title__icontains=q)
-            | Q(description__icontains=q)
-            | Q(location__icontains=q)
-            | Q(room_type__icontains=q)
-        )
 
-    if location:
-        rooms_qs = rooms_qs.filter(location__icontains=location)
+def _page_url(view_name, values, next_cursor):
+    if not next_cursor:
+        return ""
+    params = {k: v for k, v in values.items() if v}
+    params["cursor"] = next_cursor
+    return f"{reverse(view_name)}?{urlencode(params)}"
 
-    if room_type:
-        rooms_qs = rooms_qs.filter(room_type=room_type)
-
-    rooms = (
-        rooms_qs.annotate(
-            avg_rating=Avg("reviews__rating"),
-            review_count=Count("reviews"),
-            contact_count=Count(
-                "roomstat", filter=Q(roomstat__stat_type__startswith="contact")
-            ),
-        )
-        .select_related("owner__profile")
-        .prefetch_related("images")
-        .order_by("-created_at")
-    )
 
+def room_list(request):
+    values = browse.filters_from(request)
+    size = page_size_from(request.GET.get("size"))
+    try:
+        rooms, next_cursor = browse.room_page(values, request.GET.get("cursor"), size)
+    except InvalidCursor:
+        rooms, next_cursor = browse.room_page(values, None, size)
+
+    room_type = values["type"]
     return render(
         request,
         "listings/room_list.html",
         {
-            "rooms": rooms,
-            "values": {"q": q, "location": location, "type": room_type},
+            "cards": fragments.render_cards(rooms),
+            "facets": facets.options(
+                facets.counts_for(
+                    browse.searched_rooms(values),
+                    {k: values[k] for k in browse.SEARCH_PARAMS},
+                ),
+                values,
+            ),
+            "next_url": _page_url("room_list", values, next_cursor),
+            "more_url": _page_url("room_list_more", values, next_cursor),
+            "values": values,
             "selected": {
                 "any": room_type == "",
                 "single": room_type == "single",
@@ -129,14 +157,52 @@ def room_list(request):
     )
 
 
-def room_detail(request, pk):
-    room = get_object_or_404(Room, pk=pk, is_available=True)
-    RoomStat.objects.create(
-        room=room,
-        user=request.user if request.user.is_authenticated else None,
-        stat_type="view",
+def room_list_more(request):
+    """
+    Infinite-scroll fragment: the next page of room cards after ``cursor``.
+
+    Returns JSON ``{"html", "next_cursor", "more_url"}`` by default, or the bare
+    card markup (next page link in the ``X-Next-Page`` header) with ``format=html``.
+    """
+    values = browse.filters_from(request)
+    size = page_size_from(request.GET.get("size"))
+    try:
+        rooms, next_cursor = browse.room_page(values, request.GET.get("cursor"), size)
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor."}, status=400)
+
+    html = render_to_string(
+        "listings/room_cards.html",
+        {"cards": fragments.render_cards(rooms)},
+        request=request,
+    )
+    more_url = _page_url("room_list_more", values, next_cursor)
+
+    if request.GET.get("format") == "html":
+        response = HttpResponse(html)
+        response["X-Next-Page"] = more_url
+        return response
+
+    return JsonResponse(
+        {"html": html, "next_cursor": next_cursor, "more_url": more_url}
+    )
+
+
+async def room_detail(request, pk):
+    room = await aget_object_or_404(
+        Room.objects.select_related("owner").prefetch_related("images"),
+        pk=pk,
+        is_available=True,
+    )
+    user = await request.auser()
+    # over the limit the page still renders, the view just isn't counted
+    if not await ratelimit.ahit("room_view", request, user):
+        await ingest.arecord(room, "view", user, uniques.viewer_key(request, user))
+    similar = await sync_to_async(recommend.similar_cards)(room.pk)
+    # the page still reads the session, messages and user lazily
+    return await sync_to_async(render)(
+        request, "listings/room_detail.html", {"room": room, "similar": similar}
     )
-    return render(request, "listings/room_detail.html", {"room": room})
 
 
 def register(request):
@@ -169,20 +235,7 @@ def user_logout(request):
 @login_required
 @user_passes_test(is_landlord)
 def dashboard(request):
-    rooms = Room.objects.filter(owner=request.user)
-    image_count = RoomImage.objects.filter(room__owner=request.user).count()
-    contact_count = RoomStat.objects.filter(
-        room__owner=request.user, stat_type__startswith="contact"
-    ).count()
-    return render(
-        request,
-        "listings/dashboard.html",
-        {
-            "rooms": rooms,
-            "image_count": image_count,
-            "contact_count": contact_count,
-        },
-    )
+    return render(request, "listings/dashboard.html", owner_dashboard(request.user))
 
 
 @login_required
@@ -191,13 +244,28 @@ def add_room(request):
     return redirect("create_room")
 
 
+def _save_room_images(request, room, files):
+    """Store up to 10 uploads; resized variants are built in the background."""
+    saved, rejected = [], []
+    for upload in files[:10]:
+        # Pillow has to be able to read it, or there is nothing to resize
+        form = RoomImageForm(files={"image": upload}, instance=RoomImage(room=room))
+        if form.is_valid():
+            saved.append(form.save())
+        else:
+            rejected.append(upload.name)
+    if rejected:
+        messages.error(request, f"Not an image we can use: {', '.join(rejected)}")
+    images.schedule(image.pk for image in saved)
+    return saved
+
+
 @login_required
 def upload_room_images(request, room_id):
     room = get_object_or_404(Room, id=room_id, owner=request.user)
 
     if request.method == "POST":
-        for img in request.FILES.getlist("images")[:10]:
-            RoomImage.objects.create(room=room, image=img)
+        _save_room_images(request, room, request.FILES.getlist("images"))
         return redirect("edit_room_images", pk=room.id)
 
     return render(request, "listings/upload_images.html", {"room": room})
@@ -220,13 +288,37 @@ def create_room(request):
         room.owner = request.user
         room.save()
 
-        for img in request.FILES.getlist("images")[:10]:
-            RoomImage.objects.create(room=room, image=img)
+        _save_room_images(request, room, request.FILES.getlist("images"))
 
         return redirect("dashboard")
     return render(request, "listings/create_room.html", {"form": form})
 
 
+@login_required
+@user_passes_test(is_landlord)
+def import_rooms(request):
+    upload = request.FILES.get("file")
+    if request.method == "POST" and upload:
+        fmt = bulk.format_of(upload.name)
+        result = bulk.import_rooms(request.user, bulk.read_rows(upload, fmt))
+        return render(request, "listings/import_rooms.html", {"result": result})
+    return render(request, "listings/import_rooms.html")
+
+
+@login_required
+@user_passes_test(is_landlord)
+def export_rooms(request):
+    fmt = request.GET.get("format", "csv")
+    if fmt not in bulk.FORMATS:
+        fmt = "csv"
+    response = StreamingHttpResponse(
+        bulk.export_rows(Room.objects.filter(owner=request.user), fmt),
+        content_type="text/csv" if fmt == "csv" else "application/x-ndjson",
+    )
+    response["Content-Disposition"] = f'attachment; filename="rooms.{fmt}"'
+    return response
+
+
 @login_required
 def edit_room(request, pk):
     room = get_object_or_404(Room, pk=pk, owner=request.user)
@@ -247,11 +339,13 @@ def delete_room(request, pk):
 
 
 @login_required
+@ratelimit.rate_limit("add_review")
 def add_review(request, room_id):
     room = get_object_or_404(Room, id=room_id)
     if not Contact.objects.filter(room=room, user=request.user).exists():
         return HttpResponseForbidden("Contact landlord first.")
-    Review.objects.create(
+    writer.call(
+        Review.objects.create,
         room=room,
         user=request.user,
         rating=request.POST.get("rating"),
@@ -261,18 +355,18 @@ def add_review(request, room_id):
 
 
 @login_required
-def track_contact(request, room_id, method):
-    room = get_object_or_404(Room, id=room_id, is_available=True)
-
-    # save stat
-    RoomStat.objects.create(
-        room=room,
-        user=request.user,
-        stat_type=f"contact_{method}",
+@ratelimit.rate_limit("track_contact")
+async def track_contact(request, room_id, method):
+    room = await aget_object_or_404(
+        Room.objects.select_related("owner"), id=room_id, is_available=True
     )
+    user = await request.auser()
+
+    # save stat (batched, see listings.ingest)
+    await ingest.arecord(room, f"contact_{method}", user)
 
     # allow review after at least one contact attempt
-    Contact.objects.get_or_create(room=room, user=request.user)
+    await writer.acall(Contact.objects.get_or_create, room=room, user=user)
 
     phone_raw = (room.contact_phone or "").strip()
     whatsapp_raw = (room.contact_whatsapp or "").strip() or phone_raw
@@ -287,7 +381,7 @@ def track_contact(request, room_id, method):
         tel = phone_raw.replace(" ", "")
         if not tel:
             return redirect("room_detail", pk=room.id)
-        return redirect(f"tel:{tel}")
+        return ContactRedirect(f"tel:{tel}")
 
     if method == "whatsapp":
         if not phone_digits:
@@ -301,15 +395,16 @@ def track_contact(request, room_id, method):
         body = quote(
             f"Hi, I’m interested in your room listing ({room.title}) in {room.location}."
         )
-        return redirect(f"mailto:{landlord_email}?subject={subject}&body={body}")
+        return ContactRedirect(f"mailto:{landlord_email}?subject={subject}&body={body}")
 
     return redirect("room_detail", pk=room.id)
 
 
 @login_required
-def mark_success(request, room_id):
-    room = get_object_or_404(Room, id=room_id)
-    RoomStat.objects.create(room=room, user=request.user, stat_type="success")
+@ratelimit.rate_limit("mark_success")
+async def mark_success(request, room_id):
+    room = await aget_object_or_404(Room.objects.only("id"), id=room_id)
+    await ingest.arecord(room, "success", await request.auser())
     messages.success(request, "Thanks for confirming!")
     return redirect("room_detail", pk=room.id)
 
@@ -319,8 +414,7 @@ def edit_room_images(request, pk):
     room = get_object_or_404(Room, pk=pk, owner=request.user)
 
     if request.method == "POST":
-        for img in request.FILES.getlist("images")[:10]:
-            RoomImage.objects.create(room=room, image=img)
+        _save_room_images(request, room, request.FILES.getlist("images"))
 
         if "delete" in request.POST:
             RoomImage.objects.filter(
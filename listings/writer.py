@@ -0,0 +1,160 @@
+"""
+Single-writer queue for SQLite.
+
+SQLite takes one writer at a time. When several request threads write at
+once, the losers sleep on the busy timeout or fail with "database is locked".
+With ``SQLITE_WRITE_QUEUE`` on (part of the tuned SQLite profile in
+settings), the hot write paths hand their writes to one thread per process.
+That thread owns a persistent connection and commits whatever has queued up
+in one transaction, with a savepoint per write. Across processes, ``IMMEDIATE`` transactions and
+the busy timeout make writers wait for the lock instead of failing when a
+read transaction tries to upgrade.
+
+With the setting off, ``call()`` and ``acall()`` run the function directly.
+At exit the thread commits whatever is still queued before it stops.
+"""
+
+import asyncio
+import atexit
+import contextvars
+import queue
+import threading
+from concurrent.futures import Future
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+
+# how long a caller waits for its write before giving up
+TIMEOUT = 30
+# most writes committed together
+BATCH_SIZE = 100
+# queued by shutdown(): the thread stops once it has written what came before
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        # set in the writer thread, including one that is draining after shutdown()
+        self.local = threading.local()
+
+    def _ensure_thread(self):
+        # called with self.lock held
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self._run, name="sqlite-writer", daemon=True
+            )
+            self.thread.start()
+
+    def _take(self):
+        """Return ``(writes, stop)``: the next batch, and whether to stop after it."""
+        batch = [self.queue.get()]
+        while len(batch) < BATCH_SIZE and batch[-1] is not _STOP:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        stop = batch[-1] is _STOP
+        if stop:
+            batch.pop()
+        return [item for item in batch if item[3].set_running_or_notify_cancel()], stop
+
+    def _run(self):
+        self.local.writer = True
+        stop = False
+        while not stop:
+            batch, stop = self._take()
+            if batch:
+                self._write(batch)
+        connection.close()
+
+    def _write(self, batch):
+        # the thread keeps its connection whatever CONN_MAX_AGE says (0 under
+        # ASGI, for the per-request threads); only a broken one is replaced
+        if connection.connection is not None and connection.errors_occurred:
+            if connection.is_usable():
+                connection.errors_occurred = False
+            else:
+                connection.close()
+        outcomes = []
+        try:
+            # group commit: one transaction for everything queued so far,
+            # with a savepoint per write so one failure doesn't undo the rest
+            with transaction.atomic():
+                for func, args, kwargs, future in batch:
+                    try:
+                        with transaction.atomic():
+                            outcomes.append((future, func(*args, **kwargs), None))
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+        except Exception as exc:
+            for *_, future in batch:
+                future.set_exception(exc)
+            return
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+    def submit(self, func, *args, **kwargs):
+        """Queue ``func(*args, **kwargs)``; returns a ``concurrent.futures.Future``."""
+        future = Future()
+        # run in the caller's context so per-request state (query metrics,
+        # replica pinning) sees the write
+        context = contextvars.copy_context()
+        with self.lock:
+            self._ensure_thread()
+            self.queue.put((context.run, (func,) + args, kwargs, future))
+        return future
+
+    def shutdown(self, timeout=None):
+        """
+        Commit what is already queued and stop the thread. A later ``submit()``
+        starts a new one.
+        """
+        with self.lock:
+            thread, self.thread = self.thread, None
+            if thread is None or not thread.is_alive():
+                return
+            self.queue.put(_STOP)
+        thread.join(timeout)
+
+    def in_writer(self):
+        return getattr(self.local, "writer", False)
+
+
+_queue = WriteQueue()
+
+
+@atexit.register
+def _drain_at_exit():
+    _queue.shutdown(TIMEOUT)
+
+
+def enabled():
+    return getattr(settings, "SQLITE_WRITE_QUEUE", False)
+
+
+def _inline():
+    # inside an open transaction the caller may already hold the write lock
+    # (and its rows aren't visible to the writer's connection): run in place
+    return not enabled() or _queue.in_writer() or connection.in_atomic_block
+
+
+def call(func, *args, **kwargs):
+    """Run a write through the queue and return its result."""
+    if _inline():
+        return func(*args, **kwargs)
+    return _queue.submit(func, *args, **kwargs).result(TIMEOUT)
+
+
+async def acall(func, *args, **kwargs):
+    """``call()`` for async views; the event loop isn't blocked while waiting."""
+    if not enabled():
+        return await sync_to_async(func)(*args, **kwargs)
+    future = _queue.submit(func, *args, **kwargs)
+    return await asyncio.wait_for(asyncio.wrap_future(future), TIMEOUT)
@@ -3,6 +3,31 @@ ASGI config for rentaroom project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Deployment profile: ``room_detail``, ``track_contact`` and ``mark_success``
+are async views, so one ASGI process keeps serving other requests while they
+wait on the database instead of holding a worker each::
+
+    uvicorn rentaroom.asgi:application --host 0.0.0.0 --port $PORT \\
+        --workers 2 --timeout-keep-alive 5
+
+- One worker per CPU core; concurrency within a worker comes from the event
+  loop, not from more processes.
+- Static files are not served by the app under this profile (see ``ASGI`` in
+  settings); put nginx or a CDN in front of ``STATIC_ROOT``, and set
+  ``MEDIA_ACCEL`` so media goes the same way. ``ASGI_WHITENOISE=1`` keeps
+  WhiteNoise, at the cost of running every request on a thread.
+- Persistent connections are off: under this profile ``DB_CONN_MAX_AGE``
+  and the tuned SQLite profile default ``CONN_MAX_AGE`` to 0, since async
+  views use a fresh thread per request and would strand a connection each
+  time. To reuse Postgres connections, set ``DB_POOL_SIZE`` instead.
+
+Compare against the WSGI sync workers with the same number of processes::
+
+    gunicorn rentaroom.wsgi -w 2 --bind 127.0.0.1:8000
+    uvicorn rentaroom.asgi:application --workers 2 --port 8001
+    python manage.py loadtest /room/1/ --target http://127.0.0.1:8000 \\
+        --target http://127.0.0.1:8001 --concurrency 100 --duration 20
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +37,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rentaroom.settings")
+os.environ.setdefault("DJANGO_SERVER", "asgi")
 
 application = get_asgi_application()
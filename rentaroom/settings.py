@@ -35,6 +35,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "listings.metrics.QueryMetricsMiddleware",
+    "listings.routers.ReplicaPinningMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -44,11 +46,19 @@ MIDDLEWARE = [
     "whitenoise.middleware.WhiteNoiseMiddleware",
 ]
 
+# Set by rentaroom/asgi.py. WhiteNoise is sync-only, and one sync middleware
+# puts every request back on a thread, so the ASGI profile leaves static files
+# to the front-end server (ASGI_WHITENOISE=1 keeps it, e.g. without one).
+ASGI = os.environ.get("DJANGO_SERVER") == "asgi"
+if ASGI and os.environ.get("ASGI_WHITENOISE") != "1":
+    MIDDLEWARE.remove("whitenoise.middleware.WhiteNoiseMiddleware")
+
 ROOT_URLCONF = "rentaroom.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates plus render timing for QueryMetricsMiddleware
+        "BACKEND": "listings.metrics.InstrumentedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -66,9 +76,98 @@ WSGI_APPLICATION = "rentaroom.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.environ.get("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
     }
 }
+
+# Postgres (or any dj_database_url URL) instead of SQLite. Connections are
+# kept open per worker thread for DB_CONN_MAX_AGE seconds, 0 (closed after
+# each request) under ASGI by default: async views run their queries on a new
+# thread per request, which would leave its connection behind every time.
+# DB_POOL_SIZE > 0 switches to Django's psycopg 3 pool (pip install
+# "psycopg[pool]"), which shares connections between a process's threads and
+# is how to reuse them under ASGI. Behind PgBouncer in transaction mode, set
+# DB_PGBOUNCER=1: server-side cursors don't survive it.
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", "0" if ASGI else "60"))
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "0"))
+
+
+def database_from_url(url):
+    if dj_database_url is None:
+        raise ImportError("DATABASE_URL is set but dj-database-url is not installed")
+    config = dj_database_url.parse(
+        url, conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=True
+    )
+    if config["ENGINE"].endswith("postgresql"):
+        if DB_POOL_SIZE:
+            # the pool replaces persistent connections; Django rejects both
+            config["CONN_MAX_AGE"] = 0
+            config.setdefault("OPTIONS", {})["pool"] = {
+                "min_size": 1,
+                "max_size": DB_POOL_SIZE,
+                "timeout": int(os.environ.get("DB_POOL_TIMEOUT", "10")),
+            }
+        if os.environ.get("DB_PGBOUNCER") == "1":
+            config["DISABLE_SERVER_SIDE_CURSORS"] = True
+    return config
+
+
+if os.environ.get("DATABASE_URL"):
+    DATABASES["default"] = database_from_url(os.environ["DATABASE_URL"])
+
+# Opt-in SQLite profile for production on one box (SQLITE_PROFILE=tuned).
+# WAL lets reads run alongside the writer. synchronous=NORMAL is crash-safe in
+# WAL mode. IMMEDIATE transactions plus a busy timeout make writers queue for
+# the lock instead of failing with "database is locked", and in-process writes
+# go through one thread (listings.writer). Compare with `manage.py bench_sqlite`.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "cache_size": -20000,
+}
+SQLITE_BUSY_TIMEOUT = 20
+SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "")
+SQLITE_WRITE_QUEUE = False
+if SQLITE_PROFILE == "tuned" and DATABASES["default"]["ENGINE"].endswith("sqlite3"):
+    DATABASES["default"].update(
+        {
+            "OPTIONS": {
+                "init_command": ";".join(
+                    f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+                ),
+                "transaction_mode": "IMMEDIATE",
+                "timeout": SQLITE_BUSY_TIMEOUT,
+            },
+            # per-request threads under ASGI, as for DB_CONN_MAX_AGE
+            "CONN_MAX_AGE": 0 if ASGI else 600,
+            "CONN_HEALTH_CHECKS": True,
+        }
+    )
+    SQLITE_WRITE_QUEUE = True
+
+# Read replicas (listings.routers): DATABASE_REPLICA_URLS is a comma-separated
+# list of URLs, or SQLITE_REPLICA_PATH names a second SQLite file kept in step
+# with `manage.py sync_sqlite_replica` for trying this out locally. Reads go to
+# a replica unless the client wrote in the last REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = []
+replica_urls = os.environ.get("DATABASE_REPLICA_URLS", "")
+for i, url in enumerate([u.strip() for u in replica_urls.split(",") if u.strip()]):
+    DATABASES[f"replica{i + 1}"] = {
+        **database_from_url(url),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{i + 1}")
+if os.environ.get("SQLITE_REPLICA_PATH"):
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ["SQLITE_REPLICA_PATH"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append("replica")
+DATABASE_ROUTERS = ["listings.routers.PrimaryReplicaRouter"]
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", "10"))
 MEDIA_ROOT = BASE_DIR / "media"
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -93,4 +192,152 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# "nginx" (X-Accel-Redirect) or "apache" (X-Sendfile) lets the front-end
+# server send media bytes; MEDIA_ACCEL_PREFIX is nginx's internal location.
+MEDIA_ACCEL = os.environ.get("MEDIA_ACCEL", "")
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/protected-media/")
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# CACHES entry for kind "locmem", "file" or "db" ("db" needs
+# `manage.py createcachetable`); file/db are shared between workers.
+def cache_backend(kind, name):
+    if kind == "file":
+        return {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(BASE_DIR / "cache" / name),
+        }
+    if kind == "db":
+        return {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": f"listings_{name}_cache",
+        }
+    return {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": name,
+    }
+
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # home/services numbers (listings.counters)
+    "counters": cache_backend(
+        os.environ.get("COUNTER_CACHE_BACKEND", "locmem"), "counters"
+    ),
+    # rendered room cards (listings.fragments)
+    "fragments": cache_backend(
+        os.environ.get("FRAGMENT_CACHE_BACKEND", "locmem"), "fragments"
+    ),
+    # rate-limit windows and recent viewers when RATE_LIMIT_BACKEND /
+    # VIEW_DEDUPE_BACKEND is "cache": only a shared kind shares them
+    "ratelimit": cache_backend(
+        os.environ.get("RATE_LIMIT_CACHE_BACKEND", "file"), "ratelimit"
+    ),
+    "viewers": cache_backend(
+        os.environ.get("VIEW_DEDUPE_CACHE_BACKEND", "file"), "viewers"
+    ),
+}
+COUNTER_CACHE_TTL = int(os.environ.get("COUNTER_CACHE_TTL", "60"))
+# area demand halves every this many hours without new views (listings.areas)
+AREA_DEMAND_HALF_LIFE_HOURS = int(os.environ.get("AREA_DEMAND_HALF_LIFE_HOURS", "72"))
+
+# RoomStat events are queued and bulk-inserted in batches (listings.ingest).
+# STAT_INGEST_BACKEND=file spools to disk so events survive a worker restart.
+STAT_INGEST = {
+    "BACKEND": (
+        "listings.ingest.FileBackend"
+        if os.environ.get("STAT_INGEST_BACKEND") == "file"
+        else "listings.ingest.MemoryBackend"
+    ),
+    "OPTIONS": {},
+    "BATCH_SIZE": int(os.environ.get("STAT_INGEST_BATCH_SIZE", "200")),
+    "FLUSH_INTERVAL": float(os.environ.get("STAT_INGEST_FLUSH_INTERVAL", "2.0")),
+    "EAGER": False,
+}
+
+# Repeat views of a room by the same viewer within SECONDS are not recorded
+# (listings.uniques). The in-memory default remembers viewers per process;
+# VIEW_DEDUPE_BACKEND=cache shares them between workers through the
+# "viewers" cache, as long as that is a shared kind (file or db; a file
+# cache is shared by one host's workers only).
+VIEW_DEDUPE = {
+    "BACKEND": (
+        "listings.uniques.CacheBackend"
+        if os.environ.get("VIEW_DEDUPE_BACKEND") == "cache"
+        else "listings.uniques.MemoryBackend"
+    ),
+    "OPTIONS": (
+        {"alias": "viewers"} if os.environ.get("VIEW_DEDUPE_BACKEND") == "cache" else {}
+    ),
+    "SECONDS": int(os.environ.get("VIEW_DEDUPE_SECONDS", "1800")),
+}
+
+# Requests per user (or client address when signed out) on the write
+# endpoints (listings.ratelimit). The in-memory default limits each process
+# on its own. RATE_LIMIT_BACKEND=db counts in RateLimitWindow rows, shared
+# by every worker. =cache counts in the "ratelimit" cache, which is only
+# shared when it is a shared kind (file or db; a file cache is shared by one
+# host's workers only). Django's file and db caches increment with a read
+# and a write, so concurrent requests can slip a few over the limit.
+RATE_LIMITS = {
+    "BACKEND": {
+        "cache": "listings.ratelimit.CacheStore",
+        "db": "listings.ratelimit.DatabaseStore",
+    }.get(os.environ.get("RATE_LIMIT_BACKEND"), "listings.ratelimit.MemoryStore"),
+    "OPTIONS": (
+        {"alias": "ratelimit"}
+        if os.environ.get("RATE_LIMIT_BACKEND") == "cache"
+        else {}
+    ),
+    "RATES": {
+        "room_view": os.environ.get("RATE_LIMIT_ROOM_VIEW", "120/m"),
+        "track_contact": os.environ.get("RATE_LIMIT_TRACK_CONTACT", "20/m"),
+        "mark_success": os.environ.get("RATE_LIMIT_MARK_SUCCESS", "10/m"),
+        "add_review": os.environ.get("RATE_LIMIT_ADD_REVIEW", "5/10m"),
+    },
+    "ENABLED": True,
+}
+
+# Reverse proxies in front of the app that append to X-Forwarded-For. Rate
+# limits and unique viewers tell signed-out clients apart by the address
+# this many entries from its end; 0 uses REMOTE_ADDR.
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", "0"))
+
+# Raw RoomStat rows older than this many days are deleted by
+# `manage.py rollup_stats --prune`; rollups keep the counts. None keeps all.
+ROOMSTAT_RETENTION_DAYS = (
+    int(os.environ["ROOMSTAT_RETENTION_DAYS"])
+    if os.environ.get("ROOMSTAT_RETENTION_DAYS")
+    else None
+)
+
+# Per-view budgets checked by listings.metrics.QueryMetricsMiddleware, keyed by
+# URL name. Keys: "queries", "db_ms", "total_ms". Going over raises with
+# QUERY_BUDGET_STRICT=1 and logs a warning otherwise. The tracking views are
+# measured as deployed at their costliest: RoomStat events queued, not
+# written, and rate limits counted in the database (RATE_LIMIT_BACKEND=db)
+# through the tuned SQLite profile's write queue.
+QUERY_BUDGETS = {
+    "home": {"queries": 6},
+    "room_list": {"queries": 6},
+    "room_list_more": {"queries": 6},
+    "services": {"queries": 6},
+    "heatmap": {"queries": 2},
+    "room_detail": {"queries": 11},
+    "track_contact": {"queries": 11},
+    "mark_success": {"queries": 7},
+    "add_review": {"queries": 8},
+    "dashboard": {"queries": 7},
+    "api_room_list": {"queries": 5},
+    "api_room_detail": {"queries": 4},
+}
+QUERY_BUDGET_STRICT = os.environ.get("QUERY_BUDGET_STRICT") == "1"
+
+# Resized WebP/JPEG variants of room photos are built by a background thread
+# pool (listings.images); EAGER builds them inline.
+IMAGE_PIPELINE = {
+    "WORKERS": int(os.environ.get("IMAGE_PIPELINE_WORKERS", "2")),
+    "EAGER": False,
+}
@@ -1,16 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include, re_path
-from django.conf import settings
-from django.views.static import serve as static_serve
+from listings import media
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("listings.urls")),
 ]
 
-# Serve uploaded media (portfolio-friendly)
+# Serve uploaded media: chunked, conditional and Range-aware, or handed off
+# to the front-end server with MEDIA_ACCEL (see listings.media)
 urlpatterns += [
-    re_path(
-        r"^media/(?P<path>.*)$", static_serve, {"document_root": settings.MEDIA_ROOT}
-    ),
+    re_path(r"^media/(?P<path>.*)$", media.serve, name="media"),
 ]